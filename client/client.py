@@ -16,6 +16,7 @@ import sys
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from shared.alsa import Alsa
+from shared.bw_custom import BWCustom
 from shared.cat import check
 from shared.dirutils import BW_PATH
 from shared.env import Env
@@ -49,6 +50,14 @@ class BotWaveClient:
         self.feed_task = None
         self.piwave = None
         self.stream_active = False
+        self.stream_queue = None
+        self.stream_meter = None
+        self.stream_stats = None
+        self.clock_offset = None
+        self.playout = None
+        self.playlist = None
+        self.armed = None
+        self.carrier_latency = None
         self.stream_task = None
 
         # helpers
@@ -156,6 +165,9 @@ async def main():
 
     client = BotWaveClient()
     client.registry.from_dir(Path(__file__).resolve().parent / "ops")
+
+    # resolve and pre-fault the backend binary before the first broadcast needs it
+    asyncio.get_event_loop().run_in_executor(None, BWCustom.warm_up)
     
     try:
         await client.registry.dispatch("client_connect")
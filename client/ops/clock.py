@@ -0,0 +1,25 @@
+import time
+
+from shared.ops import GeneralOp
+from shared.protocol import Commands
+
+class ClockOp(GeneralOp):
+    """
+    The OP handling Commands.TIME, the server's clock probes. Answers
+    with our time, and keeps the offset the server estimated so far
+    (our clock minus its) in owner.clock_offset.
+    """
+
+    commands = {Commands.TIME: "probe"}
+
+    async def probe(self, parsed):
+        now = time.time()
+        offset = parsed['kwargs'].get('offset')
+
+        if offset is not None:
+            self.owner.clock_offset = float(offset)
+
+        await self.owner.proto.reply(parsed, Commands.OK, t=f"{now:.6f}")
+
+def setup(reg):
+    reg.register(ClockOp)
@@ -107,6 +107,8 @@ class ConnectOp(GeneralOp):
 
         Log.success(f"Registered as: {self.owner.client_id}")
 
+        await self.registry.dispatch("push_state")
+
         update_flag = Path(tempfile.gettempdir()) / ".bw_updated"
 
         if update_flag.is_file():
@@ -2,6 +2,7 @@ from datetime import datetime
 import json
 from pathlib import Path
 
+from shared.durations import wav_duration
 from shared.env import Env
 from shared.logger import Log
 from shared.ops import GeneralOp
@@ -16,7 +17,8 @@ class ListFilesOp(GeneralOp):
       {
         "name": "filename",
         "size": size_bytes,
-        "modified": timestamp
+        "modified": timestamp,
+        "duration": seconds (null if unknown)
       }
     ]
     """
@@ -35,7 +37,8 @@ class ListFilesOp(GeneralOp):
                     wav_files.append({
                         'name': file_path.name,
                         'size': stat_info.st_size,
-                        'modified': datetime.fromtimestamp(stat_info.st_mtime).isoformat()
+                        'modified': datetime.fromtimestamp(stat_info.st_mtime).isoformat(),
+                        'duration': wav_duration(str(file_path))
                     })
 
             wav_files.sort(key=lambda x: x['name'])
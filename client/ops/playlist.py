@@ -0,0 +1,299 @@
+import asyncio
+import bisect
+import json
+from pathlib import Path
+
+from shared.env import Env
+from shared.logger import Log
+from shared.ops import GeneralOp
+from shared.prefetch import prefetch_tracks
+from shared.protocol import Commands
+from shared.security import PathValidator, SecurityError
+
+class PlaylistOp(GeneralOp):
+    """
+    The OP handling Commands.PLAYLIST. Receives the ordered file
+    list and broadcast settings of the server queue once, then
+    plays through it locally, reporting every track change with
+    Commands.TRACK instead of waiting for a START per track.
+
+    A PLAYLIST with detach=true drops the playlist, letting the
+    current track finish as a regular broadcast.
+
+    Queue edits come as a PLAYLIST with add (files to append) or
+    remove (positions), numbered by revision. A delta that doesn't
+    follow our revision is refused, and the server sends the whole
+    playlist again.
+
+    Also provides a "playlist_next" attribute, used by the start
+    OP when a track ends.
+    """
+
+    commands = {
+        Commands.PLAYLIST: "playlist",
+        "playlist_next": "next"
+    }
+
+    async def playlist(self, parsed):
+        kwargs = parsed["kwargs"]
+
+        if kwargs.get('detach', 'false').lower() == 'true':
+            self.owner.playlist = None
+
+            await self.owner.proto.reply(
+                parsed,
+                Commands.OK,
+                message="Playlist detached"
+            )
+            return
+
+        if 'add' in kwargs or 'remove' in kwargs:
+            await self.edit(parsed)
+            return
+
+        try:
+            files = [PathValidator.sanitize_filename(f) for f in json.loads(kwargs.get('files', '[]'))]
+
+        except (ValueError, TypeError, SecurityError) as e:
+            Log.error(f"Invalid playlist from server: {e}")
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message="Invalid playlist"
+            )
+            return
+
+        if not files:
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message="Empty playlist"
+            )
+            return
+
+        index = int(kwargs.get('index', 0))
+
+        playlist = {
+            'files': files,
+            'index': index if 0 <= index < len(files) else 0,
+            'frequency': float(kwargs.get('frequency', Env.get_float("DEFAULT_FREQ", 90.0))),
+            'ps': kwargs.get('ps', Env.get("DEFAULT_PS", 'BotWave')),
+            'rt': kwargs.get('rt', Env.get("DEFAULT_RT", 'Broadcasting')),
+            'pi': kwargs.get('pi', Env.get("DEFAULT_PI", 'FFFF')),
+            'loop': kwargs.get('loop', 'false').lower() == 'true',
+            'revision': int(kwargs.get('revision', 0)),
+            'misses': 0
+        }
+
+        previous = self.owner.playlist
+        self.owner.playlist = playlist
+
+        # the queue was edited while we play: keep the current track on air
+        if (
+            previous
+            and self.owner.broadcasting
+            and self.owner.current_file == files[playlist['index']]
+            and all(previous[key] == playlist[key] for key in ('frequency', 'ps', 'rt', 'pi'))
+        ):
+            await self.owner.proto.reply(
+                parsed,
+                Commands.OK,
+                message="Playlist updated"
+            )
+
+            self.prefetch_upcoming()
+            return
+
+        Log.broadcast(f"Received playlist of {len(files)} file(s)")
+
+        if await self.play_current():
+            await self.owner.proto.reply(
+                parsed,
+                Commands.OK,
+                message=f"Playing {len(files)} file(s) locally"
+            )
+
+        else:
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message="Could not start the playlist"
+            )
+
+    async def edit(self, parsed):
+        kwargs = parsed["kwargs"]
+        playlist = self.owner.playlist
+
+        try:
+            revision = int(kwargs.get('revision', 0))
+            added = [PathValidator.sanitize_filename(f) for f in json.loads(kwargs.get('add', '[]'))]
+            removed = sorted(int(p) for p in json.loads(kwargs.get('remove', '[]')))
+
+        except (ValueError, TypeError, SecurityError) as e:
+            Log.error(f"Invalid playlist edit from server: {e}")
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message="Invalid playlist edit"
+            )
+            return
+
+        if not playlist or playlist['revision'] != revision - 1:
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message="Playlist out of sync"
+            )
+            return
+
+        playlist['revision'] = revision
+        playlist['files'].extend(added)
+
+        if removed:
+            gone = set(removed)
+            playlist['files'] = [f for i, f in enumerate(playlist['files']) if i not in gone]
+            # same as the server's cursor: the track that was here, or the one after it
+            playlist['index'] -= bisect.bisect_left(removed, playlist['index'])
+
+        files = playlist['files']
+
+        if not files:
+            await self.owner.proto.reply(
+                parsed,
+                Commands.OK,
+                message="Playlist emptied"
+            )
+            return
+
+        playlist['index'] = min(playlist['index'], len(files) - 1)
+
+        await self.owner.proto.reply(
+            parsed,
+            Commands.OK,
+            message="Playlist updated"
+        )
+
+        # keep the current track on air unless it was removed
+        if self.owner.broadcasting and self.owner.current_file == files[playlist['index']]:
+            self.prefetch_upcoming()
+            return
+
+        await self.play_current()
+
+    async def next(self):
+        playlist = self.owner.playlist
+
+        if not playlist:
+            return
+
+        if self.advance(playlist):
+            await self.play_current()
+
+        else:
+            await self.finish(playlist)
+
+    def advance(self, playlist) -> bool:
+        # moves to the next track, False (and the playlist dropped) once it's over
+        if playlist['index'] + 1 < len(playlist['files']):
+            playlist['index'] += 1
+            return True
+
+        if playlist['loop']:
+            playlist['index'] = 0
+            return True
+
+        Log.broadcast("Playlist finished")
+        self.owner.playlist = None
+        return False
+
+    async def finish(self, playlist):
+        await self.report(playlist, "done")
+        await self.registry.dispatch("stop_broadcast", silent=True)
+
+    async def play_current(self) -> bool:
+        playlist = self.owner.playlist
+
+        # missing files are skipped in a loop, a long run of them mustn't recurse
+        while True:
+            filename = playlist['files'][playlist['index']]
+            file_path = PathValidator.safe_join(Env.get("UPLOAD_DIR"), filename)
+
+            if Path(file_path).is_file():
+                break
+
+            Log.warning(f"Playlist file not found, skipping: {filename}")
+            playlist['misses'] += 1
+
+            await self.report(playlist, "missing")
+
+            if self.owner.playlist is not playlist:
+                return False # replaced meanwhile
+
+            if playlist['misses'] >= len(playlist['files']):
+                Log.error("No file of the playlist could be played")
+                self.owner.playlist = None
+
+                await self.report(playlist, "done")
+                return False
+
+            if not self.advance(playlist):
+                await self.finish(playlist)
+                return False
+
+        await self.registry.dispatch(
+            "start_broadcast",
+            file_path=file_path,
+            filename=filename,
+            frequency=playlist['frequency'],
+            ps=playlist['ps'],
+            rt=playlist['rt'],
+            pi=playlist['pi'],
+            loop=False
+        )
+
+        if not self.owner.broadcasting:
+            self.owner.playlist = None
+            await self.report(playlist, "error")
+            return False
+
+        playlist['misses'] = 0
+        await self.report(playlist, "playing")
+
+        self.prefetch_upcoming()
+        return True
+
+    async def report(self, playlist, status):
+        try:
+            await self.owner.proto.fire(
+                Commands.TRACK,
+                index=playlist['index'],
+                total=len(playlist['files']),
+                filename=playlist['files'][playlist['index']],
+                status=status
+            )
+
+        except Exception as e:
+            Log.error(f"Error reporting playlist progress: {e}")
+
+    def prefetch_upcoming(self):
+        playlist = self.owner.playlist
+        files = playlist['files']
+        upload_dir = Env.get("UPLOAD_DIR")
+        upcoming = []
+
+        for offset in range(1, min(Env.get_int("PREFETCH_TRACKS", 2), len(files) - 1) + 1):
+            index = playlist['index'] + offset
+
+            if index >= len(files):
+                if not playlist['loop']:
+                    break
+
+                index -= len(files)
+
+            upcoming.append(PathValidator.safe_join(upload_dir, files[index]))
+
+        current = PathValidator.safe_join(upload_dir, files[playlist['index']])
+        asyncio.get_event_loop().run_in_executor(None, prefetch_tracks, upcoming, [current])
+
+def setup(reg):
+    reg.register(PlaylistOp)
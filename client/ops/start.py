@@ -9,6 +9,8 @@ from shared.bw_custom import BWCustom
 from shared.env import Env
 from shared.logger import Log
 from shared.ops import GeneralOp
+from shared.playout import Playout
+from shared.prefetch import prefetch, warmed
 from shared.protocol import Commands
 from shared.security import PathValidator, SecurityError
 
@@ -20,17 +22,148 @@ class StartOp(GeneralOp):
 
     Also starts the piwave_monitor if not in loop mode.
 
+    Commands.ARM and Commands.FIRE split a start in two: ARM
+    prepares everything ahead of time, FIRE (or the start_at
+    of the ARM) puts it on air at a given instant. Scheduled
+    STARTs are armed the same way as soon as they arrive.
+
+    Also provides a "start_broadcast" attribute, used by the
+    playlist OP to start its tracks. When a playlist is set,
+    track ends advance it instead of reporting Commands.END.
+
+    With CONTINUOUS_PLAYOUT, the backend is kept running in
+    live mode through a Playout and later STARTs with the same
+    broadcast settings only switch the file being fed to it.
+
     Note regarding the backends: PiWave has a backend cache,
     so updating the backend binary for a new one in 
     BACKEND_PATH might not work correctly the first time if
     BACKEND_BYPASS_CACHE isn't set to true.
     """
 
-    commands = {Commands.START: "start"}
+    CARRIER_TIMEOUT = 30 # seconds measure_carrier() waits for the backend to spawn
+    carrier = None # measure_carrier() task of the last start, None when it only switched the file
+
+    commands = {
+        Commands.START: "start",
+        Commands.ARM: "arm",
+        Commands.FIRE: "fire",
+        "start_broadcast": "start_broadcast",
+        "disarm": "disarm_armed"
+    }
 
     async def start(self, parsed: dict):
         kwargs = parsed["kwargs"]
-        filename = kwargs.get('filename')
+
+        # an explicit START takes over from any playlist or armed broadcast
+        self.owner.playlist = None
+        self.disarm()
+
+        target = await self.validate(parsed)
+
+        if not target:
+            return
+
+        filename, file_path = target
+        frequency, ps, rt, pi, loop = self.settings(kwargs)
+        start_at = float(kwargs.get('start_at', 0))
+
+        if start_at > 0:
+            current_time = datetime.now(timezone.utc).timestamp()
+            if start_at > current_time:
+                delay = start_at - current_time
+                Log.broadcast(f"Scheduled start in {delay:.2f} seconds")
+
+                armed = await self.arm_broadcast(file_path, filename, frequency, ps, rt, pi, loop)
+
+                if isinstance(armed, Exception):
+                    await self.owner.proto.reply(
+                        parsed,
+                        Commands.ERROR,
+                        message=str(armed)
+                    )
+                    return
+
+                self.schedule_fire(start_at)
+
+                await self.owner.proto.reply(
+                    parsed,
+                    Commands.OK,
+                    message=f"Scheduled in {delay:.2f}s"
+                )
+                return
+
+        started = await self.start_broadcast(file_path, filename, frequency, ps, rt, pi, loop)
+
+        if isinstance(started, Exception):
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message=str(started)
+            )
+
+        else:
+            await self.owner.proto.reply(
+                parsed,
+                Commands.OK,
+                message="Broadcast started"
+            )
+
+    async def arm(self, parsed: dict):
+        kwargs = parsed["kwargs"]
+
+        self.owner.playlist = None
+
+        target = await self.validate(parsed)
+
+        if not target:
+            return
+
+        filename, file_path = target
+        frequency, ps, rt, pi, loop = self.settings(kwargs)
+
+        armed = await self.arm_broadcast(file_path, filename, frequency, ps, rt, pi, loop)
+
+        if isinstance(armed, Exception):
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message=str(armed)
+            )
+            return
+
+        start_at = float(kwargs.get('start_at', 0))
+
+        if start_at > 0:
+            self.schedule_fire(start_at)
+
+        await self.owner.proto.reply(
+            parsed,
+            Commands.OK,
+            message=f"Armed {filename}"
+        )
+
+    async def fire(self, parsed: dict):
+        if not self.owner.armed:
+            await self.owner.proto.reply(
+                parsed,
+                Commands.ERROR,
+                message="Nothing is armed"
+            )
+            return
+
+        at = float(parsed["kwargs"].get('at', 0))
+        delay = self.schedule_fire(at)
+
+        await self.owner.proto.reply(
+            parsed,
+            Commands.OK,
+            message=f"Firing in {delay:.2f}s"
+        )
+
+    async def validate(self, parsed: dict):
+        # replies with an error and returns None if the file can't be played
+        filename = parsed["kwargs"].get('filename')
 
         if not filename:
             await self.owner.proto.reply(
@@ -38,7 +171,7 @@ class StartOp(GeneralOp):
                 Commands.ERROR,
                 message="Missing filename"
             )
-            return
+            return None
 
         try:
             filename = PathValidator.sanitize_filename(filename)
@@ -51,7 +184,7 @@ class StartOp(GeneralOp):
                 Commands.ERROR,
                 message="Provided filename raised a security violation"
             )
-            return
+            return None
 
         if not Path(file_path).is_file():
             await self.owner.proto.reply(
@@ -59,105 +192,225 @@ class StartOp(GeneralOp):
                 Commands.ERROR,
                 message=f"File not found: {filename}"
             )
-            return
+            return None
 
+        return (filename, file_path)
+
+    def settings(self, kwargs: dict):
         frequency = float(kwargs.get('frequency', Env.get_float("DEFAULT_FREQ", 90.0)))
         ps = kwargs.get('ps', Env.get("DEFAULT_PS", 'BotWave'))
         rt = kwargs.get('rt', Env.get("DEFAULT_RT", 'Broadcasting'))
         pi = kwargs.get('pi', Env.get("DEFAULT_PI", 'FFFF'))
         loop = kwargs.get('loop', 'false').lower() == 'true'
-        start_at = float(kwargs.get('start_at', 0))
 
-        if start_at > 0:
-            current_time = datetime.now(timezone.utc).timestamp()
-            if start_at > current_time:
-                delay = start_at - current_time
-                Log.broadcast(f"Scheduled start in {delay:.2f} seconds")
+        return (frequency, ps, rt, pi, loop)
 
-                asyncio.create_task(self.delay(
-                    file_path, filename, frequency, ps, rt, pi, loop, delay
-                ))
+    def build_piwave(self, frequency, ps, rt, pi, loop):
+        backend_name = Path(Env.get("BACKEND_PATH", "bw_custom")).name
+        talk = Env.get_bool("TALK")
 
-                await self.owner.proto.reply(
-                    parsed,
-                    Commands.OK,
-                    message=f"Scheduled in {delay:.2f}s"
-                )
-                return
+        backend_classes[backend_name] = BWCustom
 
-        started = await self.start_broadcast(file_path, filename, frequency, ps, rt, pi, loop)
+        return PiWave(
+            frequency=frequency,
+            ps=ps,
+            rt=rt,
+            pi=pi,
+            loop=loop,
+            backend=backend_name,
+            debug=talk,
+            silent=not talk,
+            force_search=Env.get_bool("BACKEND_BYPASS_CACHE"),
+            unsafe=Env.get_bool("SKIP_CHECKS")
+        )
 
-        if isinstance(started, Exception):
-            await self.owner.proto.reply(
-                parsed,
-                Commands.ERROR,
-                message=str(started)
-            )
+    def open_playout(self, file_path, loop, name=None) -> bool:
+        self.owner.playout = Playout(self.owner.piwave, self.playout_track_ended, asyncio.get_event_loop())
+        success = self.owner.playout.start(file_path, loop, name)
 
-        else:
-            await self.owner.proto.reply(
-                parsed,
-                Commands.OK,
-                message="Broadcast started"
+        # the monitor only sees the backend go away once the playout ran idle
+        self.owner.piwave_monitor.start(self.owner.piwave, self.playout_closed, asyncio.get_event_loop())
+
+        return success
+
+    async def playout_track_ended(self, file):
+        if self.owner.playlist:
+            await self.registry.dispatch("playlist_next")
+            return
+
+        Log.info(f"Finished playing {Path(file).name}, waiting for the next track...")
+
+        try:
+            await self.owner.proto.fire(
+                Commands.END,
+                filename=Path(file).name,
+                **self.end_latency()
             )
+        except Exception as e:
+            Log.error(f"Error notifying server of broadcast end: {e}")
 
-    async def delay(self, file_path, filename, frequency, ps, rt, pi, loop, delay):
-        await asyncio.sleep(delay)
-        started = await self.start_broadcast(file_path, filename, frequency, ps, rt, pi, loop)
+    async def playout_closed(self):
+        Log.info("Playout idle, stopping broadcast...")
+        await self.registry.dispatch("stop_broadcast", silent=True)
+
+    async def arm_broadcast(self, file_path, filename, frequency, ps, rt, pi, loop):
+        """
+        Does everything a start needs ahead of time: the file is read
+        into the page cache and PiWave is built. With CONTINUOUS_PLAYOUT,
+        the backend is spawned as well and held on silence (or the running
+        playout is reused), so firing only switches the file.
+        """
+
+        self.disarm()
+
+        armed_at = time.time()
+        await asyncio.get_event_loop().run_in_executor(None, prefetch, file_path)
+
+        continuous = Env.get_bool("CONTINUOUS_PLAYOUT")
+        piwave = None
+
+        try:
+            if not (continuous and self.owner.playout and self.owner.playout.matches(frequency, ps, rt, pi)):
+                piwave = self.build_piwave(frequency, ps, rt, pi, loop)
+
+                if continuous and not self.owner.broadcasting:
+                    if self.owner.playout or self.owner.piwave:
+                        await self.registry.dispatch("stop_broadcast", silent=True)
+
+                    self.owner.piwave = piwave
+                    piwave = None
+
+                    if not self.open_playout(None, loop):
+                        raise Exception("PiWave returned a non-true status, set talk to true to debug.")
+
+        except Exception as e:
+            Log.error(f"Arming error: {e}")
+            return e
+
+        self.owner.armed = {
+            'file_path': file_path,
+            'filename': filename,
+            'settings': (frequency, ps, rt, pi, loop),
+            'piwave': piwave,
+            # audio queued in the playout delays a switch, fire that much earlier
+            'lead': self.owner.playout.latency if piwave is None and self.owner.playout else 0,
+            'armed_at': armed_at,
+            'at': None,
+            'timer': None
+        }
+
+        Log.broadcast(f"Armed {filename} on {frequency} MHz in {time.time() - armed_at:.3f}s")
+        return True
+
+    def schedule_fire(self, at: float = 0) -> float:
+        armed = self.owner.armed
+
+        if armed['timer']:
+            armed['timer'].cancel()
+
+        armed['at'] = at if at > 0 else time.time()
+        delay = max(0, armed['at'] - armed['lead'] - time.time())
+
+        armed['timer'] = asyncio.get_event_loop().call_later(
+            delay,
+            lambda: asyncio.ensure_future(self.fire_armed())
+        )
+
+        return delay
+
+    async def fire_armed(self):
+        armed = self.owner.armed
+
+        if not armed:
+            return
+
+        self.owner.armed = None
+        frequency, ps, rt, pi, loop = armed['settings']
+
+        started = await self.start_broadcast(
+            armed['file_path'], armed['filename'], frequency, ps, rt, pi, loop,
+            piwave=armed['piwave']
+        )
 
         if isinstance(started, Exception):
             await self.owner.proto.fire(
                 Commands.ERROR,
                 message=str(started)
             )
+            return
 
-        else:
-            await self.owner.proto.fire(
-                Commands.OK,
-                message="Broadcast started"
-            )
+        # on air once the backend spawned, which can be well after start_broadcast() returned
+        on_air = (await self.carrier if self.carrier else None) or time.time()
+        jitter = (on_air + armed['lead'] - armed['at']) * 1000
+        Log.broadcast(f"On air {jitter:+.1f}ms from the scheduled start (armed {armed['at'] - armed['armed_at']:.2f}s ahead)")
+
+        await self.owner.proto.fire(
+            Commands.OK,
+            message=f"Broadcast started ({jitter:+.1f}ms from schedule)",
+            jitter=f"{jitter:.1f}"
+        )
+
+    async def disarm_armed(self):
+        self.disarm()
+
+    def disarm(self):
+        armed = self.owner.armed
+        self.owner.armed = None
 
+        if armed and armed['timer']:
+            armed['timer'].cancel()
+
+    async def start_broadcast(self, file_path, filename, frequency, ps, rt, pi, loop, piwave=None):
+        requested = time.monotonic()
+        self.carrier = None
+        source = warmed(file_path) # staged copy, only ever handed to the backend
 
-    async def start_broadcast(self, file_path, filename, frequency, ps, rt, pi, loop):
         async def finished():
+            if self.owner.playlist:
+                await self.registry.dispatch("playlist_next")
+                return
+
             Log.info("Playback finished, stopping broadcast...")
 
             try:
                 await self.owner.proto.fire(
                     Commands.END,
-                    filename=filename
+                    filename=filename,
+                    **self.end_latency()
                 )
             except Exception as e:
                 Log.error(f"Error notifying server of broadcast end: {e}")
 
             await self.registry.dispatch("stop_broadcast", silent=True)
 
-        if self.owner.broadcasting:
+        continuous = Env.get_bool("CONTINUOUS_PLAYOUT")
+
+        if continuous and self.owner.playout and self.owner.playout.matches(frequency, ps, rt, pi):
+            self.owner.playout.play(source, loop, file_path)
+
+            Log.broadcast(f"Currently broadcasting {filename} on {frequency} MHz")
+            self.owner.broadcast_start_time = time.time()
+            self.owner.tips.is_broadcasting = True
+            self.owner.broadcasting = True
+            self.owner.current_file = filename
+
+            await self.registry.dispatch("push_state")
+            return True
+
+        if self.owner.broadcasting or self.owner.playout:
             await self.registry.dispatch("stop_broadcast", silent=True)
 
         try:
-            backend_name = Path(Env.get("BACKEND_PATH", "bw_custom")).name
-            talk = Env.get_bool("TALK")
-
-            backend_classes[backend_name] = BWCustom
-
-            self.owner.piwave = PiWave(
-                frequency=frequency,
-                ps=ps,
-                rt=rt,
-                pi=pi,
-                loop=loop,
-                backend=backend_name,
-                debug=talk,
-                silent=not talk,
-                force_search=Env.get_bool("BACKEND_BYPASS_CACHE"),
-                unsafe=Env.get_bool("SKIP_CHECKS")
-            )
+            self.owner.piwave = piwave or self.build_piwave(frequency, ps, rt, pi, loop)
 
-            success = self.owner.piwave.play(file_path, blocking=False)
+            if continuous:
+                success = self.open_playout(source, loop, file_path)
 
-            if not loop:
-                self.owner.piwave_monitor.start(self.owner.piwave, finished, asyncio.get_event_loop())
+            else:
+                success = self.owner.piwave.play(source, blocking=False)
+
+                if not loop:
+                    self.owner.piwave_monitor.start(self.owner.piwave, finished, asyncio.get_event_loop())
 
             if success:
                 Log.broadcast(f"Currently broadcasting {filename} on {frequency} MHz")
@@ -166,6 +419,9 @@ class StartOp(GeneralOp):
                 self.owner.broadcasting = True
                 self.owner.current_file = filename
 
+                await self.registry.dispatch("push_state")
+                self.carrier = asyncio.create_task(self.measure_carrier(self.owner.piwave, requested))
+
             else:
                 raise Exception("PiWave returned a non-true status, set talk to true to debug.")
             
@@ -178,5 +434,30 @@ class StartOp(GeneralOp):
             self.owner.broadcast_start_time = None
             return e
 
+    async def measure_carrier(self, piwave, requested):
+        # file playback only spawns the backend once PiWave is done with ffprobe
+        # returns when the carrier came up (time.time()), None if it didn't
+        deadline = requested + self.CARRIER_TIMEOUT
+
+        while self.owner.piwave is piwave and time.monotonic() < deadline:
+            if piwave.current_process or piwave.backend.current_process:
+                self.owner.carrier_latency = time.monotonic() - requested
+                Log.debug(f"Carrier up {self.owner.carrier_latency * 1000:.1f}ms after the start request")
+                up = time.time()
+
+                await self.registry.dispatch("push_state")
+                return up
+
+            await asyncio.sleep(0.01)
+
+    def end_latency(self) -> dict:
+        # time between the backend exit and the END we're about to send
+        elapsed = self.owner.piwave_monitor.since_exit()
+
+        if elapsed is None:
+            return {}
+
+        return {'latency': f"{elapsed * 1000:.1f}"}
+
 def setup(reg):
     reg.register(StartOp)
\ No newline at end of file
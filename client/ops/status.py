@@ -1,41 +1,81 @@
 from pathlib import Path
 import time
 
+from shared.logger import Log
 from shared.ops import GeneralOp
 from shared.protocol import Commands
 
 class StatusOp(GeneralOp):
     """
     The OP handling Commands.STATUS. Returns the
-    current client status with information such as 
+    current client status with information such as
     the broadcast status, uptime, frequency, and file
+
+    Also provides a "push_state" attribute, which sends
+    the same information as a Commands.STATE event so
+    the server can keep it cached without asking.
     """
 
-    commands = {Commands.STATUS: "status"}
+    commands = {
+        Commands.STATUS: "status",
+        "push_state": "push_state"
+    }
 
     async def status(self, parsed):
-        if self.owner.broadcasting and self.owner.current_file:
-            status = "onair"
-            file = Path(self.owner.current_file).name
-            freq = self.owner.piwave.get_status()["frequency"]
-            uptime = "??:??:??"
-            
-            if self.owner.broadcast_start_time:
-                elapsed = int(time.time() - self.owner.broadcast_start_time)
-                h, m, s = elapsed // 3600, (elapsed % 3600) // 60, elapsed % 60
-                uptime = f"{h:02d}:{m:02d}:{s:02d}"
-        
-            await self.owner.proto.reply(
-                parsed,
-                Commands.OK,
-                status=status,
-                file=file,
-                frequency=freq,
-                uptime=uptime
-            )
-
-        else:
-            await self.owner.proto.reply(parsed, Commands.OK, status = "idle")
+        await self.owner.proto.reply(parsed, Commands.OK, **self.build_state())
+
+    async def push_state(self):
+        try:
+            await self.owner.proto.fire(Commands.STATE, **self.build_state())
+
+        except Exception as e:
+            Log.error(f"Error pushing state to server: {e}")
+
+    def build_state(self) -> dict:
+        state = {'status': "idle"}
+
+        if self.owner.piwave_monitor.end_latency is not None:
+            state['end_latency'] = f"{self.owner.piwave_monitor.end_latency * 1000:.1f}"
+
+        if self.owner.carrier_latency is not None:
+            state['carrier_latency'] = f"{self.owner.carrier_latency * 1000:.1f}"
+
+        if not (self.owner.broadcasting and self.owner.current_file):
+            return state
+
+        state.update({
+            'status': "live" if self.owner.stream_active else "onair",
+            'file': Path(self.owner.current_file).name,
+            'frequency': self.owner.piwave.get_status()["frequency"] if self.owner.piwave else "?",
+            'uptime': "??:??:??"
+        })
+
+        if self.owner.broadcast_start_time:
+            elapsed = int(time.time() - self.owner.broadcast_start_time)
+            h, m, s = elapsed // 3600, (elapsed % 3600) // 60, elapsed % 60
+            state['uptime'] = f"{h:02d}:{m:02d}:{s:02d}"
+            state['started'] = f"{self.owner.broadcast_start_time:.3f}"
+
+        if self.owner.stream_active and self.owner.stream_queue is not None:
+            buffered = self.owner.stream_queue.qsize()
+            state['buffer'] = f"{buffered}/{self.owner.stream_queue.maxsize}"
+            state['bridge_waits'] = str(self.owner.stream_queue.waits)
+            state['bridge_waited'] = f"{self.owner.stream_queue.waited * 1000:.0f}"
+
+        if self.owner.stream_active and self.owner.stream_stats and self.owner.stream_stats['latency'] is not None:
+            state['stream_latency'] = f"{self.owner.stream_stats['latency'] * 1000:.0f}"
+            state['stream_lost'] = str(self.owner.stream_stats['lost'])
+            state['stream_reconnects'] = str(self.owner.stream_stats['reconnects'])
+            state['stream_filled'] = f"{self.owner.stream_stats['filled']:.1f}"
+
+            if self.owner.stream_stats['sync'] is not None:
+                state['stream_sync'] = f"{self.owner.stream_stats['sync'] * 1000:+.1f}"
+                state['stream_trimmed'] = f"{self.owner.stream_stats['trimmed'] * 1000:.0f}"
+
+        if self.owner.stream_active and self.owner.stream_meter is not None:
+            state.update(self.owner.stream_meter.state())
+
+        return state
 
 def setup(reg):
-    reg.register(StatusOp)
\ No newline at end of file
+    reg.register(StatusOp)
@@ -20,7 +20,20 @@ class StopOp(GeneralOp):
 
     async def stop(self, parsed):
         try:
-            if not self.owner.broadcasting:
+            self.owner.playlist = None
+
+            if self.owner.armed and not (self.owner.broadcasting or self.owner.playout):
+                await self.registry.dispatch("disarm")
+                await self.owner.proto.reply(
+                    parsed,
+                    Commands.OK,
+                    message="Armed broadcast cancelled"
+                )
+                return
+
+            await self.registry.dispatch("disarm")
+
+            if not (self.owner.broadcasting or self.owner.playout):
                 await self.owner.proto.reply(
                     parsed,
                     Commands.ERROR,
@@ -78,6 +91,10 @@ class StopOp(GeneralOp):
                 self.owner.stream_task = None
 
 
+        if self.owner.playout:
+            self.owner.playout.close()
+            self.owner.playout = None
+
         if self.owner.piwave:
             try:
                 self.owner.piwave.cleanup()  # stops AND cleanups
@@ -93,6 +110,9 @@ class StopOp(GeneralOp):
         self.owner.tips.is_broadcasting = False
         self.owner.broadcast_start_time = None
         self.owner.current_file = None
+        self.owner.stream_queue = None
+
+        await self.registry.dispatch("push_state")
 
         if not silent:
             Log.broadcast("Stopped broadcast")
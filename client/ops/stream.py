@@ -5,9 +5,12 @@ from piwave.backends import backend_classes
 import queue
 import time
 
+from shared.bridge import PcmBridge
 from shared.bw_custom import BWCustom
 from shared.env import Env
 from shared.logger import Log
+from shared.meter import LevelMeter
+from shared.multicast import receive_pcm
 from shared.ops import GeneralOp
 from shared.protocol import Commands
 
@@ -16,8 +19,28 @@ class StreamOp(GeneralOp):
     The OP handling Commands.STREAM_TOKEN. Starts a live
     broadcast by pulling PCM audio from the server via an
     HTTP stream and feeding it into a new PiWave() instance.
+
+    With 'mcast' in the token, the stream is received from the server's
+    multicast (shared.multicast), the HTTPS stream only being used if
+    that fails.
+
+    With a 'delay' (ms) in the token, each period is handed to the
+    backend that long after the server captured it, read on our
+    clock through the offset from the server's clock probes. Every
+    client relaying the stream then plays it in step.
+
+    Periods reach the backend's feeding thread through a PcmBridge,
+    which never blocks the event loop: when the backend falls behind,
+    the stream just isn't read until it catches up, and the time spent
+    waiting is reported with the state (bridge_waits, bridge_waited).
+
+    While the HTTPS stream reconnects, the backend is fed silence after
+    GAP_FILL seconds without audio, so the transmitter stays on air.
     """
 
+    SYNC_TOLERANCE = 0.002 # seconds late before trimming
+    GAP_FILL = 0.5 # seconds without audio before feeding silence
+
     commands = {Commands.STREAM_TOKEN: "stream"}
 
     async def stream(self, parsed):
@@ -33,6 +56,14 @@ class StreamOp(GeneralOp):
         rt = kwargs.get('rt', Env.get("DEFAULT_RT", 'Streaming'))
         pi = kwargs.get('pi', Env.get("DEFAULT_PI", 'FFFF'))
 
+        # synchronized playout, 0 plays periods as they come
+        target = float(kwargs.get('delay', 0)) / 1000
+
+        multicast = None
+
+        if 'mcast' in kwargs and Env.get_bool("LIVE_MULTICAST", True):
+            multicast = (kwargs['mcast'], kwargs.get('mkey', ''), kwargs.get('msession', '0'))
+
         if not token:
             await self.owner.proto.reply(
                 parsed,
@@ -43,7 +74,10 @@ class StreamOp(GeneralOp):
 
         Log.broadcast(f"Received stream token (rate={rate}, channels={channels})")
 
-        started = await self.start_stream(token, rate, channels, frequency, ps, rt, pi)
+        self.owner.playlist = None
+        await self.registry.dispatch("disarm")
+
+        started = await self.start_stream(token, rate, channels, frequency, ps, rt, pi, target, multicast)
 
         if isinstance(started, Exception):
             await self.owner.proto.reply(
@@ -59,12 +93,12 @@ class StreamOp(GeneralOp):
             )
 
 
-    async def start_stream(self, token, rate, channels, frequency, ps, rt, pi):
+    async def start_stream(self, token, rate, channels, frequency, ps, rt, pi, target=0, multicast=None):
         async def finished():
             Log.info("Stream finished, stopping broadcast...")
             await self.registry.dispatch("stop_broadcast", silent=True)
 
-        if self.owner.broadcasting:
+        if self.owner.broadcasting or self.owner.playout:
             await self.registry.dispatch("stop_broadcast")
 
         try:
@@ -86,18 +120,36 @@ class StreamOp(GeneralOp):
                 unsafe=Env.get_bool("SKIP_CHECKS")
             )
 
+            # capture to backend delay and error from the synchronized playout target (smoothed,
+            # seconds), audio trimmed to catch up and silence fed during gaps (seconds), periods
+            # missing from the sequence and reconnections
+            stats = {'latency': None, 'sync': None, 'trimmed': 0.0, 'filled': 0.0, 'lost': 0, 'seq': None, 'reconnects': 0}
+            self.owner.stream_stats = stats
+
             self.owner.stream_task = self.owner.http_client.stream_pcm_generator(
                 server_host=Env.get("FHOST"),
                 server_port=Env.get_int("FPORT"),
                 token=token,
                 rate=rate,
                 channels=channels,
-                chunk_size=1024
+                chunk_size=1024,
+                stats=stats
             )
+
+            if multicast:
+                # HTTPS stays unopened unless multicast fails
+                self.owner.stream_task = receive_pcm(*multicast, fallback=self.owner.stream_task)
+
             captured = self.owner.stream_task
             self.owner.stream_active = True
 
-            stream_queue = queue.Queue(maxsize=50)
+            stream_queue = PcmBridge(50, asyncio.get_event_loop())
+            self.owner.stream_queue = stream_queue
+            self.owner.stream_meter = LevelMeter.create(rate, channels)
+
+            if target:
+                target += Env.get_float("LIVE_SYNC_TRIM", 0) / 1000
+                Log.broadcast(f"Synchronized playout, {target * 1000:.0f}ms behind the source")
 
             if self.owner.feed_task and not self.owner.feed_task.done():
                 self.owner.feed_task.cancel()
@@ -108,19 +160,51 @@ class StreamOp(GeneralOp):
 
             self.owner.feed_task = asyncio.get_event_loop().create_task(self.feed_queue(captured, stream_queue))
 
+            silence = bytes(1024 * channels * 2)
+            give_up = Env.get_float("LIVE_RECONNECT_TIMEOUT", 60) + 5
+
             def sync_generator_wrapper():
+                gap = 0.0 # seconds without audio
+
                 try:
                     while self.owner.stream_active:
                         try:
-                            chunk = stream_queue.get(timeout=5)
-                            if chunk is None:
+                            # once in a gap, a period of silence per period without audio (the backend paces us)
+                            batch = stream_queue.get(timeout=1024 / rate if gap else self.GAP_FILL)
+
+                            gap = 0.0
+
+                            if batch is None:
                                 break
 
-                            yield chunk
+                            for _, captured, chunk in batch:
+                                if captured is not None:
+                                    # server's clock to ours, from the clock probes
+                                    captured += self.owner.clock_offset or 0
+
+                                    if target:
+                                        chunk = self.align(chunk, captured + target, rate, channels * 2, stats)
+
+                                    # handed to the backend now
+                                    delay = time.time() - captured
+                                    stats['latency'] = delay if stats['latency'] is None else stats['latency'] + (delay - stats['latency']) * 0.1
+
+                                if chunk:
+                                    yield chunk
 
                         except queue.Empty:
-                            Log.warning("Stream stalled (queue timeout)")
-                            break
+                            if gap == 0:
+                                gap = self.GAP_FILL
+                                Log.warning("No stream audio, feeding silence until it's back")
+                            else:
+                                gap += 1024 / rate
+
+                            if gap > give_up:
+                                Log.warning("Stream stalled (queue timeout)")
+                                break
+
+                            stats['filled'] += 1024 / rate
+                            yield silence
 
                 except GeneratorExit:
                     pass
@@ -144,6 +228,9 @@ class StreamOp(GeneralOp):
                 self.owner.broadcasting = True
                 self.owner.current_file = f"stream:{token[:8]}"
 
+                await self.registry.dispatch("push_state")
+                asyncio.create_task(self.report_state())
+
             else:
                 raise Exception("PiWave returned a non-true status, set talk to true to debug.")
 
@@ -156,19 +243,77 @@ class StreamOp(GeneralOp):
             self.owner.broadcast_start_time = None
             return e
 
+    def align(self, chunk: bytes, due: float, rate: int, frame_bytes: int, stats: dict) -> bytes:
+        """
+        Holds a period until it's due, or trims from its start what's
+        already late. Runs in the backend's feeding thread.
+        """
+
+        early = due - time.time()
+
+        if early > 0:
+            time.sleep(early)
+
+        elif -early > self.SYNC_TOLERANCE:
+            frames = min(int(-early * rate), len(chunk) // frame_bytes)
+
+            if frames * frame_bytes == len(chunk) and not stats['trimmed']:
+                Log.warning("Stream arrives later than the playout delay, raise LIVE_SYNC_DELAY on the server")
+
+            chunk = chunk[frames * frame_bytes:]
+            stats['trimmed'] += frames / rate
+            due += frames / rate
+
+        error = time.time() - due
+        stats['sync'] = error if stats['sync'] is None else stats['sync'] + (error - stats['sync']) * 0.1
+
+        return chunk
+
+    async def report_state(self):
+        # buffer health changes continuously while live, so push it periodically
+        interval = Env.get_float("STATE_PUSH_INTERVAL", 5)
+
+        while self.owner.stream_active:
+            await asyncio.sleep(interval)
+
+            if self.owner.stream_active:
+                await self.registry.dispatch("push_state")
+
     async def feed_queue(self, captured, stream_queue):
+        meter = self.owner.stream_meter
+        stats = self.owner.stream_stats
+
         try:
-            async for chunk in captured:
+            async for batch in captured:
                 if not self.owner.stream_active:
                     break
 
-                stream_queue.put(chunk)
+                for seq, _, chunk in batch:
+                    if seq is not None:
+                        # the stream itself is lossless, gaps are periods the server dropped for us
+                        if stats['seq'] is not None and seq > stats['seq'] + 1:
+                            stats['lost'] += seq - stats['seq'] - 1
+
+                        stats['seq'] = seq
+
+                    if meter and meter.feed(chunk) is not None:
+                        # silence started or ended, let the server know now
+                        if meter.silent:
+                            Log.warning(f"Stream is silent (for {int(meter.quiet_for)}s)")
+                        else:
+                            Log.broadcast(f"Stream has audio again (after {int(meter.last_silence)}s of silence)")
+
+                        asyncio.create_task(self.registry.dispatch("push_state"))
+
+                # one hop to the backend thread per read, as coalesced by the server.
+                # waits (without blocking the loop) while the backend is behind
+                await stream_queue.put(batch)
 
         except Exception as e:
             Log.error(f"Stream feed error: {e}")
             
         finally:
-            stream_queue.put(None)  # sentinel
+            stream_queue.close()
 
 
 def setup(reg):
@@ -20,6 +20,7 @@ import sys
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 
 from shared.alsa import Alsa
+from shared.bw_custom import BWCustom
 from shared.cat import check
 from shared.custom_cmds import CCMD
 from shared.dirutils import BW_PATH
@@ -30,6 +31,7 @@ from shared.ops import CliOp
 from shared.prompt import get_prompt
 from shared.pw_monitor import PWM
 from shared.queue import Queue
+from shared.scheduler import Scheduler
 from shared.registry import Registry, UpperException
 from shared.syscheck import check_requirements
 from shared.tips import TipEngine
@@ -48,13 +50,18 @@ class BotWaveLocal:
         self.broadcasting = False
         self.current_file = None
         self.piwave = None
+        self.playout = None
+        self.armed = None # pending scheduled start, see the start op
+        self.carrier_latency = None
         self.piwave_monitor = PWM()
 
         # core systems
         self.alsa = Alsa()
+        self.live_source = None
         self.custom_commands = CCMD(is_server=False)
         self.handlers_executor = HandlerExecutor(self.cmd_exec)
         self.queue = Queue(client_instance=self, is_local=True)
+        self.scheduler = Scheduler(client_instance=self, is_local=True)
         self.registry = Registry(self)
         self.tips = TipEngine(is_server=False)
 
@@ -191,6 +198,9 @@ async def main():
     local = BotWaveLocal()
     local.registry.from_dir(Path(__file__).resolve().parent / "ops")
 
+    # resolve and pre-fault the backend binary before the first broadcast needs it
+    asyncio.get_event_loop().run_in_executor(None, BWCustom.warm_up)
+
     local.running = True #TODO: Check if this running attr is really useful
 
     if Env.get("REMOTE_CMD_PORT"):
@@ -205,6 +215,10 @@ async def main():
 
     await local.registry.dispatch("handlers_onready")
 
+    # a queue that was playing before a restart plays on
+    local.queue.resume()
+    local.scheduler.start()
+
     if Env.get_bool("DAEMON"):
         Log.info("Running in daemon mode. The local client will continue to run in the background.")
         try:
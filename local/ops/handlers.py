@@ -40,6 +40,8 @@ class HandlersEventsOp(GeneralOp):
       - s_onstop:    Triggers on broadcast stop
       - s_onwsjoin:  Triggers on remote CLI connect
       - s_onwsleave: Triggers on remote CLI disconnect
+      - l_onsilence: Triggers when live audio goes silent
+      - l_onaudio:   Triggers when live audio comes back after a silence
     """
 
     commands = {
@@ -48,7 +50,9 @@ class HandlersEventsOp(GeneralOp):
         "handlers_onstart": "onstart",
         "handlers_onstop": "onstop",
         "handlers_onwsjoin": "onwsjoin",
-        "handlers_onwsleave": "onwsleave"
+        "handlers_onwsleave": "onwsleave",
+        "handlers_onsilence": "onsilence",
+        "handlers_onaudio": "onaudio"
     }
 
     async def onready(self, dir_path: str = None, context: dict = None):
@@ -111,6 +115,24 @@ class HandlersEventsOp(GeneralOp):
         await self.owner.handlers_executor.run_handlers("l_onwsleave", dir_path, context)
         self.owner.rc_clients -= 1
 
+    async def onsilence(self, dir_path: str = None, context: dict = None):
+        if context:
+            context.update(self.build_context())
+
+        else:
+            context = self.build_context()
+
+        await self.owner.handlers_executor.run_handlers("l_onsilence", dir_path, context)
+
+    async def onaudio(self, dir_path: str = None, context: dict = None):
+        if context:
+            context.update(self.build_context())
+
+        else:
+            context = self.build_context()
+
+        await self.owner.handlers_executor.run_handlers("l_onaudio", dir_path, context)
+
     def build_context(self) -> dict:
         ctx = {}
 
@@ -29,10 +29,12 @@ class HelpOp(CliOp):
         Log.print("    stop", "cyan")
         Log.print("")
 
-        Log.print("live [freq] [ps] [rt] [pi]", "bright_green")
+        Log.print("live [source] [freq] [ps] [rt] [pi]", "bright_green")
         Log.print("  Start a live audio broadcast", "white")
+        Log.print("  Sources: alsa (default), file:<path>, url:<url>, pipe:<command>, stdin, tone[:<hz>]", "white")
         Log.print("  Example:", "white")
         Log.print("    live", "cyan")
+        Log.print("    live tone:440 100.5", "cyan")
         Log.print("")
 
         Log.print("queue [+|-|*|!|?]", "bright_green")
@@ -40,6 +42,11 @@ class HelpOp(CliOp):
         Log.print("  Use 'queue ?' for detailed help", "white")
         Log.print("")
 
+        Log.print("schedule [+|-|*|?]", "bright_green")
+        Log.print("  Play files at given times, over the queue", "white")
+        Log.print("  Use 'schedule ?' for detailed help", "white")
+        Log.print("")
+
         Log.print("sstv <image_path> [mode] [frequency] [loop] [ps] [rt] [pi]", "bright_green")
         Log.print("  Convert an image into a SSTV WAV file, and then broadcast it", "white")
         Log.print("  Generated WAVs are cached, so re-running with the same image/mode won't regenerate", "white")
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from pathlib import Path
 from piwave import PiWave
@@ -6,6 +7,7 @@ import time
 
 from shared.bw_custom import BWCustom
 from shared.env import Env
+from shared.live_sources import LiveSourceError, create_source, parse_source
 from shared.logger import Log
 from shared.ops import CliOp
 
@@ -16,20 +18,38 @@ class LiveOp(CliOp):
     
     Then spawns up a PiWave() instance, and starts a broadcast using the 
     alsa pcm generator.
+
+    Other sources (shared.live_sources) can be given instead of the
+    card: file:<path>, url:<url> (or a bare URL), pipe:<command>, stdin
+    and tone[:<hz>]. The running one is kept in owner.live_source.
     """
 
     name = "live"
-    syntax = "[frequency] [ps] [rt] [pi]"
+    syntax = "[source] [frequency] [ps] [rt] [pi]"
 
-    async def handle(self, frequency: float = 90.0, ps: str = "BotWave", rt: str = "Broadcasting", pi: str = "FFFF", is_cmd: bool = False, cmd_parts: list = []):
+    async def handle(self, frequency: float = 90.0, ps: str = "BotWave", rt: str = "Broadcasting", pi: str = "FFFF", source: str = "alsa", is_cmd: bool = False, cmd_parts: list = []):
         if is_cmd:
-            frequency, ps, rt, pi = self.parse(cmd_parts)
+            source, frequency, ps, rt, pi = self.parse(cmd_parts)
+
+        kind, target = parse_source(source) or (None, None)
 
-        if not self.owner.alsa.is_supported():
+        if kind is None:
+            Log.error(f"Unknown live source: {source}")
+            return
+
+        if kind == "alsa" and not self.owner.alsa.is_supported():
             Log.alsa("Live broadcast is not supported on this installation.")
             Log.alsa("Did you setup the ALSA loopback card correctly ?")
             return
 
+        if kind != "alsa":
+            try:
+                source = create_source(kind, target)
+
+            except LiveSourceError as e:
+                Log.error(str(e))
+                return
+
         if is_cmd:
             self.owner.queue.manual_pause()
         
@@ -54,19 +74,28 @@ class LiveOp(CliOp):
                 unsafe=Env.get_bool("SKIP_CHECKS")
             )
 
-            self.owner.alsa.start()
+            if kind == "alsa":
+                source = self.owner.alsa
+
+            else:
+                self.owner.live_source = source
+
+            if not source.start():
+                raise Exception("could not start the live source")
 
-            audio_queue = self.owner.alsa.subscribe()
+            source.watch(self.level_changed, asyncio.get_event_loop())
+
+            audio_queue = source.subscribe()
 
             self.owner.current_file = "live_playback"
             self.owner.broadcasting = True
             self.owner.tips.is_broadcasting = True
 
             success = self.owner.piwave.play(
-                self.owner.alsa.audio_generator(audio_queue),
-                sample_rate=self.owner.alsa.rate,
-                channels=self.owner.alsa.channels,
-                chunk_size=self.owner.alsa.period_size
+                source.audio_generator(audio_queue),
+                sample_rate=source.output_rate,
+                channels=source.output_channels,
+                chunk_size=source.period_size
             )
 
             if success:
@@ -82,6 +111,10 @@ class LiveOp(CliOp):
 
                 await self.registry.dispatch("handlers_onstart", context={"BW_BROADCAST_FREQ": str(frequency)})
 
+                if kind != "alsa":
+                    Log.broadcast(f"Live source: {source.description} ({source.rate}Hz, {source.channels} channels)")
+                    return
+
                 card = Env.get("ALSA_CARD", 'BotWave')
                 Log.alsa(f"To play live, please set your output sound card (ALSA) to '{card}'.")
                 Log.alsa(f"We're expecting {self.owner.alsa.rate}kHz on {self.owner.alsa.channels} channels.")
@@ -95,6 +128,11 @@ class LiveOp(CliOp):
         except Exception as e:
             Log.error(f"Error starting broadcast: {e}")
             self.owner.alsa.stop()
+
+            if self.owner.live_source:
+                self.owner.live_source.stop()
+                self.owner.live_source = None
+
             self.owner.broadcasting = False
             self.owner.tips.is_broadcasting = False
             self.owner.broadcast_start_time = None
@@ -102,13 +140,35 @@ class LiveOp(CliOp):
             self.owner.piwave = None
             return
 
+    def level_changed(self, source, silent: bool):
+        """
+        Silence detected on (or leaving) the live source, l_onsilence / l_onaudio
+        """
+
+        seconds = int(source.meter.quiet_for if silent else source.meter.last_silence)
+        context = {"BW_LIVE_SOURCE": source.description, "BW_SILENCE_SECONDS": str(seconds)}
+
+        if silent:
+            Log.warning(f"Live source {source.description} is silent (for {seconds}s)")
+            asyncio.create_task(self.registry.dispatch("handlers_onsilence", context=context))
+
+        else:
+            Log.broadcast(f"Live source {source.description} has audio again (after {seconds}s of silence)")
+            asyncio.create_task(self.registry.dispatch("handlers_onaudio", context=context))
+
     def parse(self, cmd_parts):
+        source = "alsa"
+
+        if len(cmd_parts) > 0 and parse_source(cmd_parts[0]):
+            source = cmd_parts[0]
+            cmd_parts = cmd_parts[1:]
+
         frequency = float(cmd_parts[0]) if len(cmd_parts) > 0 else Env.get_float("DEFAULT_FREQ", 90)
         ps = cmd_parts[1] if len(cmd_parts) > 1 else Env.get("DEFAULT_PS", "BotWave")
         rt = cmd_parts[2] if len(cmd_parts) > 2 else Env.get("DEFAULT_RT", "Live")  # Fixed index and fallback
         pi = cmd_parts[3] if len(cmd_parts) > 3 else Env.get("DEFAULT_PI", "FFFF")  # Fixed index
 
-        return (frequency, ps, rt, pi)
+        return (source, frequency, ps, rt, pi)
 
 def setup(reg):
     reg.register(LiveOp)
\ No newline at end of file
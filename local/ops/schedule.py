@@ -0,0 +1,15 @@
+from shared.ops import CliOp
+
+class ScheduleOp(CliOp):
+    """
+    The 'schedule' command OP. Just a Scheduler.parse() redirect.
+    """
+
+    name = "schedule"
+    syntax = "[+|-|*|?]"
+
+    async def handle(self, is_cmd: bool = False, cmd_parts: list = []):
+        self.owner.scheduler.parse(' '.join(cmd_parts))
+
+def setup(reg):
+    reg.register(ScheduleOp)
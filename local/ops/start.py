@@ -1,3 +1,4 @@
+import asyncio
 import os
 from pathlib import Path
 from piwave import PiWave
@@ -8,6 +9,8 @@ from shared.bw_custom import BWCustom
 from shared.env import Env
 from shared.logger import Log
 from shared.ops import CliOp
+from shared.playout import Playout
+from shared.prefetch import prefetch, warmed
 
 class StartOp(CliOp):
     """
@@ -16,6 +19,16 @@ class StartOp(CliOp):
 
     Also starts the piwave_monitor if we aren't looping.
 
+    With CONTINUOUS_PLAYOUT, the backend is kept running in
+    live mode through a Playout and later starts with the same
+    broadcast settings only switch the file being fed to it.
+
+    A start_at (unix timestamp) can be given by other OPs, like
+    the scheduler: the broadcast is armed right away (see
+    arm_broadcast()) and fires at that instant, unless stop, another
+    start or the removal of its schedule item (schedule_id) disarms
+    it first.
+
     Note regarding the backends: PiWave has a backend cache,
     so updating the backend binary for a new one in 
     BACKEND_PATH might not work correctly the first time if
@@ -25,7 +38,14 @@ class StartOp(CliOp):
     name = "start"
     syntax = "<file> [freq] [loop] [ps] [rt] [pi]"
 
-    async def handle(self, file: str = None, frequency: float = 90.0, ps: str = "BotWave", rt: str = "Broadcasting", pi: str = "FFFF", loop: bool = False, is_cmd: bool = False, cmd_parts: list = []):
+    CARRIER_TIMEOUT = 30 # seconds measure_carrier() waits for the backend to spawn
+    carrier = None # measure_carrier() task of the last start, None when it only switched the file
+
+    @property
+    def commands(self) -> dict:
+        return {self.name: "handle", "disarm": "disarm_armed"}
+
+    async def handle(self, file: str = None, frequency: float = 90.0, ps: str = "BotWave", rt: str = "Broadcasting", pi: str = "FFFF", loop: bool = False, start_at: float = 0, schedule_id: int = None, is_cmd: bool = False, cmd_parts: list = []):
         if is_cmd:
             file, frequency, ps, rt, pi, loop = self.parse(cmd_parts)
 
@@ -35,49 +55,66 @@ class StartOp(CliOp):
         if not os.path.exists(file):
             Log.error(f"File {file} not found")
             return
+
+        # a new start replaces the pending one
+        self.disarm()
         
         if is_cmd:
             self.owner.queue.manual_pause()
+
+        if start_at > time.time():
+            await self.arm_broadcast(file, frequency, ps, rt, pi, loop, start_at, schedule_id)
+            return
+
+        await self.start_broadcast(file, frequency, ps, rt, pi, loop)
+
+    async def start_broadcast(self, file, frequency, ps, rt, pi, loop, piwave=None):
+        requested = time.monotonic()
+        self.carrier = None
+        source = warmed(file) # staged copy of a queued track, if any
+        continuous = Env.get_bool("CONTINUOUS_PLAYOUT")
+
+        if continuous and self.owner.playout and self.owner.playout.matches(frequency, ps, rt, pi):
+            self.owner.playout.play(source, loop, file)
+            self.owner.current_file = file
+            self.owner.broadcast_start_time = time.time()
+            # the playout may have been held on silence by an armed start
+            self.owner.broadcasting = True
+            self.owner.tips.is_broadcasting = True
+
+            Log.success(f"Started broadcasting {file} on {frequency}MHz")
+            await self.registry.dispatch("handlers_onstart", context={"BW_BROADCAST_FILE": file, "BW_BROADCAST_FREQ": str(frequency)})
+            return
         
         if self.owner.broadcasting:
             await self.registry.dispatch("stop")
 
-        backend_name = Path(Env.get("BACKEND_PATH", "bw_custom")).name
-        silent = not Env.get_bool("TALK")
-
         try:
-            backend_classes[backend_name] = BWCustom
-
-            self.owner.piwave = PiWave(
-                frequency=frequency,
-                ps=ps,
-                rt=rt,
-                pi=pi,
-                loop=loop,
-                backend=backend_name,
-                debug=not silent,
-                silent=silent,
-                force_search=Env.get_bool("BACKEND_BYPASS_CACHE"),
-                unsafe=Env.get_bool("SKIP_CHECKS")
-            )
+            self.owner.piwave = piwave or self.build_piwave(frequency, ps, rt, pi, loop)
 
             self.owner.current_file = file
             self.owner.broadcasting = True
             self.owner.tips.is_broadcasting = True
-            success = self.owner.piwave.play(file)
+
+            if continuous:
+                success = self.open_playout(source, loop, file)
+
+            else:
+                success = self.owner.piwave.play(source)
 
             
             if success:
                 Log.success(f"Started broadcasting {file} on {frequency}MHz")
                 self.owner.broadcast_start_time = time.time()
+                self.carrier = asyncio.create_task(self.measure_carrier(self.owner.piwave, requested))
 
                 await self.registry.dispatch("handlers_onstart", context={"BW_BROADCAST_FILE": file, "BW_BROADCAST_FREQ": str(frequency)})
 
-                if not loop:
+                if not continuous and not loop:
                     async def finished():
                         Log.info("Playback finished, stopping broadcast...")
                         await self.registry.dispatch("stop", silent=True)
-                        self.owner.queue.on_broadcast_ended()
+                        self.owner.queue.on_broadcast_ended(filename=file)
 
                     self.owner.piwave_monitor.start(self.owner.piwave, finished)
 
@@ -95,8 +132,159 @@ class StartOp(CliOp):
             self.owner.broadcast_start_time = None
             self.owner.current_file = None
             self.owner.piwave = None
+            self.owner.playout = None
+            return
+
+    def build_piwave(self, frequency, ps, rt, pi, loop):
+        backend_name = Path(Env.get("BACKEND_PATH", "bw_custom")).name
+        silent = not Env.get_bool("TALK")
+
+        backend_classes[backend_name] = BWCustom
+
+        return PiWave(
+            frequency=frequency,
+            ps=ps,
+            rt=rt,
+            pi=pi,
+            loop=loop,
+            backend=backend_name,
+            debug=not silent,
+            silent=silent,
+            force_search=Env.get_bool("BACKEND_BYPASS_CACHE"),
+            unsafe=Env.get_bool("SKIP_CHECKS")
+        )
+
+    def open_playout(self, source, loop, file) -> bool:
+        async def track_ended(ended):
+            Log.info(f"Finished playing {ended}")
+            self.owner.queue.on_broadcast_ended(filename=ended)
+
+        async def closed():
+            Log.info("Playout idle, stopping broadcast...")
+            await self.registry.dispatch("stop", silent=True)
+
+        self.owner.playout = Playout(self.owner.piwave, track_ended, asyncio.get_event_loop())
+        success = self.owner.playout.start(source, loop, file)
+
+        # the monitor only sees the backend go away once the playout ran idle
+        self.owner.piwave_monitor.start(self.owner.piwave, closed)
+
+        return success
+
+    async def arm_broadcast(self, file, frequency, ps, rt, pi, loop, start_at, schedule_id=None):
+        """
+        Does everything the start needs ahead of time: the file is read
+        into the page cache and PiWave is built. With CONTINUOUS_PLAYOUT,
+        the backend is spawned as well and held on silence (or the running
+        playout is reused), so firing only switches the file. The start
+        then fires on a timer, until disarm() cancels it (stop, another
+        start, or its schedule item being removed).
+        """
+
+        armed = {
+            'file': file,
+            'settings': (frequency, ps, rt, pi, loop),
+            'schedule_id': schedule_id,
+            'piwave': None,
+            'playout': None, # the one held on silence for this start, if any
+            'at': start_at,
+            'lead': 0,
+            'timer': None
+        }
+        self.owner.armed = armed
+
+        await asyncio.get_event_loop().run_in_executor(None, prefetch, file)
+
+        if self.owner.armed is not armed:
             return
 
+        continuous = Env.get_bool("CONTINUOUS_PLAYOUT")
+
+        try:
+            if not (continuous and self.owner.playout and self.owner.playout.matches(frequency, ps, rt, pi)):
+                armed['piwave'] = self.build_piwave(frequency, ps, rt, pi, loop)
+
+                if continuous and not self.owner.broadcasting:
+                    if self.owner.playout:
+                        await self.registry.dispatch("stop", silent=True)
+
+                    self.owner.piwave = armed['piwave']
+                    armed['piwave'] = None
+
+                    if not self.open_playout(None, loop, None):
+                        raise Exception("PiWave returned a non-true status, set talk to true to debug.")
+
+                    armed['playout'] = self.owner.playout
+
+        except Exception as e:
+            Log.error(f"Arming error: {e}")
+            self.disarm()
+            return
+
+        # audio queued in the playout delays a switch, fire that much earlier
+        armed['lead'] = self.owner.playout.latency if armed['piwave'] is None and self.owner.playout else 0
+
+        armed['timer'] = asyncio.get_event_loop().call_later(
+            max(0, start_at - armed['lead'] - time.time()),
+            lambda: asyncio.ensure_future(self.fire_armed(armed))
+        )
+
+    async def fire_armed(self, armed):
+        if self.owner.armed is not armed:
+            return
+
+        self.owner.armed = None
+        frequency, ps, rt, pi, loop = armed['settings']
+
+        await self.start_broadcast(armed['file'], frequency, ps, rt, pi, loop, piwave=armed['piwave'])
+
+        if not self.owner.broadcasting:
+            return
+
+        # on air once the backend spawned, which can be well after start_broadcast() returned
+        on_air = (await self.carrier if self.carrier else None) or time.time()
+        Log.broadcast(f"On air {(on_air + armed['lead'] - armed['at']) * 1000:+.1f}ms from the scheduled start")
+
+    async def disarm_armed(self, schedule_ids=None, is_cmd: bool = False, cmd_parts: list = []):
+        self.disarm(schedule_ids)
+
+    def disarm(self, schedule_ids=None):
+        """
+        Cancels the pending start (only if it came from one of
+        schedule_ids when given), and releases what it held
+        """
+
+        armed = self.owner.armed
+
+        if not armed or (schedule_ids is not None and armed['schedule_id'] not in schedule_ids):
+            return
+
+        self.owner.armed = None
+
+        if armed['timer']:
+            armed['timer'].cancel()
+
+        if schedule_ids is not None and self.owner.queue.held.get(None) == Path(armed['file']).name:
+            # the queue was waiting on it, let it go on
+            self.owner.queue.held.clear()
+            self.owner.queue.held_at = None
+
+        playout = armed['playout']
+
+        if playout and self.owner.playout is playout and not self.owner.broadcasting:
+            self.owner.piwave_monitor.stop()
+            playout.close()
+
+            try:
+                self.owner.piwave.cleanup()
+            except Exception as e:
+                Log.error(f"Error releasing the armed backend: {e}")
+
+            self.owner.playout = None
+            self.owner.piwave = None
+
+        Log.info(f"Pending start of {Path(armed['file']).name} cancelled")
+
     def parse(self, cmd_parts):
         if len(cmd_parts) < 1:
             Log.error("Usage: start <file> [frequency] [loop] [ps] [rt] [pi]")
@@ -111,5 +299,18 @@ class StartOp(CliOp):
 
         return (file, frequency, ps, rt, pi, loop)
 
+    async def measure_carrier(self, piwave, requested):
+        # file playback only spawns the backend once PiWave is done with ffprobe
+        # returns when the carrier came up (time.time()), None if it didn't
+        deadline = requested + self.CARRIER_TIMEOUT
+
+        while self.owner.piwave is piwave and time.monotonic() < deadline:
+            if piwave.current_process or piwave.backend.current_process:
+                self.owner.carrier_latency = time.monotonic() - requested
+                Log.debug(f"Carrier up {self.owner.carrier_latency * 1000:.1f}ms after the start request")
+                return time.time()
+
+            await asyncio.sleep(0.01)
+
 def setup(reg):
     reg.register(StartOp)
\ No newline at end of file
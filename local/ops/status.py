@@ -27,6 +27,20 @@ class StatusOp(CliOp):
         else:
             Log.print("Idle", "orange")
 
+        source = self.owner.live_source or self.owner.alsa
+
+        if source.running and source.meter:
+            Log.print(f"Level      : {source.meter.describe()}", "white")
+
+        if source.running and source.dsp:
+            Log.print(f"Processing : {source.dsp.describe()} ({source.dsp.cost * 1e6:.0f}us per period)", "white")
+
+        if self.owner.carrier_latency is not None:
+            Log.print(f"Carrier    : {self.owner.carrier_latency * 1000:.1f}ms (last start to backend spawn)", "white")
+
+        if self.owner.piwave_monitor.end_latency is not None:
+            Log.print(f"End delay  : {self.owner.piwave_monitor.end_latency * 1000:.1f}ms (last backend exit to queue advance)", "white")
+
         if Env.get("REMOTE_CMD_PORT"):
             Log.print(f"RC Port    : {Env.get('REMOTE_CMD_PORT')}", "white")
             Log.print(f"RC Clients : {self.owner.rc_clients}", "white")
@@ -13,12 +13,22 @@ class StopOp(CliOp):
         if is_cmd:
             self.owner.queue.manual_pause()
 
+            if self.owner.armed and not self.owner.broadcasting:
+                await self.registry.dispatch("disarm")
+                return True
+
+            await self.registry.dispatch("disarm")
+
         if not self.owner.broadcasting and not silent:
             Log.warning("No broadcast is currently running")
             return
         
         self.owner.piwave_monitor.stop()
 
+        if self.owner.playout:
+            self.owner.playout.close()
+            self.owner.playout = None
+
         if self.owner.piwave:
             try:
                 self.owner.piwave.cleanup()
@@ -32,6 +42,10 @@ class StopOp(CliOp):
 
         self.owner.alsa.stop()
 
+        if self.owner.live_source:
+            self.owner.live_source.stop()
+            self.owner.live_source = None
+
         await self.registry.dispatch("handlers_onstop", context={"BW_BROADCAST_FILE": self.owner.current_file or ""})
 
         self.owner.broadcasting = False
@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from shared.logger import Log
 from shared.ops import GeneralOp
 from shared.protocol import Commands
@@ -7,13 +9,16 @@ class ClientMsgOp(GeneralOp):
     Handles every supported client message that
     wasn't dispatched by ProtoManager.dispatch()
 
-    Currently supports Commands.OK, Commands.ERROR and Commands.END
+    Currently supports Commands.OK, Commands.ERROR, Commands.END,
+    Commands.STATE and Commands.TRACK
     """    
 
     commands = {
         Commands.OK: "success",
         Commands.ERROR: "error",
-        Commands.END: "end"
+        Commands.END: "end",
+        Commands.STATE: "state",
+        Commands.TRACK: "track"
     }
 
     async def success(self, client_id, parsed, websocket):
@@ -49,10 +54,48 @@ class ClientMsgOp(GeneralOp):
             Log.error(f"{self.owner.clients[client_id].get_display_name()}: {msg}")
 
         else:
-            Log.broadcast(f"{self.owner.clients[client_id].get_display_name()}: Finished broadcasting {filename}")
+            latency = f" (END sent {kwargs['latency']}ms after the backend exited)" if 'latency' in kwargs else ""
+            Log.broadcast(f"{self.owner.clients[client_id].get_display_name()}: Finished broadcasting {filename}{latency}")
 
-        self.owner.queue.on_broadcast_ended(client_id)
+        self.owner.queue.on_broadcast_ended(client_id, filename)
         return
 
+    async def state(self, client_id, parsed, websocket):
+        """
+        Commands.STATE: caches the state pushed by the client,
+        so 'status' doesn't have to query it
+        """
+
+        client = self.owner.clients[client_id]
+        was_silent = (client.state or {}).get('silent') == "true"
+
+        client.state = {k: v for k, v in parsed['kwargs'].items() if k != 'transaction_id'}
+        client.state_updated = datetime.now()
+
+        # multicast clients don't subscribe to the source themselves
+        if self.owner.multicast:
+            self.owner.multicast.tune(client_id, client.state.get('status') == "live")
+
+        silent = client.state.get('silent')
+
+        if silent is not None and (silent == "true") != was_silent:
+            seconds = client.state.get('silent_for' if silent == "true" else 'last_silence', "0")
+            context = {"BW_LIVE_SOURCE": "client", "BW_SILENCE_SECONDS": seconds}
+
+            if silent == "true":
+                Log.warning(f"{client.get_display_name()}: Live stream is silent (for {seconds}s)")
+                await self.registry.dispatch("handlers_onsilence", context=context, client_id=client_id)
+
+            else:
+                Log.broadcast(f"{client.get_display_name()}: Live stream has audio again (after {seconds}s of silence)")
+                await self.registry.dispatch("handlers_onaudio", context=context, client_id=client_id)
+
+    async def track(self, client_id, parsed, websocket):
+        """
+        Commands.TRACK: playlist progress, forwarded to the queue
+        """
+
+        self.owner.queue.on_track(client_id, parsed['kwargs'])
+
 def setup(reg):
     reg.register(ClientMsgOp)
\ No newline at end of file
@@ -0,0 +1,57 @@
+import asyncio
+import time
+
+from shared.env import Env
+from shared.logger import Log
+from shared.ops import GeneralOp
+from shared.protocol import Commands
+from shared.version import parse_version
+
+class ClockOp(GeneralOp):
+    """
+    Estimates each client's clock offset from ours with Commands.TIME
+    probes, for as long as the client stays connected: a quick burst
+    once it registered, then one every CLOCK_PROBE_INTERVAL seconds.
+
+    Each probe also carries the current estimate, so the client can
+    read the server timestamps of live periods on its own clock
+    (synchronized playout, capture to backend delay).
+
+    Clients older than TIME_SINCE don't know Commands.TIME and are
+    left alone.
+    """
+
+    commands = {"clock_track": "track"}
+
+    BURST = 4
+    TIME_SINCE = (2, 1, 7)
+
+    async def track(self, client_id: str):
+        client = self.owner.clients.get(client_id)
+        probes = 0
+
+        if client and parse_version(client.protocol_version) < self.TIME_SINCE:
+            Log.debug(f"{client.get_display_name()} predates clock probes, not tracking its clock")
+            return
+
+        while client and self.owner.clients.get(client_id) is client:
+            offset = client.clock.offset
+            kwargs = {'offset': f"{offset:.6f}"} if offset is not None else {}
+
+            try:
+                sent = time.time()
+                response = await client.proto.send(Commands.TIME, **kwargs)
+                client.clock.sample(sent, float(response['kwargs']['t']), time.time())
+
+            except TimeoutError:
+                pass
+
+            except (RuntimeError, KeyError, ValueError):
+                Log.debug(f"{client.get_display_name()} doesn't answer clock probes")
+                return
+
+            probes += 1
+            await asyncio.sleep(0.5 if probes < self.BURST else Env.get_float("CLOCK_PROBE_INTERVAL", 10))
+
+def setup(reg):
+    reg.register(ClockOp)
@@ -42,6 +42,8 @@ class HandlersEventsOp(GeneralOp):
       - s_ondisconnect: Triggers on client disconnect
       - s_onwsjoin:     Triggers on remote CLI connect
       - s_onwsleave:    Triggers on remote CLI disconnect
+      - s_onsilence:    Triggers when live audio goes silent (server source or client)
+      - s_onaudio:      Triggers when live audio comes back after a silence
     """
 
     commands = {
@@ -52,7 +54,9 @@ class HandlersEventsOp(GeneralOp):
         "handlers_onconnect": "onconnect",
         "handlers_ondisconnect": "ondisconnect",
         "handlers_onwsjoin": "onwsjoin",
-        "handlers_onwsleave": "onwsleave"
+        "handlers_onwsleave": "onwsleave",
+        "handlers_onsilence": "onsilence",
+        "handlers_onaudio": "onaudio"
     }
 
     async def onready(self, dir_path: str = None, context: dict = None, client_id: str = None):
@@ -132,6 +136,24 @@ class HandlersEventsOp(GeneralOp):
         await self.owner.handlers_executor.run_handlers("s_onwsleave", dir_path, context)
         self.owner.rc_clients -= 1
 
+    async def onsilence(self, dir_path: str = None, context: dict = None, client_id: str = None):
+        if context:
+            context.update(self.build_context(client_id))
+
+        else:
+            context = self.build_context(client_id)
+
+        await self.owner.handlers_executor.run_handlers("s_onsilence", dir_path, context)
+
+    async def onaudio(self, dir_path: str = None, context: dict = None, client_id: str = None):
+        if context:
+            context.update(self.build_context(client_id))
+
+        else:
+            context = self.build_context(client_id)
+
+        await self.owner.handlers_executor.run_handlers("s_onaudio", dir_path, context)
+
     def build_context(self, client_id: str = None) -> dict:
         ctx = {}
 
@@ -40,10 +40,17 @@ class HelpOp(CliOp):
         Log.print("  Use 'queue ?' for detailed help", "white")
         Log.print("")
 
-        Log.print("live <targets> [freq] [ps] [rt] [pi]", "bright_green")
+        Log.print("schedule [+|-|*|?]", "bright_green")
+        Log.print("  Play files at given times, over the queue", "white")
+        Log.print("  Use 'schedule ?' for detailed help", "white")
+        Log.print("")
+
+        Log.print("live <targets> [source] [freq] [ps] [rt] [pi]", "bright_green")
         Log.print("  Start a live audio broadcast to client(s)", "white")
+        Log.print("  Sources: alsa (default), file:<path>, url:<url>, pipe:<command>, stdin, tone[:<hz>]", "white")
         Log.print("  Example:", "white")
         Log.print("    live all", "cyan")
+        Log.print("    live all url:https://radio.example.org/stream 100.5", "cyan")
         Log.print("")
 
         Log.print("sstv <targets> <image_path> [mode] [frequency] [loop] [ps] [rt] [pi]", "bright_green")
@@ -142,11 +149,13 @@ class HelpOp(CliOp):
         Log.print("    set PASSKEY mykey true", "cyan")
         Log.print("")
 
-        Log.print("status [targets]", "bright_green")
+        Log.print("status [targets] [--refresh]", "bright_green")
         Log.print("  Show server status, and optionally the broadcast status of client(s)", "white")
+        Log.print("  Client states come from what they last reported; --refresh asks them again", "white")
         Log.print("  Examples:", "white")
         Log.print("    status", "cyan")
         Log.print("    status all", "cyan")
+        Log.print("    status all --refresh", "cyan")
         Log.print("")
 
         Log.print("exit", "bright_green")
@@ -45,6 +45,7 @@ class KickOp(CliOp):
             client = self.owner.clients[client_id]
             
             await client.proto.fire(Commands.KICK, reason=reason)
+            await self.owner.ws_server.drain(client_id, timeout=1)
             
             try:
                 await client.websocket.close()
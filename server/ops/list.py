@@ -26,6 +26,12 @@ class ListOp(CliOp):
             Log.print(f"  Protocol Version: {client.protocol_version}", 'cyan')
             Log.print(f"  Connected: {client.connected_at.strftime('%Y-%m-%d %H:%M:%S')}", 'cyan')
             Log.print(f"  Last seen: {client.last_seen.strftime('%Y-%m-%d %H:%M:%S')}", 'cyan')
+
+            queue = self.owner.ws_server.queue_stats(client_id)
+            Log.print(f"  Send queue: {queue['depth']}/{queue['max']} ({queue['dropped']} shed)", 'cyan')
+
+            if client.rtt:
+                Log.print(f"  Latency: {client.rtt.describe()}", 'cyan')
             Log.print("")
 
 
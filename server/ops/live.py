@@ -1,5 +1,9 @@
+import asyncio
+
 from shared.env import Env
+from shared.live_sources import LiveSourceError, create_source, parse_source
 from shared.logger import Log
+from shared.multicast import MulticastSender
 from shared.ops import CliOp
 from shared.protocol import Commands
 
@@ -11,10 +15,22 @@ class LiveOp(CliOp):
     Sends data using the BWHTTPFileServer over a pcm octet/stream.
     Provides stream token & information to the client via a
     Commands.STREAM_TOKEN request.
+
+    Other sources (shared.live_sources) can be given instead of the
+    card: file:<path>, url:<url> (or a bare URL), pipe:<command>, stdin
+    and tone[:<hz>], decoded or generated without any sound card. The
+    last one started is kept in owner.live_source until 'stop'.
+
+    Dispatched with a source object (any PcmFanout already started,
+    like the queue programme), streams it as is.
+
+    With LIVE_MULTICAST_GROUP set, the source is also multicast on the
+    LAN (shared.multicast) and clients are told to receive it there,
+    keeping their HTTPS stream as a fallback.
     """
 
     name = "live"
-    syntax = "<targets> [frequency] [ps] [rt] [pi]"
+    syntax = "<targets> [source] [frequency] [ps] [rt] [pi]"
 
     async def handle(
         self,
@@ -23,11 +39,12 @@ class LiveOp(CliOp):
         ps: str = "BotWave",
         rt: str = "Streaming",
         pi: str = "FFFF",
+        source = None,
         is_cmd: bool = False,
         cmd_parts: list = []
     ):
         if is_cmd:
-            targets, freq, ps, rt, pi = self.parse(cmd_parts)
+            targets, source, freq, ps, rt, pi = self.parse(cmd_parts)
 
             if not targets:
                 return
@@ -40,13 +57,27 @@ class LiveOp(CliOp):
 
             self.owner.queue.manual_pause()
 
-        if not self.owner.alsa.is_supported():
-            Log.alsa("Live broadcast is not supported on this installation.")
-            Log.alsa("Did you setup the ALSA loopback card correctly ?")
-            return
-                
-        if not self.owner.alsa.start():
-            return
+        if isinstance(source, str):
+            source = self.open_source(source)
+
+            if source is False:
+                return
+
+        alsa = source is None
+
+        if alsa:
+            if not self.owner.alsa.is_supported():
+                Log.alsa("Live broadcast is not supported on this installation.")
+                Log.alsa("Did you setup the ALSA loopback card correctly ?")
+                return
+                    
+            if not self.owner.alsa.start():
+                return
+
+            source = self.owner.alsa
+
+        source.watch(self.level_changed, asyncio.get_event_loop())
+        multicast = self.multicast(source)
 
         Log.broadcast(f"Sending stream tokens to {len(targets)} client(s)...")
         
@@ -60,26 +91,28 @@ class LiveOp(CliOp):
             
             client = self.owner.clients[client_id]
             
-            client_queue = self.owner.alsa.subscribe()
-            token = self.owner.http_server.create_stream_token(
-                self.owner.alsa.audio_generator(client_queue),
-                self.owner.alsa.rate,
-                self.owner.alsa.channels
-            )
+            # a multicast client may only need its HTTPS stream much later
+            token = self.owner.http_server.create_stream_token(source, client_id, expires=not multicast)
+            extra = multicast.token() if multicast else {}
 
             try:
                 response = await client.proto.send(
                     Commands.STREAM_TOKEN,
                     token=token,
-                    rate=self.owner.alsa.rate,
-                    channels=self.owner.alsa.channels,
+                    rate=source.output_rate,
+                    channels=source.output_channels,
+                    delay=Env.get_float("LIVE_SYNC_DELAY", 0),
                     frequency=freq,
                     ps=ps,
                     rt=rt,
-                    pi=pi
+                    pi=pi,
+                    **extra
                 )
 
                 results["streamed"].append(client_id)
+
+                if multicast:
+                    multicast.tune(client_id, True)
                 Log.success(f"  {client.get_display_name()}: {response['kwargs'].get('message', 'Success')}")
 
             except TimeoutError:
@@ -92,24 +125,110 @@ class LiveOp(CliOp):
 
         Log.print("")    
         Log.info(f"Success: {len(results['streamed'])}, Failure: {len(results['failed'])}")
+
+        if not alsa:
+            return
         
         card = Env.get("ALSA_CARD", 'BotWave')
         Log.alsa(f"To play live, please set your output sound card (ALSA) to '{card}'.")
         Log.alsa(f"We're expecting {self.owner.alsa.rate}kHz on {self.owner.alsa.channels} channels.")
 
         
+    def level_changed(self, source, silent: bool):
+        """
+        Silence detected on (or leaving) a source we stream, s_onsilence / s_onaudio
+        """
+
+        seconds = int(source.meter.quiet_for if silent else source.meter.last_silence)
+        context = {"BW_LIVE_SOURCE": source.description, "BW_SILENCE_SECONDS": str(seconds)}
+
+        if silent:
+            Log.warning(f"Live source {source.description} is silent (for {seconds}s)")
+            asyncio.create_task(self.registry.dispatch("handlers_onsilence", context=context))
+
+        else:
+            Log.broadcast(f"Live source {source.description} has audio again (after {seconds}s of silence)")
+            asyncio.create_task(self.registry.dispatch("handlers_onaudio", context=context))
+
+    def multicast(self, source):
+        """
+        The MulticastSender of source, started if needed. None when
+        multicast is off or could not be set up.
+        """
+
+        group = Env.get("LIVE_MULTICAST_GROUP")
+
+        if not group:
+            return None
+
+        sender = self.owner.multicast
+
+        if sender and sender.source is source and sender.running:
+            return sender
+
+        if sender:
+            sender.stop()
+
+        sender = MulticastSender(source, group, Env.get_int("LIVE_MULTICAST_PORT", 5077))
+        self.owner.multicast = sender if sender.start() else None
+
+        if self.owner.multicast:
+            Log.broadcast(f"Multicasting {source.description} to {sender.address}")
+
+        return self.owner.multicast
+
+    def open_source(self, spec: str):
+        """
+        Starts the source described by spec, replacing the previous one.
+        Returns None for the ALSA card, False if it could not be started.
+        """
+
+        kind, target = parse_source(spec) or (None, None)
+
+        if kind is None:
+            Log.error(f"Unknown live source: {spec}")
+            return False
+
+        if kind == "alsa":
+            return None
+
+        try:
+            source = create_source(kind, target)
+
+        except LiveSourceError as e:
+            Log.error(str(e))
+            return False
+
+        if self.owner.live_source:
+            self.owner.live_source.stop()
+
+        self.owner.live_source = None
+
+        if not source.start():
+            return False
+
+        self.owner.live_source = source
+        Log.broadcast(f"Live source: {source.description} ({source.rate}Hz, {source.channels} channels)")
+        return source
+
     def parse(self, cmd_parts):
         if len(cmd_parts) < 1:
-            Log.error("Usage: live <targets> [frequency] [ps] [rt] [pi]")
-            return (None, None, None, None, None)
+            Log.error("Usage: live <targets> [source] [frequency] [ps] [rt] [pi]")
+            return (None, None, None, None, None, None)
 
         targets = cmd_parts[0]
+        source = None
+
+        if len(cmd_parts) > 1 and parse_source(cmd_parts[1]):
+            source = cmd_parts[1]
+            cmd_parts = cmd_parts[1:]
+
         frequency = float(cmd_parts[1]) if len(cmd_parts) > 1 else Env.get_float("DEFAULT_FREQ", 90)
         ps = cmd_parts[2] if len(cmd_parts) > 2 else Env.get("DEFAULT_PS", "BotWave")
         rt = cmd_parts[3] if len(cmd_parts) > 3 else Env.get("DEFAULT_RT", "Broadcasting")
         pi = cmd_parts[4] if len(cmd_parts) > 4 else Env.get("DEFAULT_PI", "FFFF")
 
-        return (targets, frequency, ps, rt, pi)
+        return (targets, source, frequency, ps, rt, pi)
 
 def setup(reg):
     reg.register(LiveOp)
\ No newline at end of file
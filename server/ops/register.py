@@ -1,3 +1,4 @@
+import asyncio
 from datetime import datetime
 
 from shared.env import Env
@@ -5,6 +6,7 @@ from shared.logger import Log
 from shared.protocol import Commands, ProtocolParser, PROTOCOL_VERSION
 from shared.protomanager import ProtoManager
 from shared.ops import GeneralOp
+from shared.socket import ClockEstimator
 from shared.version import versions_compatible
 
 class BotWaveClient:
@@ -13,15 +15,26 @@ class BotWaveClient:
     Has it own ProtoManager instance, alongside other useful information.
     """
 
-    def __init__(self, client_id: str, websocket, machine_info: dict, protocol_version: str):
+    def __init__(self, client_id: str, websocket, machine_info: dict, protocol_version: str, send_fn=None, rtt=None):
         self.client_id = client_id
         self.websocket = websocket
-        self.proto = ProtoManager(send_fn=websocket.send)
+        self.rtt = rtt
+        self.proto = ProtoManager(
+            send_fn=send_fn or websocket.send,
+            timeout_fn=rtt.command_timeout if rtt else None
+        )
         self.machine_info = machine_info
         self.protocol_version = protocol_version
         self.connected_at = datetime.now()
         self.last_seen = datetime.now()
 
+        # offset of the client's clock from ours, from Commands.TIME probes
+        self.clock = ClockEstimator()
+
+        # last state pushed by the client (Commands.STATE), None until the first push
+        self.state = None
+        self.state_updated = None
+
     def get_display_name(self) -> str:
         hostname = self.machine_info.get('hostname', 'unknown')
         return f"{hostname} ({self.client_id})"
@@ -183,18 +196,21 @@ class RegisterOp(GeneralOp):
                 del self.owner.clients[client_id]
                 
                 client_id = base_client_id
+
+            ws_server = self.owner.ws_server
+            ws_server.register_client(websocket, client_id)
             
             client = BotWaveClient(
                 client_id=client_id,
                 websocket=websocket,
                 machine_info=machine_info,
-                protocol_version=protocol_version
+                protocol_version=protocol_version,
+                send_fn=lambda message: ws_server.send(client_id, message),
+                rtt=ws_server.rtt.get(client_id)
             )
             
             self.owner.clients[client_id] = client
             
-            self.owner.ws_server.register_client(websocket, client_id)
-            
             response = ProtocolParser.build_command(
                 Commands.REGISTER_OK,
                 client_id=client_id,
@@ -210,6 +226,8 @@ class RegisterOp(GeneralOp):
             
             delattr(websocket, 'reg_data')
             await self.registry.dispatch("handlers_onconnect", client_id=client_id)
+            self.owner.queue.on_client_registered(client_id)
+            asyncio.create_task(self.registry.dispatch("clock_track", client_id=client_id))
 
     def setup_attr(self, websocket):
         if not hasattr(websocket, 'reg_data'):
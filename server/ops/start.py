@@ -1,19 +1,31 @@
+import asyncio
 from datetime import datetime, timezone
 
 from shared.env import Env
 from shared.logger import Log
 from shared.ops import CliOp
 from shared.protocol import Commands
+from shared.version import parse_version
 
 class StartOp(CliOp):
     """
     The 'start' command OP. Starts a broadcast on the target client.
 
-    If WAIT_START is set to true, it schedules a broadcast based on
-    now() + 5s per (clients - 1). This was intended to let clients
-    sync their broadcasts, but isn't really working.
+    If WAIT_START is set to true and there are several targets, the
+    clients supporting it are armed first (Commands.ARM), then all
+    fired at the same instant, FIRE_DELAY seconds after the last one
+    got armed. Older clients get a START scheduled at that instant,
+    with 5s more to deliver them.
+
+    A start_at (unix timestamp) can also be given by other OPs, like
+    the scheduler, to arm and fire the targets at that instant, and
+    onstart=False leaves firing the onstart handlers to them.
+
+    Clients are armed, fired and started concurrently.
     """
 
+    ARM_SINCE = (2, 1, 6)
+
     name = "start"
     syntax = "<targets> <file> [frequency] [loop] [ps] [rt] [pi]"
 
@@ -26,6 +38,8 @@ class StartOp(CliOp):
         ps: str = "BotWave",
         rt: str = "Broadcasting",
         pi: str = "FFFF",
+        start_at: float = 0,
+        onstart: bool = True,
         is_cmd: bool = False,
         cmd_parts: list = []
     ):
@@ -43,43 +57,107 @@ class StartOp(CliOp):
 
             self.owner.queue.manual_pause()
 
-        # calculate start_at timestamp if wait_start is enabled
-        # start_at = now() + 5s per (clients - 1) 
-        if Env.get_bool("WAIT_START") and len(targets) > 1:
-            start_at = datetime.now(timezone.utc).timestamp() + 5 * (len(targets) - 1)
+        results = {'started': [], 'failed': []}
+        handled = set()
+
+        if start_at or (Env.get_bool("WAIT_START") and len(targets) > 1):
+            armable = [
+                client_id for client_id in targets
+                if client_id in self.owner.clients
+                and parse_version(self.owner.clients[client_id].protocol_version) >= self.ARM_SINCE
+            ]
+
+            armed = await self.arm(armable, file, frequency, loop, ps, rt, pi, results)
+            handled.update(armable)
+
+            if not start_at:
+                # start_at = now() + FIRE_DELAY, plus 5s to deliver the STARTs of clients that can't be armed
+                legacy = len(targets) - len(armable)
+                start_at = datetime.now(timezone.utc).timestamp() + Env.get_float("FIRE_DELAY", 1) + (5 if legacy else 0)
+
             Log.broadcast(f"Starting broadcast at {datetime.fromtimestamp(start_at)}")
 
+            await asyncio.gather(*(
+                self.owner.clients[client_id].proto.fire(Commands.FIRE, at=start_at)
+                for client_id in armed
+            ))
+            results['started'].extend(armed)
+
         else:
             start_at = 0
             Log.broadcast(f"Starting broadcast ASAP")
 
-        Log.broadcast(f"Starting broadcast on {len(targets)} client(s)...")
+        Log.broadcast(f"Starting broadcast on {len(targets) - len(handled)} client(s)...")
 
-        results = {'started': [], 'failed': []}
-        
-        for client_id in targets:
-            if client_id not in self.owner.clients:
-                Log.error(f"  {client_id}: Client not found")
-                results['failed'].append(client_id)
-                continue
+        # one START per client, all sent at once
+        await asyncio.gather(*(
+            self.send_start(client_id, file, frequency, loop, ps, rt, pi, start_at, results)
+            for client_id in targets
+            if client_id not in handled
+        ))
+
+        Log.print("")        
+        Log.info(f"Success: {len(results['started'])}, Failure: {len(results['failed'])}")
+
+        if onstart:
+            await self.registry.dispatch("handlers_onstart",  context={"BW_BROADCAST_FILE": file, "BW_BROADCAST_FREQ": str(frequency)})
+
+    async def send_start(self, client_id, file, frequency, loop, ps, rt, pi, start_at, results):
+        if client_id not in self.owner.clients:
+            Log.error(f"  {client_id}: Client not found")
+            results['failed'].append(client_id)
+            return
 
-            
+        client = self.owner.clients[client_id]
+        
+        try: 
+            response = await client.proto.send(
+                Commands.START,
+                filename=file,
+                frequency=frequency,
+                ps=ps,
+                rt=rt,
+                pi=pi,
+                loop='true' if loop else 'false',
+                start_at=start_at
+            )
+
+            Log.success(f"  {client.get_display_name()}: {response['kwargs'].get('message', 'Broadcast started')}")
+            results['started'].append(client_id)
+
+        except TimeoutError:
+            Log.error(f"  {client.get_display_name()}: Response timeout")
+            results['failed'].append(client_id)
+
+        except RuntimeError as e:
+            err = str(e)
+
+            Log.error(f"  {client.get_display_name()}: {err}")
+            results['failed'].append((client_id, err))
+
+    async def arm(self, client_ids, file, frequency, loop, ps, rt, pi, results):
+        if not client_ids:
+            return []
+
+        Log.broadcast(f"Arming {len(client_ids)} client(s)...")
+        armed = []
+
+        async def arm_client(client_id):
             client = self.owner.clients[client_id]
-            
-            try: 
+
+            try:
                 response = await client.proto.send(
-                    Commands.START,
+                    Commands.ARM,
                     filename=file,
                     frequency=frequency,
                     ps=ps,
                     rt=rt,
                     pi=pi,
-                    loop='true' if loop else 'false',
-                    start_at=start_at
+                    loop='true' if loop else 'false'
                 )
 
-                Log.success(f"  {client.get_display_name()}: {response['kwargs'].get('message', 'Broadcast started')}")
-                results['started'].append(client_id)
+                Log.success(f"  {client.get_display_name()}: {response['kwargs'].get('message', 'Armed')}")
+                armed.append(client_id)
 
             except TimeoutError:
                 Log.error(f"  {client.get_display_name()}: Response timeout")
@@ -91,10 +169,8 @@ class StartOp(CliOp):
                 Log.error(f"  {client.get_display_name()}: {err}")
                 results['failed'].append((client_id, err))
 
-        Log.print("")        
-        Log.info(f"Success: {len(results['started'])}, Failure: {len(results['failed'])}")
-
-        await self.registry.dispatch("handlers_onstart",  context={"BW_BROADCAST_FILE": file, "BW_BROADCAST_FREQ": str(frequency)})
+        await asyncio.gather(*(arm_client(client_id) for client_id in client_ids))
+        return armed
 
     def parse(self, cmd_parts):
         if len(cmd_parts) < 2:
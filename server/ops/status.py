@@ -1,3 +1,6 @@
+from datetime import datetime
+import time
+
 from shared.env import Env
 from shared.logger import Log
 from shared.ops import CliOp
@@ -7,19 +10,24 @@ class StatusOp(CliOp):
     """
     The 'status' command OP. Displays status information
     about the eventual target clients and the server itself.
+
+    Client states are rendered from the cache filled by
+    Commands.STATE pushes. Clients that never pushed a state
+    (or every target, with --refresh) are queried live.
     """
 
     name = "status"
-    syntax = "[targets]"
+    syntax = "[targets] [--refresh]"
 
     async def handle(
             self,
             targets: list = [],
+            refresh: bool = False,
             is_cmd: bool = False,
             cmd_parts: list = []
     ):
         if is_cmd:
-            targets = self.parse(cmd_parts)
+            targets, refresh = self.parse(cmd_parts)
 
             targets_resolved = False
 
@@ -45,19 +53,30 @@ class StatusOp(CliOp):
                 client = self.owner.clients[client_id]
 
                 try:
-                    response = await client.proto.send(Commands.STATUS)
-                    kwargs = response['kwargs']
-                    status = kwargs.get('status', 'unknown')
+                    cached = client.state is not None and not refresh
+
+                    if not cached:
+                        response = await client.proto.send(Commands.STATUS)
+                        client.state = {k: v for k, v in response['kwargs'].items() if k != 'transaction_id'}
+                        client.state_updated = datetime.now()
 
                     Log.print(f"{client.get_display_name()}:", "bright_yellow")
+                    self.render_state(client.state)
+
+                    if cached:
+                        age = int((datetime.now() - client.state_updated).total_seconds())
+                        Log.print(f"  Updated   : {age}s ago", "white")
 
-                    if status == 'onair':
-                        Log.print(f"  On Air", "bright_green")
-                        Log.print(f"  File      : {kwargs.get('file', '?')}", "white")
-                        Log.print(f"  Frequency : {kwargs.get('frequency', '?')} MHz", "white")
-                        Log.print(f"  Uptime    : {kwargs.get('uptime', '?')}", "white")
-                    else:
-                        Log.print(f"  Idle", "orange")
+                    queue = self.owner.ws_server.queue_stats(client_id)
+                    Log.print(f"  Send queue: {queue['depth']}/{queue['max']} ({queue['dropped']} shed)", "white")
+
+                    if client.rtt:
+                        Log.print(f"  Latency   : {client.rtt.describe()}", "white")
+
+                    Log.print(f"  Clock     : {client.clock.describe()}", "white")
+
+                    for source, stream in self.live_subscriptions(client_id):
+                        Log.print(f"  Stream    : {stream.delivered} periods sent, {stream.dropped} dropped by the server ({source.description})", "white")
 
                     results['success'].append(client_id)
 
@@ -74,6 +93,20 @@ class StatusOp(CliOp):
             Log.info(f"Success: {len(results['success'])}, Failure: {len(results['failed'])}")
             Log.print("")
 
+        for source in self.live_sources():
+            Log.print(f"Live source       : {source.description} ({source.listeners} listener(s))", "white")
+
+            if source.meter:
+                Log.print(f"  Level           : {source.meter.describe()}", "white")
+
+            if source.dsp:
+                Log.print(f"  Processing      : {source.dsp.describe()} ({source.dsp.cost * 1e6:.0f}us per period)", "white")
+
+            multicast = self.owner.multicast
+
+            if multicast and multicast.source is source and multicast.running:
+                Log.print(f"  Multicast       : {multicast.address}, {multicast.packets} datagrams ({multicast.sent_bytes / 1e6:.1f} MB) sent", "white")
+
         Log.print(f"Connected clients : {len(self.owner.clients)}", "white")
         Log.print(f"Port              : {Env.get('PORT')}", "white")
         Log.print(f"File Port         : {Env.get('FPORT')}", "white")
@@ -86,10 +119,80 @@ class StatusOp(CliOp):
         Log.print(f"Passkey           : {'yes' if Env.get("PASSKEY") else 'no'}", "white")
 
 
+    def live_sources(self) -> list:
+        sources = [self.owner.alsa, self.owner.live_source, self.owner.queue.programme]
+        return [source for source in sources if source and source.running]
+
+    def live_subscriptions(self, client_id: str) -> list:
+        """
+        (source, subscription) of each live stream the client is connected to
+        """
+        return [
+            (source, stream)
+            for source in self.live_sources()
+            for stream in source.subscriptions()
+            if stream.name == client_id
+        ]
+
+    def render_state(self, state: dict):
+        status = state.get('status', 'unknown')
+
+        if status in ('onair', 'live'):
+            Log.print(f"  {'Live' if status == 'live' else 'On Air'}", "bright_green")
+            Log.print(f"  File      : {state.get('file', '?')}", "white")
+            Log.print(f"  Frequency : {state.get('frequency', '?')} MHz", "white")
+
+            uptime = state.get('uptime', '?')
+            started = state.get('started')
+
+            if started:
+                # computed here so cached states don't show a frozen uptime
+                try:
+                    elapsed = max(0, int(time.time() - float(started)))
+                    h, m, s = elapsed // 3600, (elapsed % 3600) // 60, elapsed % 60
+                    uptime = f"{h:02d}:{m:02d}:{s:02d}"
+                except ValueError:
+                    pass
+
+            Log.print(f"  Uptime    : {uptime}", "white")
+
+            if 'level_rms' in state:
+                silent = f", silent for {state.get('silent_for', '?')}s" if state.get('silent') == "true" else ""
+                Log.print(f"  Level     : {state['level_rms']} dBFS RMS, {state.get('level_peak', '?')} dBFS peak{silent}", "white")
+
+            if 'buffer' in state:
+                waits = ""
+
+                if state.get('bridge_waits', '0') != '0':
+                    waits = f", backend behind {state['bridge_waits']} times ({state.get('bridge_waited', '?')}ms waited)"
+
+                Log.print(f"  Buffer    : {state['buffer']}{waits}", "white")
+
+            if 'stream_latency' in state:
+                Log.print(f"  Delay     : {state['stream_latency']}ms capture to backend, {state.get('stream_lost', '0')} periods lost", "white")
+
+            if state.get('stream_reconnects', '0') != '0':
+                Log.print(f"  Gaps      : {state['stream_reconnects']} reconnection(s), {state.get('stream_filled', '?')}s of silence fed meanwhile", "white")
+
+            if 'stream_sync' in state:
+                Log.print(f"  Sync      : {state['stream_sync']}ms from the playout target ({state.get('stream_trimmed', '0')}ms trimmed)", "white")
+
+        else:
+            Log.print(f"  Idle", "orange")
+
+        if 'carrier_latency' in state:
+            Log.print(f"  Carrier   : {state['carrier_latency']}ms (last start request to backend spawn)", "white")
+
+        if 'end_latency' in state:
+            Log.print(f"  End delay : {state['end_latency']}ms (last backend exit to END)", "white")
+
     def parse(self, cmd_parts):
+        refresh = '--refresh' in cmd_parts
+        cmd_parts = [part for part in cmd_parts if part != '--refresh']
+
         targets = cmd_parts[0] if len(cmd_parts) > 0 else None
 
-        return targets
+        return (targets, refresh)
 
 def setup(reg):
     reg.register(StatusOp)
\ No newline at end of file
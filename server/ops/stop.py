@@ -65,6 +65,11 @@ class StopOp(CliOp):
         Log.info(f"Success: {len(results['stopped'])}, Failure: {len(results['failed'])}")
 
         self.owner.alsa.stop()
+
+        if self.owner.live_source:
+            self.owner.live_source.stop()
+            self.owner.live_source = None
+
         await self.registry.dispatch("handlers_onstop")
 
         
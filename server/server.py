@@ -33,6 +33,7 @@ from shared.ops import CliOp
 from shared.prompt import get_prompt
 from shared.protocol import Commands, ProtocolParser, PROTOCOL_VERSION
 from shared.queue import Queue
+from shared.scheduler import Scheduler
 from shared.registry import Registry, UpperException
 from shared.tips import TipEngine
 from shared.version import check_for_updates
@@ -54,8 +55,11 @@ class BotWaveServer:
 
         # core components & state
         self.alsa = Alsa()
+        self.live_source = None
+        self.multicast = None
         self.custom_commands = CCMD(is_server=True)
         self.queue = Queue(self)
+        self.scheduler = Scheduler(self)
         self.running = False
         self.tips = TipEngine()
 
@@ -210,6 +214,11 @@ class BotWaveServer:
             Log.warning(f"Client disconnected: {client.get_display_name()}")
 
             await self.registry.dispatch("handlers_ondisconnect", client_id=client_id)
+            self.queue.playlist_clients.discard(client_id)
+
+            if self.multicast:
+                self.multicast.tune(client_id, False)
+
             del self.clients[client_id]
 
 # startup helpers
@@ -328,6 +337,7 @@ async def main():
             server.ws_handler.start()
 
         await server.registry.dispatch("handlers_onready")
+        server.scheduler.start()
 
     except Exception as e:
         Log.error(f"Startup error: {e}")
@@ -1,5 +1,4 @@
 import threading
-import queue
 import time
 
 try:
@@ -8,15 +7,16 @@ try:
 except ImportError:
     ALSA_AVAILABLE = False
 
+from shared.fanout import PcmFanout
 from shared.logger import Log
 from shared.env import Env
 
-class Alsa:
+class Alsa(PcmFanout):
+    description = "alsa"
+
     def __init__(self):
+        super().__init__()
         self.capture = None
-        self._running = False
-        self._subscribers = []
-        self._sub_lock = threading.Lock()
         self._reader_thread = None
 
     @property
@@ -74,6 +74,7 @@ class Alsa:
                 format=alsaaudio.PCM_FORMAT_S16_LE,
                 periodsize=self.period_size
             )
+            self.prepare()
             self._running = True
             self._reader_thread = threading.Thread(target=self._read_loop, daemon=True)
             self._reader_thread.start()
@@ -94,40 +95,13 @@ class Alsa:
                 # read() blocks until period_size samples are available
                 length, data = self.capture.read()
                 if length > 0:
-                    with self._sub_lock:
-                        for q in self._subscribers:
-                            try:
-                                q.put_nowait(data)
-                            except queue.Full:
-                                # client too slow, drop oldest instead of stalling the rest
-                                try:
-                                    q.get_nowait()
-                                except queue.Empty:
-                                    pass
-                                try:
-                                    q.put_nowait(data)
-                                except queue.Full:
-                                    pass
+                    self.publish(data)
             except alsaaudio.ALSAAudioError:
                 # Xruns
                 continue
             except Exception:
                 break
 
-    def subscribe(self):
-        """
-        Registers a new client, returns the queue it'll receive audio on
-        """
-        q = queue.Queue(maxsize=50)
-        with self._sub_lock:
-            self._subscribers.append(q)
-        return q
-
-    def unsubscribe(self, q):
-        with self._sub_lock:
-            if q in self._subscribers:
-                self._subscribers.remove(q)
-
     def audio_generator(self, q):
         """
         Generator that yields raw PCM data for one subscriber.
@@ -136,11 +110,7 @@ class Alsa:
         if not ALSA_AVAILABLE:
             return False
 
-        while self._running:
-            try:
-                yield q.get(timeout=1)
-            except queue.Empty:
-                continue
+        yield from super().audio_generator(q)
 
     def stop(self):
         """
@@ -156,8 +126,7 @@ class Alsa:
             self._reader_thread.join(timeout=1)
             self._reader_thread = None
 
-        with self._sub_lock:
-            self._subscribers.clear()
+        self.end_subscribers()
 
         if self.capture:
             time.sleep(0.1) # wait gen loop
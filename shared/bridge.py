@@ -0,0 +1,94 @@
+# bridge: async producer -> thread consumer, without ever blocking the event loop
+import asyncio
+import queue
+import time
+
+class PcmBridge:
+    """
+    Bounded hand-off of live audio from the event loop (the HTTP or
+    multicast stream) to the thread feeding the backend.
+
+    put() never blocks the loop: when the backend falls behind and the
+    bridge is full, it awaits until the reader makes room, so we stop
+    reading the stream and the server's drop-oldest policy takes over
+    for us. The reader only wakes the loop up when put() is actually
+    waiting. Waits are counted and timed (waits, waited).
+    """
+
+    def __init__(self, maxsize: int, event_loop: asyncio.AbstractEventLoop):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._loop = event_loop
+        self._space = asyncio.Event()
+        self._waiting = False
+
+        self.waits = 0
+        self.waited = 0.0 # seconds
+
+    @property
+    def maxsize(self) -> int:
+        return self._queue.maxsize
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return
+
+        except queue.Full:
+            pass
+
+        self.waits += 1
+        started = time.monotonic()
+
+        try:
+            while True:
+                # flag first, so a get() after the retry below knows to wake us up
+                self._waiting = True
+                self._space.clear()
+
+                try:
+                    self._queue.put_nowait(item)
+                    return
+
+                except queue.Full:
+                    pass
+
+                try:
+                    await asyncio.wait_for(self._space.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+
+        finally:
+            self._waiting = False
+            self.waited += time.monotonic() - started
+
+    def close(self):
+        """
+        Ends the reader's stream (once it read what's queued, or right
+        away if it's full). Never blocks.
+        """
+
+        try:
+            self._queue.put_nowait(None)
+
+        except queue.Full:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            self._queue.put_nowait(None)
+
+    def get(self, timeout: float = None):
+        """
+        Reader side (thread): blocks up to timeout, raises queue.Empty
+        """
+
+        item = self._queue.get(timeout=timeout)
+
+        if self._waiting:
+            self._loop.call_soon_threadsafe(self._space.set)
+
+        return item
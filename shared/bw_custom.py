@@ -5,8 +5,23 @@ from pathlib import Path
 
 from shared.dirutils import BW_PATH
 from shared.env import Env
+from shared.logger import Log
+from shared.prefetch import prefetch
+from shared.syscheck import backend_unchanged, locate_backend
 
 class BWCustom(Backend):
+    """
+    PiWave backend for bw_custom.
+
+    The executable is resolved through shared.syscheck's backend
+    cache, checked against the binary's inode/mtime/size instead of
+    running it on every PiWave() like PiWave's own cache does. The
+    result of the one-time --help probe stored with it is exposed
+    as capabilities.
+    """
+
+    _entry = None # resolved once per process, until the binary changes
+
     @property
     def name(self):
         path = Env.get("BACKEND_PATH")
@@ -28,12 +43,49 @@ class BWCustom(Backend):
 
     @property
     def supports_live_streaming(self):
-        return True
+        flags = self.capabilities.get('flags')
+        return "-raw" in flags if flags else True
 
     @property
     def supports_loop(self):
         return True
 
+    @property
+    def capabilities(self) -> dict:
+        entry = self.resolve()
+        return entry.get('capabilities', {}) if entry else {}
+
+    def _find_executable(self, force: bool = False) -> str:
+        entry = self.resolve(force=force)
+
+        if not entry:
+            raise BackendError(f"Could not find {self.name}. Set BACKEND_PATH to its location.")
+
+        return entry['path']
+
+    @classmethod
+    def resolve(cls, force: bool = False):
+        # a stat, not a run: a binary replaced while we run is picked up (and probed) again
+        if cls._entry is None or force or not backend_unchanged(cls._entry):
+            cls._entry = locate_backend(force=force or Env.get_bool("BACKEND_BYPASS_CACHE"))
+
+        return cls._entry
+
+    @classmethod
+    def warm_up(cls):
+        """
+        Resolves the backend once and reads its binary into the page
+        cache, so the first broadcast doesn't pay for it.
+        """
+
+        entry = cls.resolve()
+
+        if not entry:
+            return
+
+        prefetch(entry['path'])
+        Log.debug(f"Backend warmed up: {entry['path']} ({len(entry.get('capabilities', {}).get('flags', []))} flags probed)")
+
     def _get_executable_name(self):
         path = Env.get("BACKEND_PATH")
 
@@ -0,0 +1,161 @@
+# live dsp: processing applied once per live stream, before the fan-out
+import time
+from pathlib import Path
+from typing import Optional
+
+from shared.env import Env
+from shared.logger import Log
+
+class LiveDsp:
+    """
+    Optional processing of live PCM periods, vectorized with NumPy:
+    mono fold-down, gain, FM pre-emphasis, soft limiter and sample rate
+    conversion, in that order. Each stage is enabled by its own
+    LIVE_* variable, and from_env() returns None when none is.
+
+    The chain is stateful (pre-emphasis and resampler carry the end
+    of the previous period), so one instance handles one stream: it
+    runs in the source's thread, once per period, whatever the number
+    of subscribers.
+
+    Resampling is linear interpolation: cheap enough for a Pi, fine
+    for FM audio, but not meant for large ratio changes.
+    """
+
+    def __init__(self, np, rate: int, channels: int):
+        self.np = np
+        self.rate = rate
+        self.channels = channels
+
+        self.gain = 10 ** (Env.get_float("LIVE_GAIN_DB", 0) / 20)
+        self.mono = Env.get_bool("LIVE_MONO") and channels > 1
+        self.out_channels = 1 if self.mono else channels
+
+        threshold = Env.get("LIVE_LIMITER")
+        self.threshold = min(10 ** (float(threshold) / 20), 1.0) if threshold else None
+
+        # y[n] = (x[n] - a x[n-1]) / (1 - a): unity at DC, boosts highs for a tau time constant
+        tau = Env.get_float("LIVE_PREEMPHASIS", 0) / 1e6
+        self.emphasis = float(np.exp(-1 / (tau * rate))) if tau > 0 else None
+        self._previous = np.zeros(self.out_channels, dtype=np.float32)
+
+        self.out_rate = Env.get_int("LIVE_RESAMPLE", 0) or rate
+        self._step = rate / self.out_rate
+        self._position = 1.0 # next output sample, in input frames from the end of the last period
+        self._last = np.zeros(self.out_channels, dtype=np.float32)
+
+        self.cost = 0.0 # average seconds spent per period
+        self.periods = 0
+
+    @classmethod
+    def from_env(cls, rate: int, channels: int) -> Optional["LiveDsp"]:
+        enabled = (
+            Env.get_float("LIVE_GAIN_DB", 0) != 0
+            or Env.get_bool("LIVE_MONO")
+            or Env.get("LIVE_LIMITER")
+            or Env.get_float("LIVE_PREEMPHASIS", 0) > 0
+            or Env.get_int("LIVE_RESAMPLE", 0) not in (0, rate)
+        )
+
+        if not enabled:
+            return None
+
+        try:
+            import numpy as np
+
+        except ImportError:
+            pip_path = Path(__file__).parent.parent / "venv" / "bin" / "pip"
+
+            Log.error("Live processing needs numpy, streaming unprocessed audio. Please install it:")
+            Log.error(f"{pip_path} install numpy")
+            return None
+
+        try:
+            dsp = cls(np, rate, channels)
+
+        except ValueError as e:
+            Log.error(f"Invalid live processing settings, streaming unprocessed audio: {e}")
+            return None
+
+        Log.broadcast(f"Live processing: {dsp.describe()}")
+        return dsp
+
+    def describe(self) -> str:
+        stages = []
+
+        if self.mono:
+            stages.append("mono")
+
+        if self.gain != 1:
+            stages.append(f"gain {Env.get_float('LIVE_GAIN_DB', 0):+g}dB")
+
+        if self.emphasis is not None:
+            stages.append(f"pre-emphasis {Env.get_float('LIVE_PREEMPHASIS', 0):g}us")
+
+        if self.threshold is not None:
+            stages.append(f"limiter {Env.get('LIVE_LIMITER')}dBFS")
+
+        if self.out_rate != self.rate:
+            stages.append(f"resample {self.rate}->{self.out_rate}Hz")
+
+        return ", ".join(stages)
+
+    def process(self, data: bytes) -> bytes:
+        np = self.np
+        started = time.perf_counter()
+
+        frames = len(data) // (2 * self.channels)
+        x = np.frombuffer(data, dtype=np.int16, count=frames * self.channels).reshape(frames, self.channels)
+        x = x.astype(np.float32) * (self.gain / 32768)
+
+        if self.mono:
+            x = x.sum(axis=1, keepdims=True) * (1 / self.channels)
+
+        if self.emphasis is not None and frames:
+            a = self.emphasis
+            shifted = np.concatenate((self._previous[None, :], x[:-1]))
+            self._previous = x[-1].copy()
+            x = (x - a * shifted) / (1 - a)
+
+        if self.threshold is not None:
+            # transparent below the threshold, then bends smoothly towards full scale
+            t = self.threshold
+            magnitude = np.abs(x)
+            over = magnitude > t
+
+            if over.any():
+                knee = 1 - t if t < 1 else 1e-6
+                x = np.where(over, np.sign(x) * (t + knee * np.tanh((magnitude - t) / knee)), x)
+
+        if self.out_rate != self.rate and frames:
+            x = self._resample(x)
+
+        out = (np.clip(x, -1, 1) * 32767).astype(np.int16).tobytes()
+
+        elapsed = time.perf_counter() - started
+        self.periods += 1
+        self.cost += (elapsed - self.cost) / min(self.periods, 100)
+
+        return out
+
+    def _resample(self, x):
+        np = self.np
+
+        # previous period's last frame at index 0, so positions in (0, 1) interpolate across the boundary
+        frames = len(x)
+        padded = np.concatenate((self._last[None, :], x))
+        positions = np.arange(self._position, frames, self._step)
+
+        self._last = x[-1].copy()
+
+        if not len(positions):
+            self._position -= frames
+            return x[:0]
+
+        self._position = positions[-1] + self._step - frames
+
+        index = positions.astype(np.int64)
+        fraction = (positions - index).astype(np.float32)[:, None]
+        nxt = np.minimum(index + 1, frames)
+
+        return padded[index] * (1 - fraction) + padded[nxt] * fraction
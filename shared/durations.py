@@ -0,0 +1,81 @@
+import os
+import struct
+import threading
+from typing import Optional
+
+from shared.logger import Log
+
+_cache = {} # path -> (size, mtime, duration)
+_lock = threading.Lock()
+
+def _read_header(path: str) -> Optional[float]:
+    # walks the RIFF chunks up to "data", never reads the audio itself
+    with open(path, "rb") as f:
+        riff = f.read(12)
+
+        if len(riff) < 12 or riff[:4] not in (b"RIFF", b"RF64") or riff[8:12] != b"WAVE":
+            return None
+
+        byte_rate = None
+        data_size = None
+
+        while True:
+            header = f.read(8)
+
+            if len(header) < 8:
+                break
+
+            chunk_id, chunk_size = struct.unpack("<4sI", header)
+
+            if chunk_id == b"fmt ":
+                fmt = f.read(chunk_size)
+                byte_rate = struct.unpack("<I", fmt[8:12])[0]
+                chunk_size = 0
+
+            elif chunk_id == b"data":
+                data_size = chunk_size
+
+                # streamed wavs leave the size unset, use what's on disk
+                if data_size in (0, 0xFFFFFFFF):
+                    data_size = os.fstat(f.fileno()).st_size - f.tell()
+
+                break
+
+            f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+    if not byte_rate or data_size is None:
+        return None
+
+    return data_size / byte_rate
+
+def wav_duration(path: str) -> Optional[float]:
+    """
+    Duration of a WAV file in seconds, read from its header.
+    Results are cached until the file size or mtime changes.
+
+    Returns None if the file can't be read or isn't a WAV.
+    """
+
+    try:
+        stat = os.stat(path)
+
+    except OSError:
+        return None
+
+    with _lock:
+        cached = _cache.get(path)
+
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+
+    try:
+        duration = _read_header(path)
+
+    except (OSError, struct.error) as e:
+        Log.debug(f"Could not read the duration of {path}: {e}")
+        duration = None
+
+    with _lock:
+        _cache[path] = (stat.st_size, stat.st_mtime_ns, duration)
+
+    return duration
@@ -0,0 +1,365 @@
+import queue
+import threading
+import time
+from collections import deque
+
+from shared.dsp import LiveDsp
+from shared.env import Env
+from shared.logger import Log
+from shared.meter import LevelMeter
+
+class Subscription(queue.Queue):
+    """
+    One subscriber's queue of (seq, captured, data) periods, with what
+    it received and lost. seq counts the source's periods, captured is
+    the time.time() they were published at.
+
+    Only listening subscriptions keep the source from idle stopping.
+    """
+
+    def __init__(self, name: str = None, maxsize: int = 0, listening: bool = True):
+        super().__init__(maxsize=maxsize)
+        self.name = name
+        self.listening = listening
+        self.delivered = 0
+        self.dropped = 0
+        self.since = time.time()
+
+class PcmFanout:
+    """
+    Fans raw PCM periods out to any number of subscribers, each with
+    its own bounded queue. A subscriber that falls behind loses its
+    oldest periods instead of stalling the others.
+
+    Sources (the ALSA capture, the queue programme) publish() from a
+    single thread, and each live client reads its queue through
+    audio_generator(). For remote clients BWHTTPFileServer subscribes
+    when the client actually connects to /stream/ and unsubscribes
+    when it leaves, so a token that's never used holds no queue.
+
+    Once the last subscriber is gone (or when nobody subscribed after
+    start), the source stops itself after LIVE_IDLE_TIMEOUT seconds,
+    releasing the capture device. Sources that must keep running on
+    their own (the queue programme) set idle_stop to False. Relays
+    (the multicast sender) subscribe without listening, and say when
+    someone listens through them with set_listening().
+
+    Sources call prepare() when they start, which sets up the optional
+    live processing (shared.dsp.LiveDsp). It then runs once per period
+    in publish(), before the fan-out, and may change the format the
+    subscribers get: output_rate / output_channels.
+
+    What's published is also metered (shared.meter.LevelMeter). Silence
+    starting or ending is reported to the callback given to watch(),
+    on its event loop.
+
+    Every period gets a sequence number and its publish time, which
+    frame_generator() hands out with it (for framed /stream/ requests),
+    and each Subscription counts the periods it lost.
+
+    The last LIVE_RESUME_SECONDS of periods are kept, so a client
+    reconnecting after a dropped connection can subscribe() again
+    where it left off instead of losing what was published meanwhile.
+    Until then, hold() keeps the source from idle stopping.
+    """
+
+    QUEUE_SIZE = 50
+    description = "live"
+    idle_stop = True
+
+    def __init__(self):
+        self._running = False
+        self._subscribers = []
+        self._sub_lock = threading.Lock()
+        self.dsp = None
+        self.meter = None
+        self._watcher = None
+        self._idle_timer = None
+        self._seq = 0
+        self._history = deque()
+        self._history_seconds = 0
+        self._holds = {} # key -> time.time() deadline
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def listeners(self) -> int:
+        return sum(1 for q in self._subscribers if q.listening)
+
+    def subscriptions(self) -> list:
+        with self._sub_lock:
+            return list(self._subscribers)
+
+    @property
+    def output_rate(self):
+        return self.dsp.out_rate if self.dsp else self.rate
+
+    @property
+    def output_channels(self):
+        return self.dsp.out_channels if self.dsp else self.channels
+
+    def prepare(self):
+        self.dsp = LiveDsp.from_env(self.rate, self.channels)
+        self.meter = LevelMeter.create(self.output_rate, self.output_channels)
+        self._history.clear()
+        self._history_seconds = max(Env.get_float("LIVE_RESUME_SECONDS", 5), 0)
+        self._arm_idle()
+
+    def watch(self, callback, event_loop):
+        """
+        Calls callback(source, silent) on event_loop when the published
+        audio goes silent (True) or comes back (False)
+        """
+        self._watcher = (callback, event_loop)
+
+    def publish(self, data: bytes):
+        if self.dsp:
+            data = self.dsp.process(data)
+
+            if not data:
+                return
+
+        if self.meter:
+            change = self.meter.feed(data)
+
+            if change is not None and self._watcher:
+                callback, event_loop = self._watcher
+                event_loop.call_soon_threadsafe(callback, self, change)
+
+        self._seq += 1
+        period = (self._seq, time.time(), data)
+
+        with self._sub_lock:
+            if self._history_seconds:
+                self._history.append(period)
+
+                while self._history[0][1] < period[1] - self._history_seconds:
+                    self._history.popleft()
+
+            for q in self._subscribers:
+                try:
+                    q.put_nowait(period)
+                except queue.Full:
+                    # client too slow, drop oldest instead of stalling the rest
+                    try:
+                        q.get_nowait()
+                        q.dropped += 1
+                    except queue.Empty:
+                        pass
+                    try:
+                        q.put_nowait(period)
+                    except queue.Full:
+                        q.dropped += 1
+
+    def subscribe(self, name: str = None, after: int = None, listening: bool = True) -> Subscription:
+        """
+        Registers a new client, returns the queue it'll receive audio on.
+        With after (a sequence number), the queue starts with the kept
+        periods that followed it, if any.
+        """
+        with self._sub_lock:
+            backlog = [period for period in self._history if period[0] > after] if after is not None else []
+
+            # room for the backlog on top of the usual queue
+            q = Subscription(name, maxsize=self.QUEUE_SIZE + len(backlog), listening=listening)
+
+            for period in backlog:
+                q.put_nowait(period)
+
+            self._subscribers.append(q)
+
+            if listening:
+                self._disarm_idle()
+        return q
+
+    def set_listening(self, q, listening: bool):
+        """
+        Whether anyone listens through q (a relay), which keeps the
+        source from idle stopping
+        """
+        with self._sub_lock:
+            if q not in self._subscribers or q.listening == listening:
+                return
+
+            q.listening = listening
+
+            if listening:
+                self._disarm_idle()
+
+            elif not self.listeners:
+                self._arm_idle()
+
+    def unsubscribe(self, q):
+        """
+        Drops a subscriber, and ends its generator if it's waiting on the queue
+        """
+        with self._sub_lock:
+            if q not in self._subscribers:
+                return
+
+            self._subscribers.remove(q)
+            self._end(q)
+
+            if q.listening and not self.listeners:
+                self._arm_idle()
+
+    def hold(self, key, seconds: float):
+        """
+        Keeps the source from idle stopping for up to seconds, even
+        without subscribers (a client expected to reconnect)
+        """
+        with self._sub_lock:
+            self._holds[key] = time.time() + seconds
+
+            if not self.listeners:
+                self._arm_idle()
+
+    def release(self, key):
+        with self._sub_lock:
+            self._holds.pop(key, None)
+
+    def end_subscribers(self):
+        """
+        Ends every subscriber's stream once it has read what's left in its queue
+        """
+        with self._sub_lock:
+            for q in self._subscribers:
+                self._end(q)
+
+            self._subscribers.clear()
+            self._history.clear()
+            self._holds.clear()
+            self._disarm_idle()
+
+    def audio_generator(self, q):
+        """
+        Generator that yields raw PCM data for one subscriber.
+        It blocks when no audio is available yet.
+        """
+        for _, _, data in self.frame_generator(q):
+            yield data
+
+    def frame_generator(self, q):
+        """
+        Same as audio_generator(), yielding (seq, captured, data) periods
+        """
+        for batch in self.batch_generator(q):
+            yield from batch
+
+    def batch_generator(self, q, periods: int = 1, window: float = 0):
+        """
+        Same as frame_generator(), yielding lists of periods: up to
+        periods of them, or what arrived within window seconds of the
+        first one (0 for no time limit, a batch still goes out after a
+        second without audio).
+        """
+        batch = []
+        deadline = None
+
+        try:
+            while self._running or not q.empty():
+                timeout = 1 if not batch else min(deadline - time.monotonic(), 1)
+
+                try:
+                    period = q.get(timeout=timeout) if timeout > 0 else q.get_nowait()
+                except queue.Empty:
+                    if batch:
+                        yield batch
+                        batch = []
+                    continue
+
+                if period is None:
+                    break
+
+                q.delivered += 1
+                batch.append(period)
+
+                if len(batch) == 1:
+                    deadline = time.monotonic() + window if window > 0 else float("inf")
+
+                if len(batch) >= periods:
+                    yield batch
+                    batch = []
+
+            if batch:
+                yield batch
+
+        finally:
+            self.unsubscribe(q)
+
+    def _end(self, q):
+        try:
+            q.put_nowait(None)
+        except queue.Full:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            q.put_nowait(None)
+
+    # IDLE SHUTDOWN (called with _sub_lock held, or before any subscriber)
+
+    def _arm_idle(self):
+        self._disarm_idle()
+        timeout = Env.get_float("LIVE_IDLE_TIMEOUT", 30)
+
+        if not self.idle_stop or timeout <= 0:
+            return
+
+        now = time.time()
+        self._holds = {key: deadline for key, deadline in self._holds.items() if deadline > now}
+
+        if self._holds:
+            timeout = max(timeout, max(self._holds.values()) - now)
+
+        self._idle_timer = threading.Timer(timeout, self._idle_expired)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _disarm_idle(self):
+        if self._idle_timer:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _idle_expired(self):
+        with self._sub_lock:
+            # re-armed or disarmed since
+            if self._idle_timer is not threading.current_thread():
+                return
+
+            self._idle_timer = None
+
+            if self.listeners or not self._running:
+                return
+
+        Log.broadcast(f"No one is listening to {self.description} anymore, stopping it")
+        self.stop()
+
+class Pacer:
+    """
+    Holds a producer with no clock of its own (a rendered or synthetic
+    stream) to real time: wait() sleeps until the frames produced so
+    far are due. Falling more than a second behind restarts the clock
+    instead of bursting to catch up.
+    """
+
+    def __init__(self, rate: int, stop: threading.Event):
+        self.rate = rate
+        self.stop = stop
+        self._clock = None
+        self._sent = 0
+
+    def wait(self, frames: int):
+        now = time.monotonic()
+
+        if self._clock is None or now - (self._clock + self._sent / self.rate) > 1:
+            self._clock = now
+            self._sent = 0
+
+        self._sent += frames
+        delay = self._clock + self._sent / self.rate - time.monotonic()
+
+        if delay > 0:
+            self.stop.wait(delay)
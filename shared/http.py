@@ -3,6 +3,7 @@ import aiofiles
 import asyncio
 import os
 import ssl
+import struct
 import time
 import uuid
 from typing import Dict, Optional
@@ -14,6 +15,11 @@ from shared.security import PathValidator, SecurityError
 def chunk_size() -> int:
     return Env.get_int("HTTP_CHUNK_SIZE", 65536) # 64KB, here so we have the value centralized
 
+# framed live streams (/stream/<token>?framed=1): each period is preceded by
+# a magic, its sequence number, capture time (server's time.time()) and length
+FRAME_MAGIC = b"BWPF"
+FRAME_HEADER = struct.Struct("!4sQdI")
+
 class BWHTTPFileServer:
     
     # http server for downloads / uploads / pcm streaming
@@ -63,13 +69,32 @@ class BWHTTPFileServer:
         }
         return token
     
-    def create_stream_token(self, audio_generator, rate: int = 48000, channels: int = 2) -> str:
+    @property
+    def reconnect_window(self):
+        return Env.get_float("LIVE_RECONNECT_WINDOW", 60)
+
+    def create_stream_token(self, source, client_id: str = None, expires: bool = True) -> str:
+        """
+        Token for a live stream of source (a shared.fanout.PcmFanout).
+        The client subscribes only once it connects, for as long as it
+        stays connected: an unused token doesn't hold a queue.
+
+        The token is a session rather than a single connection: it stays
+        valid while connected, then for LIVE_RECONNECT_WINDOW seconds
+        after the connection drops, so the client can reconnect (and
+        resume, with ?after=<last sequence number received>). A new
+        connection takes over from an older one still open.
+
+        Without expires, the token stays valid for as long as the source
+        runs (a fallback for clients receiving it another way).
+        """
         token = uuid.uuid4().hex
         self.stream_tokens[token] = {
-            'generator': audio_generator,
-            'rate': rate,
-            'channels': channels,
-            'expires': time.time() + self.token_lifetime
+            'source': source,
+            'client_id': client_id,
+            'expiring': expires,
+            'expires': time.time() + self.token_lifetime if expires else None,
+            'queue': None # subscription of the current connection
         }
         return token
     
@@ -212,34 +237,75 @@ class BWHTTPFileServer:
         
         token_data = self.stream_tokens[token]
         
-        if time.time() > token_data['expires']:
+        if token_data['expires'] and time.time() > token_data['expires']:
             del self.stream_tokens[token]
             return web.Response(status=403, text="Token expired")
         
-        audio_generator = token_data['generator']
-        rate = token_data.get('rate', Env.get_int("ALSA_RATE", 48000))
-        channels = token_data.get('channels', Env.get_int("ALSA_CHANNELS", 2))
-        
-        response = web.StreamResponse(
-            status=200,
-            headers={
-                'Content-Type': 'audio/pcm',
-                'Cache-Control': 'no-cache',
-                'X-Sample-Rate': str(rate),
-                'X-Channels': str(channels),
-                'X-Sample-Format': 'S16_LE'
-            }
-        )
+        source = token_data['source']
+
+        if not source.running:
+            del self.stream_tokens[token]
+            return web.Response(status=410, text="Stream ended")
+
+        rate = source.output_rate
+        channels = source.output_channels
+        framed = request.query.get('framed') == "1"
+
+        try:
+            after = int(request.query['after']) if 'after' in request.query else None
+        except ValueError:
+            return web.Response(status=400, text="Invalid sequence number")
+
+        headers = {
+            'Content-Type': 'audio/pcm',
+            'Cache-Control': 'no-cache',
+            'X-Sample-Rate': str(rate),
+            'X-Channels': str(channels),
+            'X-Sample-Format': 'S16_LE'
+        }
+
+        if framed:
+            headers['X-Framing'] = "bwpf"
         
-        await response.prepare(request)
+        response = web.StreamResponse(status=200, headers=headers)
         
+        await response.prepare(request)
+
+        if token_data['queue'] is not None:
+            # the previous connection is dead but wasn't noticed yet, ends it
+            source.unsubscribe(token_data['queue'])
+
+        client_queue = source.subscribe(token_data.get('client_id'), after)
+        source.release(token)
+        token_data['queue'] = client_queue
+
+        if token_data['expiring']:
+            token_data['expires'] = None # while connected
+
+        if after is not None:
+            Log.server(f"Client reconnected to PCM stream, resuming {client_queue.qsize()} period(s) behind ({source.listeners} listener(s) on {source.description})")
+        else:
+            Log.server(f"Client connected to PCM stream ({source.listeners} listener(s) on {source.description})")
+        
+        # periods coalesced per write (and per executor hop), fewer TLS records for a bit of latency
+        batches = source.batch_generator(
+            client_queue,
+            max(Env.get_int("LIVE_COALESCE_PERIODS", 1), 1),
+            Env.get_float("LIVE_COALESCE_MS", 0) / 1000
+        )
+
         try:
             loop = asyncio.get_event_loop()
             
-            async for pcm_chunk in self._async_generator_wrapper(audio_generator, loop):
-                if pcm_chunk:
+            async for batch in self._async_generator_wrapper(batches, loop):
+                if batch:
+                    if framed:
+                        data = b"".join(FRAME_HEADER.pack(FRAME_MAGIC, seq, captured, len(pcm)) + pcm for seq, captured, pcm in batch)
+                    else:
+                        data = b"".join(pcm for _, _, pcm in batch)
+
                     try:
-                        await response.write(pcm_chunk)
+                        await response.write(data)
                         await response.drain()
                     except (ConnectionResetError, BrokenPipeError):
                         Log.server("Client disconnected from PCM stream")
@@ -256,14 +322,26 @@ class BWHTTPFileServer:
         except Exception as e:
             Log.error(f"PCM stream error: {e}")
         finally:
+            # also wakes the generator up if it's waiting for audio
+            source.unsubscribe(client_queue)
+
             try:
                 if not (request.transport is None or request.transport.is_closing()):
                     await response.write_eof()
             except:
                 pass
             
-            if token in self.stream_tokens:
-                del self.stream_tokens[token]
+            if token_data['queue'] is client_queue:
+                token_data['queue'] = None
+
+                if not source.running or self.reconnect_window <= 0:
+                    self.stream_tokens.pop(token, None)
+                else:
+                    # kept for the client to reconnect, and so is the source
+                    source.hold(token, self.reconnect_window)
+
+                    if token_data['expiring']:
+                        token_data['expires'] = time.time() + self.reconnect_window
         
         return response
     
@@ -312,7 +390,7 @@ class BWHTTPFileServer:
             
             expired_stream = [
                 token for token, data in self.stream_tokens.items()
-                if current_time > data['expires']
+                if (data['expires'] and current_time > data['expires']) or not data['source'].running
             ]
             for token in expired_stream:
                 del self.stream_tokens[token]
@@ -395,27 +473,110 @@ class BWHTTPFileClient:
             Log.error(f"Download error: {e}")
             return False
         
-    async def stream_pcm_generator(self, server_host: str, server_port: int, token: str, rate: int = 48000, channels: int = 2, chunk_size: int = 1024):
-        url = f"https://{server_host}:{server_port}/stream/{token}"
-        
-        try:
-            connector = TCPConnector(ssl=self.ssl_context)
-            timeout = ClientTimeout(total=None, connect=30, sock_read=None)
-            
-            async with ClientSession(connector=connector, timeout=timeout) as session:
-                async with session.get(url) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        Log.error(f"Stream failed: {error_text}")
-                        return
-                    
-                    Log.success(f"Connected to PCM stream (rate={rate}, channels={channels})")
-                    
-                    async for chunk in response.content.iter_chunked(chunk_size * channels * 2):
-                        yield chunk
-                    
-                    Log.info("Stream ended")
-                    
-        except Exception as e:
-            Log.error(f"Stream error: {type(e).__name__}: {e}")
-            return
\ No newline at end of file
+    async def stream_pcm_generator(self, server_host: str, server_port: int, token: str, rate: int = 48000, channels: int = 2, chunk_size: int = 1024, stats: dict = None):
+        """
+        Yields lists of (seq, captured, data) periods of a live stream,
+        as many as each read got (so as coalesced by the server). Servers
+        that don't frame their streams yield [(None, None, data)] chunks.
+
+        When the connection drops (or nothing arrives for
+        LIVE_STALL_TIMEOUT seconds), reconnects with the same token,
+        backing off from LIVE_RECONNECT_BACKOFF seconds up to 5, for up
+        to LIVE_RECONNECT_TIMEOUT seconds. The server resumes after the
+        last period received, or from the latest one with LIVE_RESUME
+        off. Ends once the server says the stream is over (or the token
+        is no longer valid). Reconnections are counted in stats.
+        """
+        url = f"https://{server_host}:{server_port}/stream/{token}?framed=1"
+
+        reconnect = Env.get_bool("LIVE_RECONNECT", True)
+        resume = Env.get_bool("LIVE_RESUME", True)
+        give_up = Env.get_float("LIVE_RECONNECT_TIMEOUT", 60)
+        backoff = Env.get_float("LIVE_RECONNECT_BACKOFF", 0.5)
+        stall = Env.get_float("LIVE_STALL_TIMEOUT", 5)
+
+        delay = backoff
+        last_seq = None
+        lost_at = None # time.monotonic() the connection dropped at
+
+        while True:
+            try:
+                connector = TCPConnector(ssl=self.ssl_context)
+                timeout = ClientTimeout(total=None, connect=30, sock_read=stall if stall > 0 else None)
+                query = f"&after={last_seq}" if resume and last_seq is not None else ""
+
+                async with ClientSession(connector=connector, timeout=timeout) as session:
+                    async with session.get(url + query) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+
+                            if lost_at is not None and response.status in (404, 410):
+                                Log.info("Stream is over")
+                                return
+
+                            Log.error(f"Stream failed: {error_text}")
+
+                            if response.status in (400, 403, 404, 410):
+                                return
+
+                            raise ConnectionError(f"HTTP {response.status}")
+
+                        if lost_at is None:
+                            Log.success(f"Connected to PCM stream (rate={rate}, channels={channels})")
+                        else:
+                            Log.success(f"Reconnected to PCM stream after {time.monotonic() - lost_at:.1f}s")
+
+                            if stats is not None:
+                                stats['reconnects'] = stats.get('reconnects', 0) + 1
+
+                        lost_at = None
+                        delay = backoff
+
+                        if response.headers.get('X-Framing') != "bwpf":
+                            async for chunk in response.content.iter_chunked(chunk_size * channels * 2):
+                                yield [(None, None, chunk)]
+
+                        else:
+                            buffer = bytearray()
+
+                            async for data in response.content.iter_any():
+                                buffer += data
+                                batch = []
+
+                                while len(buffer) >= FRAME_HEADER.size:
+                                    magic, seq, captured, length = FRAME_HEADER.unpack_from(buffer)
+
+                                    if magic != FRAME_MAGIC:
+                                        raise ValueError("corrupted stream framing")
+
+                                    end = FRAME_HEADER.size + length
+
+                                    if len(buffer) < end:
+                                        break
+
+                                    batch.append((seq, captured, bytes(buffer[FRAME_HEADER.size:end])))
+                                    del buffer[:end]
+
+                                if batch:
+                                    last_seq = batch[-1][0]
+                                    yield batch
+
+                        # the server ends it when the source stops, reconnecting tells us for sure (410)
+                        Log.info("Stream ended")
+
+            except Exception as e:
+                Log.error(f"Stream error: {type(e).__name__}: {e}")
+
+            if not reconnect:
+                return
+
+            if lost_at is None:
+                lost_at = time.monotonic()
+
+            elif time.monotonic() - lost_at > give_up:
+                Log.error(f"Could not reconnect to the stream for {give_up:g}s, giving up")
+                return
+
+            Log.warning(f"Stream interrupted, reconnecting in {delay:g}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5)
@@ -0,0 +1,259 @@
+# live sources: what 'live' can broadcast besides the ALSA card
+import math
+import subprocess
+import sys
+import threading
+from array import array
+from typing import Optional
+
+from shared.env import Env
+from shared.fanout import PcmFanout, Pacer
+from shared.logger import Log
+
+KINDS = ("alsa", "file", "url", "pipe", "stdin", "tone")
+
+class LiveSourceError(Exception):
+    pass
+
+class ThreadSource(PcmFanout):
+    """
+    A live source producing PCM from its own thread, in the format the
+    live path expects (s16le, LIVE_RATE Hz, LIVE_CHANNELS channels,
+    ALSA_PERIODSIZE frames per period). The stream ends for every
+    subscriber when the source runs out or is stopped.
+
+    Subclasses define _produce(), publishing periods until they run
+    out or _stop is set, and may override _open() / _close().
+    """
+
+    def __init__(self, description: str):
+        super().__init__()
+        self.description = description
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def rate(self):
+        return Env.get_int("LIVE_RATE", 48000)
+
+    @property
+    def channels(self):
+        return Env.get_int("LIVE_CHANNELS", 2)
+
+    @property
+    def period_size(self):
+        return Env.get_int("ALSA_PERIODSIZE", 1024)
+
+    @property
+    def period_bytes(self):
+        return self.period_size * self.channels * 2
+
+    def start(self) -> bool:
+        if self._running:
+            return True
+
+        self._stop.clear()
+
+        try:
+            self._open()
+
+        except LiveSourceError as e:
+            Log.error(f"Could not open {self.description}: {e}")
+            return False
+
+        self.prepare()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        self._close()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+        self._thread = None
+        self._running = False
+        self.end_subscribers()
+
+    def _run(self):
+        try:
+            self._produce()
+
+        except Exception as e:
+            Log.error(f"Live source error ({self.description}): {e}")
+
+        finally:
+            if not self._stop.is_set():
+                Log.broadcast(f"Live source ended: {self.description}")
+
+            self._close()
+            self._running = False
+            self.end_subscribers()
+
+    def _open(self):
+        pass
+
+    def _close(self):
+        pass
+
+class FfmpegSource(ThreadSource):
+    """
+    Decodes a file, an URL (Icecast relay, HLS, ...), the output of a
+    shell command or our own stdin through ffmpeg. Inputs are read at
+    their native rate (-re), so files play in real time too.
+    """
+
+    def __init__(self, kind: str, target: str = ""):
+        super().__init__(f"{kind}:{target}" if target else kind)
+        self.kind = kind
+        self.target = target
+        self._process = None
+        self._feeder = None
+
+    def _open(self):
+        if self.kind == "pipe" and not Env.get_bool("LIVE_ALLOW_PIPE"):
+            raise LiveSourceError("shell pipes are disabled, set LIVE_ALLOW_PIPE to true to allow them")
+
+        if self.kind == "stdin" and sys.stdin.isatty():
+            raise LiveSourceError("stdin is a terminal, pipe some audio into BotWave instead")
+
+        stdin = subprocess.DEVNULL
+
+        if self.kind == "pipe":
+            try:
+                self._feeder = subprocess.Popen(self.target, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                raise LiveSourceError(str(e))
+
+            stdin = self._feeder.stdout
+
+        elif self.kind == "stdin":
+            stdin = sys.stdin.buffer
+
+        source = self.target if self.kind in ("file", "url") else "pipe:0"
+
+        cmd = [
+            "ffmpeg",
+            "-loglevel", "error",
+            "-re",
+            "-i", source,
+            "-vn",
+            "-f", "s16le",
+            "-acodec", "pcm_s16le",
+            "-ar", str(self.rate),
+            "-ac", str(self.channels),
+            "-"
+        ]
+
+        try:
+            self._process = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+        except OSError as e:
+            self._close()
+            raise LiveSourceError(f"could not run ffmpeg: {e}")
+
+        if self._feeder:
+            self._feeder.stdout.close() # ffmpeg holds it now
+
+    def _close(self):
+        for process in (self._process, self._feeder):
+            if process and process.poll() is None:
+                process.kill()
+                process.wait()
+
+    def _produce(self):
+        while not self._stop.is_set():
+            data = self._process.stdout.read(self.period_bytes)
+
+            if not data:
+                break
+
+            self.publish(data)
+
+class ToneSource(ThreadSource):
+    """
+    A synthetic sine tone, to test or load-test live streaming without
+    any audio input. One second of it is computed once and looped.
+    """
+
+    def __init__(self, frequency: float = 1000):
+        super().__init__(f"tone:{frequency:g}")
+        self.frequency = frequency
+        self._second = b""
+
+    def _open(self):
+        # whole cycles in one second, so the loop is seamless
+        frequency = max(round(self.frequency), 1)
+        amplitude = 32767 * Env.get_float("LIVE_TONE_LEVEL", 0.5)
+        step = 2 * math.pi * frequency / self.rate
+
+        samples = array("h")
+
+        for i in range(self.rate):
+            sample = int(amplitude * math.sin(step * i))
+            samples.extend([sample] * self.channels)
+
+        if sys.byteorder != "little":
+            samples.byteswap()
+
+        self._second = samples.tobytes()
+
+    def _produce(self):
+        pacer = Pacer(self.rate, self._stop)
+        position = 0
+        period = self.period_bytes
+
+        while not self._stop.is_set():
+            data = self._second[position:position + period]
+
+            if len(data) < period:
+                position = period - len(data)
+                data += self._second[:position]
+            else:
+                position += period
+
+            self.publish(data)
+            pacer.wait(self.period_size)
+
+def parse_source(spec: str) -> Optional[tuple]:
+    """
+    Splits a live source argument into (kind, target). Bare URLs are
+    taken as url sources. Returns None if it isn't a source.
+    """
+
+    if spec.startswith(("http://", "https://", "icecast://", "rtsp://", "rtmp://")):
+        return ("url", spec)
+
+    kind, _, target = spec.partition(":")
+    kind = kind.lower()
+
+    if kind not in KINDS:
+        return None
+
+    return (kind, target)
+
+def create_source(kind: str, target: str = "") -> ThreadSource:
+    """
+    Builds a (not yet started) source for anything but alsa, which
+    stays the owner's Alsa() instance.
+    """
+
+    if kind in ("file", "url", "pipe"):
+        if not target:
+            raise LiveSourceError(f"'{kind}' needs a target, like {kind}:<{'command' if kind == 'pipe' else kind}>")
+
+        return FfmpegSource(kind, target)
+
+    if kind == "stdin":
+        return FfmpegSource("stdin")
+
+    if kind == "tone":
+        try:
+            return ToneSource(float(target) if target else 1000)
+        except ValueError:
+            raise LiveSourceError(f"invalid tone frequency: {target}")
+
+    raise LiveSourceError(f"unknown source: {kind}")
@@ -24,6 +24,7 @@ class Logger(DLogger):
         'morse': 'MORSE',
         'alsa': 'ALSA',
         'queue': 'QUEUE',
+        'schedule': 'SCHED',
         'debug': 'DBG',
         'converter': 'CVRT',
         'environ': 'ENV'
@@ -47,6 +48,7 @@ class Logger(DLogger):
         'morse': 'purple',
         'alsa': 'pink',
         'queue': 'orange',
+        'schedule': 'rgb(255,170,80)',
         'debug': 'orange',
         'converter': 'rgb(50,215,165)',
         'environ': 'rgb(224,107,61)'
@@ -0,0 +1,127 @@
+# live level meter & silence detector
+import math
+from typing import Optional
+
+from shared.env import Env
+
+class LevelMeter:
+    """
+    RMS / peak meter and silence detector for s16le PCM, fed one
+    period at a time (a single NumPy pass over it).
+
+    The RMS is smoothed over ~300ms, the peak held for a second.
+    The stream counts as silent once its RMS stayed under
+    LIVE_SILENCE_DB for LIVE_SILENCE_AFTER seconds, and as having
+    audio again with the first period above it.
+
+    Needs numpy, use create() to get None instead when it's missing
+    (imported there, so importing this module stays cheap).
+    """
+
+    SMOOTHING = 0.3 # seconds
+    FLOOR = -120.0 # dBFS reported for digital silence
+
+    def __init__(self, rate: int, channels: int, np):
+        self._np = np
+        self.rate = rate
+        self.channels = channels
+        self.threshold = Env.get_float("LIVE_SILENCE_DB", -50)
+        self.after = Env.get_float("LIVE_SILENCE_AFTER", 10)
+
+        self.rms = None
+        self.peak = None
+        self.silent = False
+        self.quiet_for = 0.0 # seconds under the threshold
+        self.last_silence = 0.0 # length of the last silence, once over
+
+        self._power = 0.0
+        self._window_peak = 0
+        self._window_frames = 0
+
+    @classmethod
+    def create(cls, rate: int, channels: int) -> Optional["LevelMeter"]:
+        if not Env.get_bool("LIVE_METER", True):
+            return None
+
+        try:
+            import numpy as np
+        except ImportError:
+            return None
+
+        return cls(rate, channels, np)
+
+    def _db(self, value: float) -> float:
+        return max(20 * math.log10(value), self.FLOOR) if value > 0 else self.FLOOR
+
+    def feed(self, data: bytes) -> Optional[bool]:
+        """
+        Meters a period. Returns True when the stream just became
+        silent, False when audio just came back, None otherwise.
+        """
+
+        np = self._np
+        samples = np.frombuffer(data, dtype=np.int16, count=len(data) // 2)
+
+        if not len(samples):
+            return None
+
+        frames = len(samples) / self.channels
+        duration = frames / self.rate
+
+        floats = samples.astype(np.float32)
+        power = float(np.dot(floats, floats)) / len(samples) / (32768 * 32768)
+        peak = int(np.abs(samples).max())
+
+        k = math.exp(-duration / self.SMOOTHING)
+        self._power = self._power * k + power * (1 - k)
+        self.rms = self._db(math.sqrt(self._power))
+
+        self._window_peak = max(self._window_peak, peak)
+        self._window_frames += frames
+
+        if self.peak is None or self._window_frames >= self.rate:
+            self.peak = self._db(self._window_peak / 32768)
+            self._window_peak = 0
+            self._window_frames = 0
+
+        if self._db(math.sqrt(power)) < self.threshold:
+            self.quiet_for += duration
+
+            if not self.silent and self.quiet_for >= self.after:
+                self.silent = True
+                return True
+
+            return None
+
+        if self.silent:
+            self.last_silence = self.quiet_for
+            self.quiet_for = 0.0
+            self.silent = False
+            return False
+
+        self.quiet_for = 0.0
+
+        return None
+
+    def describe(self) -> str:
+        if self.rms is None:
+            return "no audio yet"
+
+        text = f"{self.rms:.1f} dBFS RMS, {self.peak:.1f} dBFS peak"
+
+        if self.silent:
+            text += f", silent for {int(self.quiet_for)}s"
+
+        return text
+
+    def state(self) -> dict:
+        if self.rms is None:
+            return {}
+
+        return {
+            'level_rms': f"{self.rms:.1f}",
+            'level_peak': f"{self.peak:.1f}",
+            'silent': "true" if self.silent else "false",
+            'silent_for': str(int(self.quiet_for)),
+            'last_silence': str(int(self.last_silence))
+        }
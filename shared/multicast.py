@@ -0,0 +1,388 @@
+# multicast: live PCM sent once to the whole LAN, instead of once per client
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import os
+import socket
+import struct
+import threading
+from collections import deque
+
+from shared.env import Env
+from shared.logger import Log
+
+MAGIC = b"BWMC"
+VERSION = 1
+
+DATA = 0
+PARITY = 1
+
+# magic, version, kind, FEC group size, session, packet sequence number
+# (the first one of the group for parity packets)
+OUTER = struct.Struct("!4sBBBIQ")
+
+# period sequence number, capture time, fragment index, fragment count, payload length
+INNER = struct.Struct("!QdHHH")
+
+TAG_SIZE = 16 # truncated HMAC-SHA256
+
+def _tag(key: bytes, data: bytes) -> bytes:
+    return hmac.new(key, data, hashlib.sha256).digest()[:TAG_SIZE]
+
+def _xor(blobs: list, size: int) -> bytes:
+    result = 0
+
+    for blob in blobs:
+        result ^= int.from_bytes(blob.ljust(size, b"\0"), "big")
+
+    return result.to_bytes(size, "big")
+
+class MulticastSender:
+    """
+    Sends one live source to a multicast group (or a broadcast address)
+    from its own thread, as a single subscriber: the server's cost is
+    the same whatever the number of clients listening on the LAN.
+
+    Periods are split into datagrams of at most LIVE_MULTICAST_PAYLOAD
+    bytes. Every LIVE_MULTICAST_FEC datagrams, a parity one (their XOR)
+    lets receivers rebuild any single one lost in the group. Every
+    datagram is authenticated with a random per session key, which
+    clients get in the STREAM_TOKEN, over the websocket.
+
+    The subscription doesn't count as a listener by itself: the server
+    tells the sender which clients are tuned in (tune()), and the
+    source may idle stop once none is.
+    """
+
+    def __init__(self, source, group: str, port: int):
+        self.source = source
+        self.group = group
+        self.port = port
+        self.key = os.urandom(32)
+        self.session = int.from_bytes(os.urandom(4), "big")
+        self.fec = max(Env.get_int("LIVE_MULTICAST_FEC", 4), 0)
+        self.payload = max(Env.get_int("LIVE_MULTICAST_PAYLOAD", 1280), 256)
+
+        self.packets = 0
+        self.sent_bytes = 0
+
+        self._socket = None
+        self._queue = None
+        self._thread = None
+        self._group = []
+        self.clients = set() # client ids tuned in
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def address(self):
+        return f"{self.group}:{self.port}"
+
+    def start(self) -> bool:
+        try:
+            address = ipaddress.ip_address(self.group)
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+
+            if address.is_multicast:
+                self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, Env.get_int("LIVE_MULTICAST_TTL", 1))
+                self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+                interface = Env.get("LIVE_MULTICAST_IFACE")
+
+                if interface:
+                    self._socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface))
+
+            else:
+                self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+
+        except (ValueError, OSError) as e:
+            Log.error(f"Could not set up multicast to {self.address}: {e}")
+            self.stop()
+            return False
+
+        self._queue = self.source.subscribe("multicast", listening=False)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._queue is not None:
+            self.source.unsubscribe(self._queue)
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+        self._thread = None
+
+        if self._socket:
+            self._socket.close()
+            self._socket = None
+
+    def tune(self, client_id: str, listening: bool):
+        """
+        A client started or stopped playing the stream
+        """
+        if listening:
+            self.clients.add(client_id)
+        else:
+            self.clients.discard(client_id)
+
+        if self._queue is not None:
+            self.source.set_listening(self._queue, bool(self.clients))
+
+    def token(self) -> dict:
+        """
+        What a client needs to receive the stream, sent with the STREAM_TOKEN
+        """
+        return {
+            'mcast': self.address,
+            'mkey': self.key.hex(),
+            'msession': str(self.session)
+        }
+
+    def _run(self):
+        packet_seq = 0
+
+        try:
+            for batch in self.source.batch_generator(self._queue):
+                for seq, captured, data in batch:
+                    count = max((len(data) + self.payload - 1) // self.payload, 1)
+
+                    for index in range(count):
+                        part = data[index * self.payload:(index + 1) * self.payload]
+                        blob = INNER.pack(seq, captured, index, count, len(part)) + part
+
+                        self._send(DATA, packet_seq, blob)
+                        packet_seq += 1
+
+                        if self.fec:
+                            self._group.append(blob)
+
+                            if len(self._group) == self.fec:
+                                size = max(len(b) for b in self._group)
+                                self._send(PARITY, packet_seq - self.fec, _xor(self._group, size))
+                                self._group = []
+
+        except OSError as e:
+            Log.error(f"Multicast send error: {e}")
+
+    def _send(self, kind: int, packet_seq: int, blob: bytes):
+        datagram = OUTER.pack(MAGIC, VERSION, kind, self.fec, self.session, packet_seq) + blob
+        datagram += _tag(self.key, datagram)
+
+        self._socket.sendto(datagram, (self.group, self.port))
+        self.packets += 1
+        self.sent_bytes += len(datagram)
+
+class MulticastReceiver(asyncio.DatagramProtocol):
+    """
+    Receiving end of a MulticastSender: checks each datagram, rebuilds
+    lost ones from the parity ones when it can, reassembles periods,
+    and hands them out in order. A period still missing once REORDER
+    newer ones are complete is given up on.
+    """
+
+    REORDER = 4 # periods
+    WINDOW = 256 # datagrams kept for FEC recovery
+
+    def __init__(self, key: bytes, session: int):
+        self.key = key
+        self.session = session
+        self.transport = None
+
+        self.ready = asyncio.Queue()
+        self.received = 0
+        self.recovered = 0
+        self.rejected = 0
+        self.lost = 0
+
+        self._blobs = {} # packet seq -> blob
+        self._parity = {} # first packet seq -> (group size, blob)
+        self._fragments = {} # period seq -> {index: payload}
+        self._periods = {} # period seq -> (captured, data), complete but not handed out
+        self._next = None # next period to hand out
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, datagram: bytes, address):
+        if len(datagram) < OUTER.size + TAG_SIZE:
+            self.rejected += 1
+            return
+
+        body, tag = datagram[:-TAG_SIZE], datagram[-TAG_SIZE:]
+
+        if not hmac.compare_digest(_tag(self.key, body), tag):
+            self.rejected += 1
+            return
+
+        magic, version, kind, fec, session, packet_seq = OUTER.unpack_from(body)
+
+        if magic != MAGIC or version != VERSION or session != self.session:
+            self.rejected += 1
+            return
+
+        blob = body[OUTER.size:]
+        self.received += 1
+
+        if kind == PARITY:
+            self._parity[packet_seq] = (fec, blob)
+            self._recover(packet_seq)
+
+        elif packet_seq not in self._blobs:
+            self._blobs[packet_seq] = blob
+            self._unpack(blob)
+
+            if fec:
+                self._recover(packet_seq - packet_seq % fec)
+
+        self._forget(packet_seq)
+        self._release()
+
+    def _recover(self, first: int):
+        if first not in self._parity:
+            return
+
+        fec, parity = self._parity[first]
+        missing = [seq for seq in range(first, first + fec) if seq not in self._blobs]
+
+        if len(missing) != 1:
+            if not missing:
+                del self._parity[first]
+            return
+
+        others = [self._blobs[seq] for seq in range(first, first + fec) if seq != missing[0]]
+        blob = _xor(others + [parity], len(parity))
+        length = INNER.unpack_from(blob)[4]
+
+        self._blobs[missing[0]] = blob[:INNER.size + length]
+        self._unpack(self._blobs[missing[0]])
+        self.recovered += 1
+        del self._parity[first]
+
+    def _unpack(self, blob: bytes):
+        seq, captured, index, count, length = INNER.unpack_from(blob)
+
+        if self._next is not None and seq < self._next:
+            return
+
+        fragments = self._fragments.setdefault(seq, {})
+        fragments[index] = blob[INNER.size:INNER.size + length]
+
+        if len(fragments) == count:
+            self._periods[seq] = (captured, b"".join(fragments[i] for i in range(count)))
+            del self._fragments[seq]
+
+            if self._next is None:
+                self._next = seq
+
+    def _release(self):
+        while self._periods:
+            if self._next in self._periods:
+                captured, data = self._periods.pop(self._next)
+                self.ready.put_nowait((self._next, captured, data))
+                self._next += 1
+
+            elif max(self._periods) - self._next >= self.REORDER:
+                self.lost += 1
+                self._fragments.pop(self._next, None)
+                self._next += 1
+
+            else:
+                break
+
+    def _forget(self, packet_seq: int):
+        for store in (self._blobs, self._parity):
+            if len(store) > self.WINDOW:
+                for seq in [seq for seq in store if seq < packet_seq - self.WINDOW]:
+                    del store[seq]
+
+        if self._next is not None:
+            for seq in [seq for seq in self._fragments if seq < self._next]:
+                del self._fragments[seq]
+
+def open_receiver(group: str, port: int) -> socket.socket:
+    """
+    A UDP socket bound to port, member of group if it's a multicast one
+    """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("", port))
+
+    if ipaddress.ip_address(group).is_multicast:
+        interface = Env.get("LIVE_MULTICAST_IFACE", "0.0.0.0")
+        membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+
+    sock.setblocking(False)
+    return sock
+
+async def receive_pcm(address: str, key: str, session: str, fallback=None):
+    """
+    Yields lists of (seq, captured, data) periods received from a
+    MulticastSender, like BWHTTPFileClient.stream_pcm_generator().
+
+    Switches to the fallback async generator (the HTTPS stream) if
+    nothing arrives for LIVE_MULTICAST_TIMEOUT seconds, or if more than
+    LIVE_MULTICAST_MAX_LOSS percent of the periods get lost.
+    """
+
+    group, _, port = address.rpartition(":")
+    receiver = None
+
+    try:
+        loop = asyncio.get_event_loop()
+        sock = open_receiver(group, int(port))
+        _, receiver = await loop.create_datagram_endpoint(
+            lambda: MulticastReceiver(bytes.fromhex(key), int(session)),
+            sock=sock
+        )
+
+    except (ValueError, OSError) as e:
+        Log.error(f"Could not join multicast {address}: {e}")
+
+    if receiver:
+        Log.success(f"Receiving live stream from multicast {address}")
+
+        timeout = Env.get_float("LIVE_MULTICAST_TIMEOUT", 2)
+        max_loss = Env.get_float("LIVE_MULTICAST_MAX_LOSS", 5) / 100
+        history = deque(maxlen=200) # (handed out, lost) totals, one per batch
+
+        try:
+            while True:
+                try:
+                    batch = [await asyncio.wait_for(receiver.ready.get(), timeout)]
+                except asyncio.TimeoutError:
+                    Log.warning(f"Nothing received from multicast {address} for {timeout:g}s")
+                    break
+
+                while not receiver.ready.empty():
+                    batch.append(receiver.ready.get_nowait())
+
+                yield batch
+
+                history.append((batch[-1][0], receiver.lost))
+                first_seq, first_lost = history[0]
+                span = batch[-1][0] - first_seq
+
+                if span >= 100 and (receiver.lost - first_lost) / span > max_loss:
+                    Log.warning(f"Losing more than {max_loss * 100:g}% of the multicast stream")
+                    break
+
+        finally:
+            receiver.transport.close()
+
+            if receiver.recovered or receiver.lost or receiver.rejected:
+                Log.info(f"Multicast: {receiver.recovered} datagrams rebuilt, {receiver.lost} periods lost, {receiver.rejected} rejected")
+
+    if fallback is None:
+        return
+
+    Log.warning("Falling back to the HTTPS stream")
+
+    async for batch in fallback:
+        yield batch
@@ -0,0 +1,285 @@
+# continuous playout: one live backend, many files
+import asyncio
+import inspect
+import subprocess
+import threading
+import wave
+from typing import Callable, Optional
+
+from shared.env import Env
+from shared.logger import Log
+
+def decode_pcm(file: str, cancelled: Callable[[], bool], chunk_frames: int, rate: int = 48000, channels: int = 2):
+    """
+    Yields s16le PCM chunks of chunk_frames frames from the file. WAVs
+    already in the requested format are read directly, anything else
+    is decoded through ffmpeg.
+
+    Returns True once the file was read to the end (or could not be
+    opened), False if cancelled() turned true first.
+    """
+
+    try:
+        with wave.open(file, "rb") as wav:
+            native = (
+                wav.getframerate() == rate
+                and wav.getnchannels() == channels
+                and wav.getsampwidth() == 2
+            )
+
+            if native:
+                while True:
+                    if cancelled():
+                        return False
+
+                    data = wav.readframes(chunk_frames)
+
+                    if not data:
+                        return True
+
+                    yield data
+
+    except (wave.Error, EOFError):
+        pass # not a plain PCM wav, ffmpeg will handle it
+
+    except OSError as e:
+        Log.error(f"Could not open {file}: {e}")
+        return True
+
+    cmd = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-i", file,
+        "-vn",
+        "-f", "s16le",
+        "-acodec", "pcm_s16le",
+        "-ar", str(rate),
+        "-ac", str(channels),
+        "-"
+    ]
+
+    try:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    except OSError as e:
+        Log.error(f"Could not decode {file}: {e}")
+        return True
+
+    try:
+        while True:
+            if cancelled():
+                return False
+
+            data = process.stdout.read(chunk_frames * channels * 2)
+
+            if not data:
+                return True
+
+            yield data
+
+    finally:
+        process.kill()
+        process.wait()
+
+class Playout:
+    """
+    Keeps a single PiWave live backend (raw PCM on stdin) running
+    and decodes successive files into it, so changing tracks does
+    not respawn the backend.
+
+    The PCM format is the one BWCustom.build_live_command() uses
+    by default (48kHz, stereo, s16le). WAVs already in that format
+    are read directly, anything else is decoded through ffmpeg.
+
+    When a track runs out and nothing is queued, silence is fed
+    for PLAYOUT_IDLE_TIMEOUT seconds before the pipeline closes,
+    leaving time for the next START to come in.
+
+    Started without a file, the pipeline holds silence until the
+    first play() (used to arm a broadcast ahead of its start time).
+
+    Files can be given a name, the path current and on_track_end
+    report instead of the one actually decoded (the original track
+    of a staged copy).
+    """
+
+    RATE = 48000
+    CHANNELS = 2
+    SAMPLE_WIDTH = 2
+    PIPE_BUFFER = 65536 # linux default pipe capacity
+
+    def __init__(self, piwave, on_track_end: Optional[Callable] = None, event_loop: Optional[asyncio.AbstractEventLoop] = None, chunk_frames: int = 1024):
+        self.piwave = piwave
+        self.on_track_end = on_track_end
+        self.event_loop = event_loop
+        self.chunk_frames = chunk_frames
+
+        self.current = None
+        self.loop = False
+        self.running = False
+
+        self._pending = []
+        self._cut = False
+        self._holding = False
+        self._closed = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def chunk_bytes(self):
+        return self.chunk_frames * self.CHANNELS * self.SAMPLE_WIDTH
+
+    @property
+    def latency(self):
+        """
+        Seconds of audio queued in front of a newly played file once
+        the pipeline runs steadily (PiWave's queue and the stdin pipe)
+        """
+
+        queue = self.piwave.audio_queue
+        queued = (queue.maxsize if queue else 0) * self.chunk_bytes + self.PIPE_BUFFER
+
+        return queued / (self.RATE * self.CHANNELS * self.SAMPLE_WIDTH)
+
+    @property
+    def idle_timeout(self):
+        return Env.get_float("PLAYOUT_IDLE_TIMEOUT", 3)
+
+    def start(self, file: str = None, loop: bool = False, name: str = None) -> bool:
+        """
+        Spawns the live backend and starts playing the given file,
+        or holds it on silence if there's none
+        """
+
+        with self._cond:
+            self._pending = [(file, loop, name or file)] if file else []
+            self._holding = file is None
+
+        self._closed.clear()
+        self.running = self.piwave.play(
+            self._generator(),
+            sample_rate=self.RATE,
+            channels=self.CHANNELS,
+            chunk_size=self.chunk_bytes
+        )
+
+        return self.running
+
+    def matches(self, frequency: float, ps: str, rt: str, pi: str) -> bool:
+        """
+        Whether the running backend was spawned with these settings,
+        in which case a new file can be played without a respawn.
+        """
+
+        if not self.running or self._closed.is_set() or not self.piwave:
+            return False
+
+        # as PiWave stores them
+        return (
+            float(self.piwave.frequency) == float(frequency)
+            and self.piwave.ps == str(ps)[:8]
+            and self.piwave.rt == str(rt)[:64]
+            and self.piwave.pi == str(pi).upper()[:4]
+        )
+
+    def play(self, file: str, loop: bool = False, name: str = None):
+        """
+        Switches to the given file right away, cutting the current one
+        """
+
+        with self._cond:
+            self._pending = [(file, loop, name or file)]
+            self._cut = True
+            self._holding = False
+            self._cond.notify_all()
+
+    def enqueue(self, file: str, loop: bool = False, name: str = None):
+        """
+        Appends a file to be played once the current one ends
+        """
+
+        with self._cond:
+            self._pending.append((file, loop, name or file))
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._pending = []
+            self._closed.set()
+            self._cond.notify_all()
+
+        self.running = False
+
+    def _next(self):
+        with self._cond:
+            self._cut = False
+
+            if self._pending:
+                return self._pending.pop(0)
+
+            return None
+
+    def _generator(self):
+        silence = bytes(self.chunk_bytes)
+        chunk_time = self.chunk_frames / self.RATE
+
+        try:
+            while not self._closed.is_set():
+                entry = self._next()
+
+                if entry is None:
+                    # nothing queued: keep the carrier up with silence for a while
+                    idle = 0.0
+
+                    while not self._closed.is_set() and (self._holding or idle < self.idle_timeout):
+                        with self._cond:
+                            if self._pending:
+                                break
+
+                        yield silence
+                        idle += chunk_time
+
+                    with self._cond:
+                        if not self._pending:
+                            break
+
+                    continue
+
+                file, self.loop, name = entry
+                self.current = name
+
+                while True:
+                    finished = yield from self._decode(file)
+
+                    if not finished or not self.loop:
+                        break
+
+                if finished:
+                    self._notify_end(name)
+
+        finally:
+            self.current = None
+            self.running = False
+
+    def _decode(self, file: str):
+        """
+        Yields PCM chunks from the file. Returns True if the file was
+        played to the end, False if it was cut or the playout closed.
+        """
+
+        return (yield from decode_pcm(
+            file,
+            lambda: self._closed.is_set() or self._cut,
+            self.chunk_frames,
+            self.RATE,
+            self.CHANNELS
+        ))
+
+    def _notify_end(self, file: str):
+        if not self.on_track_end:
+            return
+
+        if self.event_loop and inspect.iscoroutinefunction(self.on_track_end):
+            asyncio.run_coroutine_threadsafe(self.on_track_end(file), self.event_loop)
+
+        else:
+            threading.Thread(target=self.on_track_end, args=(file,), daemon=True).start()
@@ -0,0 +1,220 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from shared.env import Env
+from shared.logger import Log
+
+def prefetch(path: str) -> bool:
+    """
+    Asks the kernel to read a file into the page cache ahead of
+    its playback (posix_fadvise WILLNEED), so the backend doesn't
+    wait on the SD card when it starts reading.
+
+    Returns False if the hint couldn't be given.
+    """
+
+    if not hasattr(os, "posix_fadvise"):
+        return False
+
+    try:
+        fd = os.open(path, os.O_RDONLY)
+
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+
+        finally:
+            os.close(fd)
+
+        return True
+
+    except OSError as e:
+        Log.debug(f"Could not prefetch {path}: {e}")
+        return False
+
+class Staging:
+    """
+    Copies upcoming tracks into a RAM-backed directory (STAGING_DIR,
+    usually on a tmpfs like /dev/shm) within a budget of
+    STAGING_BUDGET megabytes, so they are played from memory instead
+    of the SD card. Disabled while STAGING_DIR is unset.
+
+    Staged copies are tracked against the source file's size and
+    mtime, a changed source is staged again (or played directly).
+
+    The lock only guards the bookkeeping: a copy runs outside of it,
+    with its size reserved, so lookup() never waits on one (a file
+    still being copied is played from its source).
+    """
+
+    PREFIX = "bw_staged_"
+
+    def __init__(self):
+        self._entries = OrderedDict() # source path -> (staged path, size, mtime)
+        self._copying = {} # source path -> size, reserved while its copy runs
+        self._lock = threading.Lock()
+        self._cleaned = False
+
+    @property
+    def directory(self) -> Optional[Path]:
+        path = Env.get("STAGING_DIR")
+        return Path(path) if path else None
+
+    @property
+    def budget(self) -> int:
+        return int(Env.get_float("STAGING_BUDGET", 256) * 1024 * 1024)
+
+    def _used(self) -> int:
+        return sum(size for _, size, _ in self._entries.values()) + sum(self._copying.values())
+
+    def _valid(self, source: str, entry) -> bool:
+        staged, size, mtime = entry
+
+        try:
+            stat = os.stat(source)
+
+        except OSError:
+            return False
+
+        return stat.st_size == size and stat.st_mtime_ns == mtime and os.path.exists(staged)
+
+    def _drop(self, source: str):
+        staged, _, _ = self._entries.pop(source)
+
+        try:
+            os.unlink(staged) # the backend keeps its fd if it's still reading it
+
+        except OSError:
+            pass
+
+    def _clean(self, directory: Path):
+        # copies left by a previous run would eat the budget unaccounted
+        self._cleaned = True
+
+        for leftover in directory.glob(f"{self.PREFIX}*"):
+            try:
+                leftover.unlink()
+
+            except OSError:
+                pass
+
+    def stage(self, source: str, keep: Iterable[str] = ()) -> Optional[str]:
+        """
+        Copies source into the staging directory, evicting the least
+        recently staged files that aren't in keep if the budget is
+        exceeded. Returns the staged path, or None if it wasn't staged.
+        """
+
+        directory = self.directory
+
+        if not directory:
+            return None
+
+        source = os.path.abspath(source)
+        keep = {os.path.abspath(path) for path in keep} | {source}
+
+        with self._lock:
+            entry = self._entries.get(source)
+
+            if entry and self._valid(source, entry):
+                self._entries.move_to_end(source)
+                return entry[0]
+
+            if entry:
+                self._drop(source)
+
+            if source in self._copying:
+                return None # another thread is on it
+
+            try:
+                directory.mkdir(parents=True, exist_ok=True)
+
+                if not self._cleaned:
+                    self._clean(directory)
+
+                stat = os.stat(source)
+
+            except OSError as e:
+                Log.debug(f"Could not stage {source}: {e}")
+                return None
+
+            if stat.st_size > self.budget:
+                return None
+
+            for old in list(self._entries):
+                if self._used() + stat.st_size <= self.budget:
+                    break
+
+                if old not in keep:
+                    self._drop(old)
+
+            if self._used() + stat.st_size > self.budget:
+                return None
+
+            digest = hashlib.sha1(source.encode()).hexdigest()[:16]
+            staged = directory / f"{self.PREFIX}{digest}{Path(source).suffix}"
+
+            self._copying[source] = stat.st_size
+
+        try:
+            partial = staged.with_name(staged.name + ".part")
+            shutil.copyfile(source, partial)
+            os.replace(partial, staged)
+
+        except OSError as e:
+            Log.debug(f"Could not stage {source}: {e}")
+
+            with self._lock:
+                del self._copying[source]
+
+            return None
+
+        with self._lock:
+            del self._copying[source]
+            self._entries[source] = (str(staged), stat.st_size, stat.st_mtime_ns)
+
+        return str(staged)
+
+    def lookup(self, source: str) -> str:
+        """
+        Returns the staged copy of source if there's a valid one,
+        source itself otherwise
+        """
+
+        key = os.path.abspath(source)
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry and self._valid(key, entry):
+                return entry[0]
+
+        return source
+
+staging = Staging()
+
+def prefetch_tracks(paths: List[str], keep: Iterable[str] = ()):
+    """
+    Warms up the upcoming tracks, in play order: they are staged to
+    STAGING_DIR when enabled and within budget (never evicting the
+    ones in keep, like the track on air), and hinted into the page
+    cache otherwise. Blocking, meant to run in an executor.
+    """
+
+    keep = list(paths) + list(keep)
+
+    for path in paths:
+        if not staging.stage(path, keep=keep):
+            prefetch(path)
+
+def warmed(path: str) -> str:
+    """
+    The path START should play for a file: its staged copy if
+    there's one, the file itself otherwise
+    """
+
+    return staging.lookup(path)
@@ -0,0 +1,260 @@
+# queue programme: the queue rendered server side as one live stream
+import asyncio
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable, Optional
+
+from shared.env import Env
+from shared.fanout import PcmFanout, Pacer
+from shared.logger import Log
+from shared.playout import decode_pcm
+
+class _Track:
+    """
+    One decoding track, with the raw chunks read ahead of what was played
+    """
+
+    def __init__(self, path: str, cancelled: Callable[[], bool], frames: int, frame_bytes: int):
+        self.path = path
+        self.chunks = decode_pcm(path, cancelled, frames)
+        self.frame_bytes = frame_bytes
+        self.buffer = deque()
+        self.buffered = 0 # bytes
+        self.eof = False
+        self._rest = b""
+
+    def fill(self, size: int):
+        """
+        Reads ahead until size bytes are buffered or the track ends
+        """
+
+        while self.buffered < size and not self.eof:
+            data = next(self.chunks, None)
+
+            if data is None:
+                self.eof = True
+                break
+
+            # ffmpeg may hand out partial frames, keep whole ones only
+            data = self._rest + data
+            whole = len(data) - len(data) % self.frame_bytes
+            self._rest = data[whole:]
+
+            if whole:
+                self.buffer.append(data[:whole])
+                self.buffered += whole
+
+    def take(self, size: int) -> bytes:
+        """
+        Removes and returns up to size bytes from the front of the buffer
+        """
+
+        parts = []
+
+        while size > 0 and self.buffer:
+            chunk = self.buffer.popleft()
+
+            if len(chunk) > size:
+                self.buffer.appendleft(chunk[size:])
+                chunk = chunk[:size]
+
+            parts.append(chunk)
+            size -= len(chunk)
+            self.buffered -= len(chunk)
+
+        return b"".join(parts)
+
+    def close(self):
+        self.chunks.close()
+
+class Programme(PcmFanout):
+    """
+    Renders successive files as one continuous PCM stream, crossfading
+    each track into the next over PROGRAMME_CROSSFADE seconds, and fans
+    it out like the ALSA capture so LiveOp can hand it to any number
+    of clients through /stream/.
+
+    Tracks come from the tracks() callable (a path, or None once there
+    is nothing left), called from the render thread whenever the next
+    one is needed: at the start, then when the current one reaches its
+    crossfade. Outside of crossfades the decoded chunks are passed
+    through untouched, only the overlapping parts go through NumPy.
+
+    The stream is paced on the monotonic clock, so it runs in real time
+    whether anyone listens or not.
+    """
+
+    RATE = 48000
+    CHANNELS = 2
+    SAMPLE_WIDTH = 2
+    PERIOD = 1024 # frames per published chunk
+    description = "queue programme"
+    idle_stop = False # runs in real time whether anyone listens or not
+
+    def __init__(self, tracks: Callable[[], Optional[str]], on_finished: Optional[Callable] = None, event_loop: Optional[asyncio.AbstractEventLoop] = None):
+        super().__init__()
+        self.tracks = tracks
+        self.on_finished = on_finished
+        self.event_loop = event_loop
+
+        self.current = None
+        self._np = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._out = bytearray()
+        self._pacer = None
+
+    @property
+    def rate(self):
+        return self.RATE
+
+    @property
+    def channels(self):
+        return self.CHANNELS
+
+    @property
+    def frame_bytes(self):
+        return self.CHANNELS * self.SAMPLE_WIDTH
+
+    @property
+    def crossfade(self):
+        return max(Env.get_float("PROGRAMME_CROSSFADE", 3), 0)
+
+    def start(self) -> bool:
+        if self._running:
+            return True
+
+        try:
+            import numpy as np
+
+        except ImportError:
+            pip_path = Path(__file__).parent.parent / "venv" / "bin" / "pip"
+
+            Log.error("The programme needs numpy, please install it:")
+            Log.error(f"{pip_path} install numpy")
+            return False
+
+        self._np = np
+        self._stop.clear()
+        self._pacer = Pacer(self.RATE, self._stop)
+        self.prepare()
+        self._running = True
+        self._thread = threading.Thread(target=self._render_loop, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """
+        Stops rendering and ends every subscriber's stream
+        """
+
+        self._stop.set()
+
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+
+        self._thread = None
+        self._running = False
+        self.end_subscribers()
+
+    # RENDERING
+
+    def _open_next(self) -> Optional[_Track]:
+        path = self.tracks()
+
+        if path is None:
+            return None
+
+        self.current = path
+        return _Track(path, self._stop.is_set, self.PERIOD, self.frame_bytes)
+
+    def _render_loop(self):
+        track = None
+        finished = False
+
+        try:
+            track = self._open_next()
+
+            while track and not self._stop.is_set():
+                fade = int(self.crossfade * self.RATE) * self.frame_bytes
+                track.fill(fade + self.PERIOD * self.frame_bytes)
+
+                if not track.eof:
+                    # keep the crossfade length read ahead, play the rest as is
+                    while track.buffer and track.buffered - len(track.buffer[0]) >= fade:
+                        self._emit(track.take(len(track.buffer[0])))
+                    continue
+
+                following = self._open_next()
+                tail = track.take(track.buffered)
+                track.close()
+
+                if following is None:
+                    self._emit(tail)
+                    track = None
+                    break
+
+                overlap = min(len(tail), fade)
+                self._emit(tail[:len(tail) - overlap])
+
+                if overlap:
+                    following.fill(overlap)
+                    self._emit(self._mix(tail[len(tail) - overlap:], following.take(overlap)))
+
+                track = following
+
+            finished = not self._stop.is_set()
+
+        except Exception as e:
+            Log.error(f"Programme error: {e}")
+
+        finally:
+            if track:
+                track.close()
+
+            if self._out and not self._stop.is_set():
+                self._publish(bytes(self._out))
+
+            self._out.clear()
+            self.current = None
+            self._running = False
+            self.end_subscribers()
+
+            if finished and self.on_finished:
+                if self.event_loop:
+                    self.event_loop.call_soon_threadsafe(self.on_finished)
+                else:
+                    self.on_finished()
+
+    def _mix(self, outgoing: bytes, incoming: bytes) -> bytes:
+        """
+        Equal power crossfade of two overlapping parts
+        """
+
+        np = self._np
+
+        a = np.frombuffer(outgoing, dtype=np.int16).astype(np.float32).reshape(-1, self.CHANNELS)
+        b = np.zeros_like(a)
+
+        # a next track shorter than the fade is padded with silence
+        head = np.frombuffer(incoming, dtype=np.int16).astype(np.float32).reshape(-1, self.CHANNELS)
+        b[:len(head)] = head
+
+        t = np.linspace(0, np.pi / 2, len(a), dtype=np.float32)[:, None]
+        mixed = a * np.cos(t) + b * np.sin(t)
+
+        return np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
+
+    def _emit(self, data: bytes):
+        self._out += data
+        period = self.PERIOD * self.frame_bytes
+
+        while len(self._out) >= period and not self._stop.is_set():
+            self._publish(bytes(self._out[:period]))
+            del self._out[:period]
+
+    def _publish(self, data: bytes):
+        # published ahead of time, then held until due
+        self.publish(data)
+        self._pacer.wait(len(data) // self.frame_bytes)
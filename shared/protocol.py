@@ -3,7 +3,7 @@ import shlex
 import time
 from typing import Dict, Tuple
 
-PROTOCOL_VERSION = "2.1.3"
+PROTOCOL_VERSION = "2.1.7"
 
 
 class Commands:
@@ -15,8 +15,13 @@ class Commands:
     
     # broadcast
     START = 'START'
+    ARM = 'ARM'
+    FIRE = 'FIRE'
     STOP = 'STOP'
     END = 'END'
+    STATE = 'STATE'
+    PLAYLIST = 'PLAYLIST'
+    TRACK = 'TRACK'
     
     # files
     UPLOAD_TOKEN = 'UPLOAD_TOKEN'
@@ -28,6 +33,7 @@ class Commands:
     KICK = 'KICK'
     UPDATE = 'UPDATE'
     STATUS = 'STATUS'
+    TIME = 'TIME'
     
     # file management
     LIST_FILES = 'LIST_FILES'
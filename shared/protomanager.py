@@ -60,10 +60,11 @@ class ProtoManager:
     Every incoming message must be passed to dispatch() so pending futures can be resolved.
     """
 
-    def __init__(self, send_fn: Callable[[str], Awaitable] = None, default_timeout: float = 10.0):
+    def __init__(self, send_fn: Callable[[str], Awaitable] = None, default_timeout: float = 10.0, timeout_fn: Callable[[], float] = None):
         self.__send_func = send_fn
         self.__pending: dict[str, tuple] = {}
         self.__timeout = default_timeout
+        self.__timeout_fn = timeout_fn  # if set, computes the default timeout per request (e.g. from link RTT)
 
     def __safe_call(self, fn: Callable, *args):
         """Call a callback safely, logging any exceptions instead of crashing."""
@@ -93,7 +94,8 @@ class ProtoManager:
             on_error:        Called with the exception on ERROR or timeout
             expect_multiple: If True, the handle won't auto-complete on the first OK.
                              Call handle.complete() or handle.cancel() manually.
-            timeout:         Per-request timeout in seconds. Defaults to the instance default.
+            timeout:         Per-request timeout in seconds. Defaults to timeout_fn() if set,
+                             otherwise to the instance default.
             **kwargs:        Keyword arguments passed to the command
 
         Returns:
@@ -125,7 +127,7 @@ class ProtoManager:
             if context['timer']:
                 context['timer'].cancel()
 
-        t = timeout or self.__timeout
+        t = timeout or (self.__timeout_fn() if self.__timeout_fn else self.__timeout)
         if t:
             context['timer'] = loop.call_later(
                 t, cancel, tx_id,
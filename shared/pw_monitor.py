@@ -1,78 +1,193 @@
 # piwave monitor: monitors whenever the playback starts or ends
 import asyncio
 import inspect
+import os
 import threading
 import time
 from typing import Callable, Optional
 
+from shared.logger import Log
+
 class PWM: #pwm hehehe
+    """
+    Calls on_finished once the broadcast of a PiWave instance ends.
+
+    With an event loop, the end is detected from the backend process
+    exit (a pidfd registered on the loop, or a worker blocked in
+    process.wait() where pidfds aren't available), so no thread polls
+    the PiWave status. Without one, the polling thread is used.
+
+    end_latency holds how long, in seconds, the last on_finished took
+    to run after the backend exited.
+    """
+
     def __init__(self, check_interval: float = 1):
         self.check_interval = check_interval
         self.monitor_thread: Optional[threading.Thread] = None
+        self.monitor_task: Optional[asyncio.Task] = None
         self.stop_event = threading.Event()
         self.piwave = None
         self.on_finished_callback: Optional[Callable] = None
         self.event_loop: Optional[asyncio.AbstractEventLoop] = None
-        
+        self.exited_at: Optional[float] = None
+        self.end_latency: Optional[float] = None
+
     def start(self, piwave, on_finished: Callable, event_loop: Optional[asyncio.AbstractEventLoop] = None):
         self.stop()
-        
+
         self.piwave = piwave
         self.on_finished_callback = on_finished
         self.event_loop = event_loop or self._try_get_event_loop()
+        self.exited_at = None
         self.stop_event.clear()
-        
+
+        if self.event_loop:
+            self.monitor_task = self.event_loop.create_task(self._watch(piwave))
+            return
+
         self.monitor_thread = threading.Thread(
             target=self._monitor_loop,
             daemon=True
         )
         self.monitor_thread.start()
-    
+
     def _try_get_event_loop(self) -> Optional[asyncio.AbstractEventLoop]:
         try:
             return asyncio.get_running_loop()
         except RuntimeError:
             return None
-    
+
+    def since_exit(self) -> Optional[float]:
+        """
+        Seconds elapsed since the backend exit was detected
+        """
+
+        if self.exited_at is None:
+            return None
+
+        return time.monotonic() - self.exited_at
+
+    def _is_active(self, piwave) -> bool:
+        status = piwave.get_status()
+        return status.get("is_playing", False) or status.get("is_live_streaming", False)
+
+    def _get_process(self, piwave):
+        # live playback owns its process, file playback leaves it to the backend
+        return piwave.current_process or getattr(piwave.backend, "current_process", None)
+
+    async def _watch(self, piwave):
+        try:
+            process = None
+
+            # file playback only spawns the backend once ffprobe is done
+            while process is None:
+                process = self._get_process(piwave)
+
+                if process is None:
+                    if not self._is_active(piwave):
+                        break
+
+                    await asyncio.sleep(0.05)
+
+            if process is not None:
+                await self._wait_exit(process)
+
+            self.exited_at = time.monotonic()
+
+        except asyncio.CancelledError:
+            return
+
+        except Exception as e:
+            Log.debug(f"PWM watch error: {e}")
+            return
+
+        # ran apart from this task, since on_finished usually stops us
+        asyncio.get_running_loop().create_task(self._finish(self.on_finished_callback, self.exited_at))
+
+    async def _wait_exit(self, process):
+        loop = asyncio.get_running_loop()
+
+        if process.poll() is not None:
+            return
+
+        try:
+            fd = os.pidfd_open(process.pid)
+
+        except (AttributeError, OSError):
+            # no pidfd (old kernel / python, or already reaped)
+            if process.poll() is None:
+                await loop.run_in_executor(None, process.wait)
+
+            return
+
+        exited = loop.create_future()
+
+        def on_exit():
+            if not exited.done():
+                exited.set_result(None)
+
+        try:
+            loop.add_reader(fd, on_exit)
+            await exited
+
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+    async def _finish(self, callback, exited_at):
+        if not callback:
+            return
+
+        if inspect.iscoroutinefunction(callback):
+            await callback()
+
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, callback)
+
+        self.end_latency = time.monotonic() - exited_at
+        Log.debug(f"Broadcast end handled {self.end_latency * 1000:.1f}ms after the backend exited")
+
     def _monitor_loop(self):
         while not self.stop_event.is_set():
             try:
                 if self.piwave is None:
                     break
-                
-                status = self.piwave.get_status()
-                is_active = status.get("is_playing", False) or status.get("is_live_streaming", False)
-                if not is_active:
+
+                if not self._is_active(self.piwave):
                     if self.on_finished_callback:
-                        if self.event_loop and inspect.iscoroutinefunction(self.on_finished_callback):
-                            asyncio.run_coroutine_threadsafe(
-                                self.on_finished_callback(),
-                                self.event_loop
-                            )
-                        else:
-                            callback_thread = threading.Thread(
-                                target=self.on_finished_callback,
-                                daemon=True
-                            )
-                            callback_thread.start()
+                        self.exited_at = time.monotonic()
+
+                        callback_thread = threading.Thread(
+                            target=self.on_finished_callback,
+                            daemon=True
+                        )
+                        callback_thread.start()
                     break
-                    
+
             except:
                 break
-            
+
             time.sleep(self.check_interval)
-    
+
     def stop(self):
         self.stop_event.set()
-        
-        if self.monitor_thread and self.monitor_thread.is_alive():
+
+        if self.monitor_task and not self.monitor_task.done():
+            self.monitor_task.cancel()
+
+        self.monitor_task = None
+
+        if self.monitor_thread and self.monitor_thread.is_alive() and self.monitor_thread is not threading.current_thread():
             self.monitor_thread.join(timeout=2)
-        
+
         self.piwave = None
         self.on_finished_callback = None
         self.event_loop = None
-    
+
     def is_monitoring(self) -> bool:
-        return (self.monitor_thread is not None and 
-                self.monitor_thread.is_alive() and 
-                not self.stop_event.is_set())
\ No newline at end of file
+        if self.monitor_task is not None:
+            return not self.monitor_task.done()
+
+        return (self.monitor_thread is not None and
+                self.monitor_thread.is_alive() and
+                not self.stop_event.is_set())
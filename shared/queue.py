@@ -1,18 +1,153 @@
 import asyncio
+import bisect
 import fnmatch
+import json
 import os
+import re
 import shlex
-from typing import List, Dict, Set
+import threading
+import time
+from typing import Callable, List, Dict, Set
 
 from shared.env import Env
 from shared.logger import Log
+from shared.prefetch import prefetch_tracks
+from shared.programme import Programme
+from shared.queue_journal import QueueJournal
+from shared.protocol import Commands
+from shared.version import parse_version
+
+
+def compile_pattern(pattern: str) -> Callable[[str], bool]:
+    """Compile a wildcard pattern once into a filename matcher."""
+    if pattern == '*':
+        return lambda name: True
+
+    if not any(c in pattern for c in '*?['):
+        return lambda name: name == pattern
+
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+class TrackList:
+    """Ordered list of queued filenames, indexed by name.
+
+    Keeps the positions of every filename so that exact removals don't
+    scan the list, and wildcard patterns are only matched once per
+    distinct filename. A removal rebuilds the list in a single pass,
+    whatever the number of specs.
+    """
+
+    def __init__(self, items: List[str] = None):
+        self._items = []
+        self._positions = {}  # {filename: [positions]}
+
+        if items:
+            self.extend(items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def __contains__(self, filename):
+        return filename in self._positions
+
+    def names(self):
+        """Distinct filenames in the queue."""
+        return self._positions.keys()
+
+    def positions(self, filename: str) -> List[int]:
+        return self._positions.get(filename, [])
+
+    def extend(self, filenames: List[str]):
+        for filename in filenames:
+            self._positions.setdefault(filename, []).append(len(self._items))
+            self._items.append(filename)
+
+    def clear(self) -> List[int]:
+        removed = list(range(len(self._items)))
+        self._items = []
+        self._positions = {}
+        return removed
+
+    def remove(self, specs: List[str]) -> List[int]:
+        """Remove every entry matching one of the specs.
+
+        An exact filename removes its first occurrence, like list.remove,
+        a wildcard pattern removes all the matching ones.
+
+        Returns:
+            The removed positions, sorted
+        """
+        removed = set()
+
+        for spec in specs:
+            if '*' not in spec:
+                positions = [p for p in self.positions(spec) if p not in removed]
+                if positions:
+                    removed.add(positions[0])
+                continue
+
+            match = compile_pattern(spec)
+            for filename, positions in self._positions.items():
+                if match(filename):
+                    removed.update(positions)
+
+        if not removed:
+            return []
+
+        kept = [f for i, f in enumerate(self._items) if i not in removed]
+        self._items = []
+        self._positions = {}
+        self.extend(kept)
+
+        return sorted(removed)
+
+    @staticmethod
+    def shift(index: int, removed: List[int]) -> int:
+        """Where a position ends up once the removed positions are gone."""
+        return index - bisect.bisect_left(removed, index)
 
 
 class Queue:
     """Queue system for managing and playing broadcast files in sequence.
     
     Supports both local (single client) and server (multi-client) modes.
+
+    In server mode, clients recent enough are handed the whole queue
+    once with Commands.PLAYLIST and advance through it by themselves,
+    reporting their position with Commands.TRACK. Older clients are
+    still driven with one START per track. Edits then reach them as
+    numbered add/remove deltas (whole queue again for clients older
+    than PLAYLIST_DELTA_SINCE, or out of sync).
+
+    Unless QUEUE_PERSIST is false, every change is written to a
+    QueueJournal and the queue is restored from it on startup, playing
+    again where it was if it was playing.
+
+    With QUEUE_LOCKSTEP, the server plays the queue on all targets in
+    lockstep instead: it knows when each track ends from its duration,
+    and arms every target for the next track to start at that instant.
+    current_index is then the position of the whole fleet, and clients
+    joining late join it at the next track.
+
+    With QUEUE_PROGRAMME, the server plays the queue itself instead:
+    files are taken from its upload directory and rendered as one
+    crossfaded stream (shared.programme.Programme), which the targets
+    receive like a 'live' broadcast. Clients need no file at all, and
+    those joining late tune in to the stream where it is.
     """
+
+    PLAYLIST_SINCE = (2, 1, 5)
+    PLAYLIST_DELTA_SINCE = (2, 1, 7)
     
     def __init__(self, server_instance=None, client_instance=None, is_local=False):
         """Initialize the queue system.
@@ -24,10 +159,22 @@ class Queue:
             upload_dir: Directory containing broadcast files
         """
         # Queue data
-        self.queue = []
+        self.queue = TrackList()
         self.paused = True
         self.current_index = 0  # For local mode
         self.client_indices = {}  # {client_id: current_index} for server mode
+        self.playlist_clients = set()  # clients advancing through a PLAYLIST themselves
+        self.playlist_revision = 0  # bumped by every edit, so clients can tell a missed delta
+        self.held = {}  # {client_id (None in local mode): scheduled filename} see hold()
+        self.held_at = None  # start of the scheduled file, if known
+        self.durations = {}  # {filename: seconds} as reported by the clients (server mode)
+        self.lockstep = False  # fleet playing in lockstep (server mode)
+        self.lockstep_timer = None  # next lockstep transition, None if waiting for an END
+        self.lockstep_started = None  # start of the fleet track, None while the fleet is stalled
+        self.programme_mode = False  # queue rendered by the server as a live stream (server mode)
+        self.programme = None  # the running Programme
+        self.programme_next = 0  # position the programme renders next
+        self.programme_lock = threading.Lock()  # programme_next and removals, shared with the programme thread
         
         # Instances
         self.server = server_instance
@@ -43,11 +190,118 @@ class Queue:
             'rt': 'Broadcasting',
             'pi': 'FFFF'
         }
+        
+        # Persistence
+        self.journal = None
+        self.resume_pending = set()  # clients to resume once they reconnect (server mode)
+        self._saved_state = None
+        
+        if Env.get_bool("QUEUE_PERSIST", True):
+            self.journal = QueueJournal("local" if is_local else "server")
+            self._restore()
 
     @property
     def upload_dir(self):
         return Env.get("UPLOAD_DIR", "/opt/BotWave/uploads/")
     
+    # PERSISTENCE
+    
+    def _state(self) -> dict:
+        return {
+            'paused': self.paused,
+            'current_index': self.current_index,
+            'client_indices': dict(self.client_indices),
+            'broadcast_settings': dict(self.broadcast_settings),
+            'active_targets': self.active_targets,
+            'lockstep': self.lockstep,
+            'programme': self.programme_mode
+        }
+    
+    def _restore(self):
+        """Rebuild the queue from the journal."""
+        state = self.journal.load()
+        
+        if not state:
+            return
+        
+        self.queue = TrackList(state['queue'])
+        self.paused = state['paused']
+        self.current_index = state['current_index']
+        self.client_indices = state['client_indices']
+        self.broadcast_settings = state['broadcast_settings'] or self.broadcast_settings
+        self.active_targets = state['active_targets']
+        self.lockstep = state.get('lockstep', False)
+        self.programme_mode = state.get('programme', False)
+        self._saved_state = self._state()
+        
+        # start the next run from a compact snapshot
+        self.journal.snapshot({'queue': list(self.queue), **self._saved_state})
+        
+        if not self.queue:
+            return
+        
+        status = "paused" if self.paused else "playing"
+        Log.queue(f"Restored queue of {len(self.queue)} file(s) ({status})")
+        
+        if not self.paused and not self.is_local:
+            self.resume_pending = set(self.client_indices)
+    
+    def _record(self, op: str, **data):
+        if self.journal and self.journal.record(op, **data):
+            self._saved_state = self._state()
+            self.journal.snapshot({'queue': list(self.queue), **self._saved_state})
+    
+    def _save_state(self):
+        """Journal the playback state (pause, cursors, settings) if it changed."""
+        if not self.journal:
+            return
+        
+        state = self._state()
+        
+        if state != self._saved_state:
+            self._saved_state = state
+            self._record("state", state=state)
+    
+    def resume(self):
+        """Play a restored queue again (local mode)."""
+        if self.is_local and not self.paused and self.queue:
+            Log.queue("Resuming queue")
+            self._play_current_local()
+    
+    def on_client_registered(self, client_id: str):
+        """Play a restored queue again on a client that was playing it (server mode).
+        
+        In lockstep, a stalled fleet (restored, or left without clients)
+        restarts with the first client back, the others join it at the
+        next track.
+        
+        With the programme, the client tunes in to the stream, which
+        starts again with the first client back after a restart.
+        """
+        if self.programme_mode:
+            self.resume_pending.clear()
+            
+            if not self.paused and self.queue and client_id in self.server.parse_targets(self.active_targets):
+                asyncio.create_task(self._programme_play([client_id]))
+            return
+        
+        if self.lockstep:
+            self.resume_pending.clear()
+            
+            if not self.paused and self.queue and self.lockstep_started is None and not self.held:
+                Log.queue("Resuming queue in lockstep")
+                asyncio.create_task(self._lockstep_play())
+            return
+        
+        if client_id not in self.resume_pending:
+            return
+        
+        self.resume_pending.discard(client_id)
+        
+        if not self.paused and self.queue:
+            Log.queue(f"Resuming queue on {self.server.clients[client_id].get_display_name()}")
+            asyncio.create_task(self._play_all_clients([client_id]))
+    
     # COMMAND PARSER
     
     def parse(self, command: str):
@@ -97,6 +351,14 @@ class Queue:
         if not self.paused:
             Log.queue("Auto-pausing queue due to manual action")
             self.paused = True
+            self.resume_pending.clear()
+            self.held.clear()
+            self._lockstep_cancel(stall=True)
+            self._programme_stop()
+            self._save_state()
+
+            if not self.is_local and self.playlist_clients:
+                asyncio.create_task(self._detach_playlists())
     
     # ADD FILES TO QUEUE
     
@@ -139,11 +401,17 @@ class Queue:
                     Log.warning(f"File not found: {spec}")
         
         self.queue.extend(added)
+        self._record("add", files=added)
         Log.queue(f"Added {len(added)} file(s) to queue")
-        self.show("")
+        self._summary()
     
     async def _add_server(self, file_specs: List[str], force: bool):
         """Add files in server mode with client availability checks."""
+        if Env.get_bool("QUEUE_PROGRAMME"):
+            # the server plays the files itself
+            self._add_local(file_specs, force)
+            return
+        
         if not self.server or not self.server.clients:
             Log.error("No clients connected")
             return
@@ -162,14 +430,17 @@ class Queue:
                             if spec == '*':
                                 added.extend(sorted(all_files))
                             else:
-                                pattern_matches = [f for f in all_files if fnmatch.fnmatch(f, spec)]
+                                match = compile_pattern(spec)
+                                pattern_matches = [f for f in all_files if match(f)]
                                 added.extend(sorted(pattern_matches))
                 else:
                     added.append(spec)
             
             self.queue.extend(added)
+            self._record("add", files=added)
             Log.queue(f"Added {len(added)} file(s) to queue (forced)")
-            self.show("")
+            self._summary()
+            self._sync_playlists(added=added)
             return
         
         # Normal mode: check all clients have the files
@@ -200,8 +471,10 @@ class Queue:
             return
         
         self.queue.extend(candidates)
+        self._record("add", files=candidates)
         Log.queue(f"Added {len(candidates)} file(s) to queue")
-        self.show("")
+        self._summary()
+        self._sync_playlists(added=candidates)
     
     async def _get_all_client_files(self, client_ids: List[str]) -> Dict[str, Set[str]]:
         """Retrieve file lists from all specified clients."""
@@ -217,6 +490,7 @@ class Queue:
                 files = await lf_hdl.request_files(self.server.clients[client_id], timeout=10)
                 if files:
                     client_files[client_id] = set(f['name'] for f in files)
+                    self.durations.update({f['name']: f['duration'] for f in files if f.get('duration')})
                 else:
                     Log.warning(f"No files from {client_id}")
                     client_files[client_id] = set()
@@ -256,12 +530,13 @@ class Queue:
                     requested_files.update(files)
             elif '*' in spec:
                 # Wildcard pattern
-                pattern_matches = [f for f in common_files if fnmatch.fnmatch(f, spec)]
+                match = compile_pattern(spec)
+                pattern_matches = [f for f in common_files if match(f)]
                 matched.update(pattern_matches)
                 
                 # Find all files matching pattern on any client
                 for files in client_files.values():
-                    requested_files.update([f for f in files if fnmatch.fnmatch(f, spec)])
+                    requested_files.update([f for f in files if match(f)])
                 
                 if not pattern_matches:
                     Log.warning(f"No files match pattern on all clients: {spec}")
@@ -287,7 +562,8 @@ class Queue:
             all_files = [f for f in os.listdir(directory) if f.endswith('.wav')]
             if pattern == '*':
                 return sorted(all_files)
-            return sorted([f for f in all_files if fnmatch.fnmatch(f, pattern)])
+            match = compile_pattern(pattern)
+            return sorted([f for f in all_files if match(f)])
         except Exception as e:
             Log.error(f"Error matching files: {e}")
             return []
@@ -308,49 +584,96 @@ class Queue:
             return
         
         file_specs = [f.strip() for f in command.split(',')]
-        removed_count = 0
         
-        for spec in file_specs:
-            if spec == '*':
-                # Remove all
-                removed_count = len(self.queue)
-                self.queue = []
-                break
-            elif '*' in spec:
-                # Wildcard removal
-                original_len = len(self.queue)
-                self.queue = [f for f in self.queue if not fnmatch.fnmatch(f, spec)]
-                removed_count += original_len - len(self.queue)
+        # the programme thread picks its next track under the same lock
+        with self.programme_lock:
+            if '*' in file_specs:
+                removed = self.queue.clear()
             else:
-                # Exact file
-                if spec in self.queue:
-                    self.queue.remove(spec)
-                    removed_count += 1
+                removed = self.queue.remove(file_specs)
+            
+            if removed:
+                self.programme_next = TrackList.shift(self.programme_next, removed)
+        
+        if '*' in file_specs:
+            self._record("clear")
+        elif removed:
+            self._record("remove", positions=removed)
         
-        Log.queue(f"Removed {removed_count} file(s) from queue")
-        self.show("")
+        # keep every cursor on the track it was on
+        if removed:
+            self.current_index = TrackList.shift(self.current_index, removed)
+            for client_id, index in self.client_indices.items():
+                self.client_indices[client_id] = TrackList.shift(index, removed)
+            self._save_state()
+        
+        Log.queue(f"Removed {len(removed)} file(s) from queue")
+        self._summary()
+
+        if not self.is_local:
+            self._sync_playlists(removed=removed)
     
     # SHOW QUEUE
     
+    @property
+    def page_size(self):
+        return max(Env.get_int("QUEUE_PAGE_SIZE", 20), 1)
+    
+    def _status(self) -> str:
+        looping = " (LOOPING)" if self.broadcast_settings['loop'] else ""
+        programme = " (PROGRAMME)" if self.programme_mode else ""
+        return "PAUSED" if self.paused else f"PLAYING{looping}{programme}"
+    
+    def _summary(self):
+        """One line view of the queue, shown after edits."""
+        if not self.queue:
+            Log.queue("Queue is empty")
+            return
+        
+        Log.queue(f"Queue ({len(self.queue)} files) - {self._status()}. Use 'queue *' to show it.")
+    
     def show(self, command: str = ""):
-        """Display current queue status."""
+        """Display current queue status.
+        
+        Supports:
+            - Current page: (empty), the one holding the current position
+            - Given page: 3
+            - Whole queue: all
+        """
         if not self.queue:
             Log.queue("Queue is empty")
             return
         
-        looping = " (LOOPING)" if self.broadcast_settings['loop'] else ""
-        status = "PAUSED" if self.paused else f"PLAYING{looping}"
+        pages = (len(self.queue) + self.page_size - 1) // self.page_size
+        command = command.strip().lower()
+        
+        if command == "all":
+            start, end = 0, len(self.queue)
+        else:
+            if command:
+                try:
+                    page = int(command)
+                except ValueError:
+                    Log.error(f"Invalid page: {command}")
+                    return
+            elif self.is_local:
+                page = self.current_index // self.page_size + 1
+            else:
+                page = 1
+            
+            page = min(max(page, 1), pages)
+            start = (page - 1) * self.page_size
+            end = min(start + self.page_size, len(self.queue))
+        
+        Log.queue(f"Queue ({len(self.queue)} files) - {self._status()}:")
         
         if self.is_local:
             # Local mode: show simple list with current position
-            Log.queue(f"Queue ({len(self.queue)} files) - {status}:")
-            for i, filename in enumerate(self.queue, 1):
-                marker = "> " if i == self.current_index + 1 else "  "
-                Log.print(f"{marker}{i}. {filename}", 'cyan')
+            for i in range(start, end):
+                marker = "> " if i == self.current_index else "  "
+                Log.print(f"{marker}{i + 1}. {self.queue[i]}", 'cyan')
         else:
             # Server mode: show per-client progress
-            Log.queue(f"Queue ({len(self.queue)} files) - {status}:")
-            
             if self.client_indices:
                 Log.print("Client positions:", 'yellow')
                 for client_id, index in self.client_indices.items():
@@ -360,8 +683,11 @@ class Queue:
                         Log.print(f"  {client_name}: [{index + 1}/{len(self.queue)}] {current_file}", 'cyan')
             
             Log.print("\nQueue:", 'yellow')
-            for i, filename in enumerate(self.queue, 1):
-                Log.print(f"  {i}. {filename}", 'white')
+            for i in range(start, end):
+                Log.print(f"  {i + 1}. {self.queue[i]}", 'white')
+        
+        if end - start < len(self.queue):
+            Log.print(f"Page {start // self.page_size + 1}/{pages}. Use 'queue *<page>' or 'queue *all' to see more.", 'yellow')
     
     # HELP
     
@@ -375,7 +701,9 @@ class Queue:
         Log.print("  queue +file!                      - Force add (skip availability checks)", 'white')
         Log.print("  queue -file                       - Remove file from queue", 'white')
         Log.print("  queue -*                          - Clear queue", 'white')
-        Log.print("  queue *                           - Show queue", 'white')
+        Log.print("  queue *                           - Show queue (current page)", 'white')
+        Log.print("  queue *page                       - Show a page of the queue", 'white')
+        Log.print("  queue *all                        - Show the whole queue", 'white')
         Log.print("  queue !                           - Toggle play/pause with defaults", 'white')
 
         if not self.is_local:
@@ -472,12 +800,15 @@ class Queue:
             return
         
         self.paused = not self.paused
+        self.held.clear()
         status = "paused" if self.paused else "playing"
         Log.queue(f"Queue {status}")
         
         if not self.paused:
             self.broadcast_settings = args
             self._play_current_local()
+        
+        self._save_state()
     
     async def _toggle_server(self, args: dict):
         """Toggle queue playback in server mode."""
@@ -490,11 +821,19 @@ class Queue:
             return
         
         self.paused = not self.paused
+        self.held.clear()
+        self._lockstep_cancel(stall=True)
+        self._programme_stop()
         status = "paused" if self.paused else "playing"
         self.active_targets = args['targets']
         self.broadcast_settings = args
         
-        Log.queue(f"Queue {status} on {args['targets']}")
+        if not self.paused:
+            self.programme_mode = Env.get_bool("QUEUE_PROGRAMME")
+            self.lockstep = Env.get_bool("QUEUE_LOCKSTEP") and not self.programme_mode
+        
+        mode = " (programme)" if self.programme_mode else " (lockstep)" if self.lockstep else ""
+        Log.queue(f"Queue {status} on {args['targets']}{mode if not self.paused else ''}")
         
         if not self.paused:
             # Initialize client indices for targets
@@ -503,10 +842,16 @@ class Queue:
                 if client_id not in self.client_indices:
                     self.client_indices[client_id] = 0
             
+            self._save_state()
             await self._play_all_clients(target_clients)
         else:
             # Stop broadcast on targets
-            await self.server.registry.dispatch("stop", targets=self.server.parse_targets(args['targets']))
+            target_clients = self.server.parse_targets(args['targets'])
+            self.playlist_clients.difference_update(target_clients)
+            self.resume_pending.clear()
+            self._save_state()
+
+            await self.server.registry.dispatch("stop", targets=target_clients)
     
     # PLAYBACK CONTROL
     
@@ -516,6 +861,7 @@ class Queue:
             Log.queue(f"End of queue reached")
             self.paused = True
             self.current_index = 0
+            self._save_state()
             return
         
         if not self.client:
@@ -542,9 +888,40 @@ class Queue:
             pi=self.broadcast_settings['pi'],
             loop=False,
         ))
+
+        self._prefetch_local()
+
+    def _prefetch_local(self):
+        """Warm up the next PREFETCH_TRACKS files of the queue in local mode."""
+        upcoming = []
+
+        for offset in range(1, min(Env.get_int("PREFETCH_TRACKS", 2), len(self.queue) - 1) + 1):
+            index = self.current_index + offset
+
+            if index >= len(self.queue):
+                if not self.broadcast_settings['loop']:
+                    break
+
+                index -= len(self.queue)
+
+            upcoming.append(os.path.join(self.upload_dir, self.queue[index]))
+
+        current = os.path.join(self.upload_dir, self.queue[self.current_index])
+        asyncio.get_event_loop().run_in_executor(None, prefetch_tracks, upcoming, [current])
     
     async def _play_all_clients(self, target_clients: List[str]):
         """Start playback for all target clients at their individual positions."""
+        if self.programme_mode:
+            await self._programme_play(target_clients)
+            return
+        
+        if self.lockstep:
+            await self._lockstep_play()
+            return
+        
+        playlists = []
+        groups = {}  # {index: [client_id]} clients at a same position share one start
+        
         for client_id in target_clients:
             index = self.client_indices.get(client_id, 0)
             
@@ -552,39 +929,318 @@ class Queue:
                 Log.queue(f"{self.server.clients[client_id].get_display_name()}: Queue finished")
                 continue
             
-            filename = self.queue[index]
-            client_name = self.server.clients[client_id].get_display_name()
-            
-            Log.queue(f"{client_name}: Playing [{index + 1}/{len(self.queue)}] {filename}")
+            if self._supports_playlist(client_id):
+                filename = self.queue[index]
+                Log.queue(f"{self.server.clients[client_id].get_display_name()}: Sending playlist from [{index + 1}/{len(self.queue)}] {filename}")
+                playlists.append(self._send_playlist(client_id, index))
+                continue
             
-            # Use stored broadcast settings
-            await self.server.registry.dispatch(
+            groups.setdefault(index, []).append(client_id)
+        
+        for index, client_ids in groups.items():
+            Log.queue(f"Playing [{index + 1}/{len(self.queue)}] {self.queue[index]} on {len(client_ids)} client(s)")
+        
+        # Use stored broadcast settings
+        await asyncio.gather(*playlists, *(
+            self.server.registry.dispatch(
                 "start",
-                [client_id],
-                file=filename,
+                targets=client_ids,
+                file=self.queue[index],
                 frequency=self.broadcast_settings['frequency'],
                 ps=self.broadcast_settings['ps'],
                 rt=self.broadcast_settings['rt'],
                 pi=self.broadcast_settings['pi'],
-                loop=False
+                loop=False,
+                onstart=False
+            )
+            for index, client_ids in groups.items()
+        ))
+        
+        # onstart once for the whole batch
+        if groups:
+            files = ",".join(self.queue[index] for index in groups)
+            await self.server.registry.dispatch(
+                "handlers_onstart",
+                context={"BW_BROADCAST_FILE": files, "BW_BROADCAST_FREQ": str(self.broadcast_settings['frequency'])}
             )
     
     # AUTO-ADVANCE (NEXT TRACK)
     
-    def on_broadcast_ended(self, client_id: str = None):
+    def on_broadcast_ended(self, client_id: str = None, filename: str = None):
         """Called when a broadcast ends - advance to next in queue.
         
         Args:
             client_id: Client that finished (server mode only)
+            filename: File that finished, if known
         """
+        if self.programme_mode:
+            return  # the stream ends with the programme
+        
+        key = None if self.is_local else client_id
+        
+        if key in self.held:
+            # ends of the track the scheduled file cuts in are ignored
+            if not filename or os.path.basename(filename) != self.held[key]:
+                return
+            
+            if self.lockstep:
+                # the fleet goes on together once the first one is done
+                self.held.clear()
+                if not self.paused:
+                    self.current_index += 1
+                    asyncio.create_task(self._lockstep_play())
+                return
+            
+            del self.held[key]
+        
         if self.paused:
             return
         
+        if self.lockstep:
+            # transitions are timed, ENDs only matter when a duration was unknown
+            if (
+                not self.lockstep_timer
+                and filename
+                and self.current_index < len(self.queue)
+                and os.path.basename(filename) == self.queue[self.current_index]
+            ):
+                self.current_index += 1
+                asyncio.create_task(self._lockstep_play())
+            return
+        
         if self.is_local:
             self._next_local()
-        else:
+        elif client_id not in self.playlist_clients:
             asyncio.create_task(self._next_server(client_id))
     
+    def hold(self, filename: str, client_ids: List[str] = None, at: float = None):
+        """Hand the playing queue over to a scheduled file.
+        
+        Until that file itself ends, track ends are ignored, then the
+        queue goes on with the track after the one that was cut (or
+        that ended right before the scheduled file).
+        
+        Args:
+            filename: The scheduled file
+            client_ids: Clients it plays on (server mode only)
+            at: When it starts, if known
+        """
+        if self.paused:
+            return
+        
+        if self.programme_mode:
+            Log.queue("Scheduled item takes over the targets, pausing the programme")
+            self.manual_pause()
+            return
+        
+        filename = os.path.basename(filename)
+        self.held_at = at
+        
+        if self.is_local:
+            self.held[None] = filename
+            return
+        
+        for client_id in client_ids or []:
+            if client_id in self.client_indices:
+                self.held[client_id] = filename
+                # the scheduled start takes over from the playlist client side
+                self.playlist_clients.discard(client_id)
+    
+    # LOCKSTEP (SERVER MODE)
+    
+    @property
+    def lockstep_lead(self):
+        return Env.get_float("QUEUE_LOCKSTEP_LEAD", 5)
+    
+    def _lockstep_cancel(self, stall: bool = False):
+        if self.lockstep_timer:
+            self.lockstep_timer.cancel()
+        
+        self.lockstep_timer = None
+        
+        if stall:
+            self.lockstep_started = None
+    
+    async def _lockstep_play(self, start_at: float = None):
+        """Start the fleet track (current_index) on every target at start_at, or ASAP."""
+        self._lockstep_cancel()
+        
+        if self.paused:
+            return
+        
+        if self.current_index >= len(self.queue):
+            if not self.broadcast_settings['loop']:
+                Log.queue("Queue finished")
+                self.current_index = 0
+                self.paused = True
+                self.lockstep_started = None
+                self._save_state()
+                return
+            
+            Log.queue("Queue finished, starting over")
+            self.current_index = 0
+        
+        targets = self.server.parse_targets(self.active_targets)
+        filename = self.queue[self.current_index]
+        
+        if start_at is None:
+            start_at = time.time() + Env.get_float("FIRE_DELAY", 1)
+        
+        for client_id in targets:
+            self.client_indices[client_id] = self.current_index
+        
+        self._save_state()
+        
+        if not targets:
+            Log.warning("Lockstep: no client to play on, waiting for one")
+            self.lockstep_started = None
+            return
+        
+        self.lockstep_started = start_at
+        
+        Log.queue(f"Lockstep [{self.current_index + 1}/{len(self.queue)}] {filename} on {len(targets)} client(s)")
+        
+        await self.server.registry.dispatch(
+            "start",
+            targets=targets,
+            file=filename,
+            frequency=self.broadcast_settings['frequency'],
+            ps=self.broadcast_settings['ps'],
+            rt=self.broadcast_settings['rt'],
+            pi=self.broadcast_settings['pi'],
+            loop=False,
+            start_at=start_at
+        )
+        
+        if filename not in self.durations:
+            await self._get_all_client_files(targets[:1])
+        
+        self._lockstep_schedule(filename, start_at)
+    
+    def _lockstep_schedule(self, filename: str, start_at: float):
+        duration = self.durations.get(filename)
+        
+        if duration is None:
+            Log.warning(f"Lockstep: duration of {filename} unknown, the next track will start after the first client is done")
+            return
+        
+        next_at = start_at + duration
+        
+        async def transition():
+            self.lockstep_timer = None
+            
+            # a scheduled file takes this slot, its END moves the fleet on
+            if self.held and (self.held_at is None or next_at >= self.held_at - 0.5):
+                return
+            
+            self.current_index += 1
+            await self._lockstep_play(next_at)
+        
+        # armed ahead, so every target goes on air at next_at
+        self.lockstep_timer = asyncio.get_event_loop().call_later(
+            max(0, next_at - self.lockstep_lead - time.time()),
+            lambda: asyncio.ensure_future(transition())
+        )
+    
+    # PROGRAMME (SERVER MODE)
+    
+    async def _programme_play(self, target_clients: List[str]):
+        """Render the queue from current_index if it isn't yet, and stream it to the targets."""
+        if self.programme is None or not self.programme.running:
+            self.programme_next = self.current_index
+            loop = asyncio.get_event_loop()
+            # the loop is captured here, _programme_stop() may drop self.programme while the thread still runs
+            self.programme = Programme(lambda: self._programme_track(loop), self._programme_finished, loop)
+            
+            if not self.programme.start():
+                self.programme = None
+                self.paused = True
+                self._save_state()
+                return
+        
+        for client_id in target_clients:
+            self.client_indices[client_id] = self.current_index
+        
+        self.playlist_clients.difference_update(target_clients)
+        self._save_state()
+        
+        await self.server.registry.dispatch(
+            "live",
+            targets=target_clients,
+            freq=self.broadcast_settings['frequency'],
+            ps=self.broadcast_settings['ps'],
+            rt=self.broadcast_settings['rt'],
+            pi=self.broadcast_settings['pi'],
+            source=self.programme
+        )
+    
+    def _programme_track(self, loop: asyncio.AbstractEventLoop):
+        """Next file to render, called from the programme thread."""
+        for _ in range(len(self.queue) + 1):
+            with self.programme_lock:
+                if self.paused:
+                    return None
+                
+                index = self.programme_next
+                if index >= len(self.queue):
+                    if not self.broadcast_settings['loop'] or not self.queue:
+                        return None
+                    index = 0
+                
+                self.programme_next = index + 1
+                filename = self.queue[index]
+            
+            file_path = os.path.join(self.upload_dir, filename)
+            if os.path.exists(file_path):
+                try:
+                    loop.call_soon_threadsafe(self._programme_on_track, index, filename)
+                except RuntimeError:
+                    # loop closed, we're shutting down
+                    return None
+                return file_path
+            
+            Log.warning(f"Programme: {filename} not found, skipping")
+        
+        return None
+    
+    def _programme_on_track(self, index: int, filename: str):
+        # a removal may have landed between the pick and this callback
+        if index >= len(self.queue) or self.queue[index] != filename:
+            positions = self.queue.positions(filename)
+            index = min(positions, key=lambda position: abs(position - index)) if positions else None
+        
+        if index is None:
+            Log.queue(f"Programme {filename} (removed from the queue)")
+        else:
+            self.current_index = index
+            
+            for client_id in self.server.parse_targets(self.active_targets):
+                self.client_indices[client_id] = index
+            
+            self._save_state()
+            Log.queue(f"Programme [{index + 1}/{len(self.queue)}] {filename}")
+        
+        asyncio.create_task(self.server.registry.dispatch(
+            "handlers_onstart",
+            context={"BW_BROADCAST_FILE": filename, "BW_BROADCAST_FREQ": str(self.broadcast_settings['frequency'])}
+        ))
+    
+    def _programme_finished(self):
+        self.programme = None
+        
+        if self.paused:
+            return
+        
+        Log.queue("Queue finished")
+        self.paused = True
+        self.current_index = 0
+        self._save_state()
+    
+    def _programme_stop(self):
+        if self.programme:
+            self.programme.stop()
+            self.programme = None
+    
     def _next_local(self):
         """Advance to next file in local mode."""
         self.current_index += 1
@@ -595,8 +1251,10 @@ class Queue:
             self.current_index = 0
             if not startagain:
                 self.paused = True
+                self._save_state()
                 return
         
+        self._save_state()
         self._play_current_local()
     
     async def _next_server(self, client_id: str):
@@ -617,12 +1275,20 @@ class Queue:
             client_index = 0
 
             if not startagain:
+                self._save_state()
                 return
         
+        self._save_state()
+        
         # Play next file for this client
         filename = self.queue[client_index]
         client_name = self.server.clients[client_id].get_display_name()
         
+        if self._supports_playlist(client_id):
+            Log.queue(f"{client_name}: Sending playlist from [{client_index + 1}/{len(self.queue)}] {filename}")
+            await self._send_playlist(client_id, client_index)
+            return
+        
         Log.queue(f"{client_name}: Next [{client_index + 1}/{len(self.queue)}] {filename}")
         
         # Use stored broadcast settings
@@ -635,4 +1301,143 @@ class Queue:
             rt=self.broadcast_settings['rt'],
             pi=self.broadcast_settings['pi'],
             loop=False
-        )
\ No newline at end of file
+        )
+    
+    # PLAYLISTS (SERVER MODE)
+    
+    def _supports_playlist(self, client_id: str) -> bool:
+        """Check if a client can advance through a PLAYLIST by itself."""
+        if not Env.get_bool("QUEUE_PLAYLIST", True):
+            return False
+        
+        client = self.server.clients.get(client_id)
+        return bool(client) and parse_version(client.protocol_version) >= self.PLAYLIST_SINCE
+    
+    async def _send_playlist(self, client_id: str, index: int) -> bool:
+        """Hand the whole queue to a client, starting at index."""
+        client = self.server.clients[client_id]
+        
+        try:
+            response = await client.proto.send(
+                Commands.PLAYLIST,
+                files=json.dumps(list(self.queue)),
+                index=index,
+                revision=self.playlist_revision,
+                frequency=self.broadcast_settings['frequency'],
+                ps=self.broadcast_settings['ps'],
+                rt=self.broadcast_settings['rt'],
+                pi=self.broadcast_settings['pi'],
+                loop='true' if self.broadcast_settings['loop'] else 'false'
+            )
+            
+            self.playlist_clients.add(client_id)
+            Log.success(f"{client.get_display_name()}: {response['kwargs'].get('message', 'Playlist accepted')}")
+            return True
+        
+        except TimeoutError:
+            Log.error(f"{client.get_display_name()}: Response timeout")
+        
+        except RuntimeError as e:
+            Log.error(f"{client.get_display_name()}: {e}")
+        
+        self.playlist_clients.discard(client_id)
+        return False
+    
+    def _sync_playlists(self, added: List[str] = None, removed: List[int] = None):
+        """Send a queue edit to clients playing it as a playlist."""
+        if not added and not removed:
+            return
+        
+        self.playlist_revision += 1
+        
+        if self.paused or not self.playlist_clients:
+            return
+        
+        # only the edit goes out, not the queue (sent in order, synchronously)
+        delta = {'add': json.dumps(added)} if added else {'remove': json.dumps(removed)}
+        
+        for client_id in list(self.playlist_clients):
+            client = self.server.clients.get(client_id)
+            
+            if not client:
+                self.playlist_clients.discard(client_id)
+                continue
+            
+            if not self.queue:
+                continue
+            
+            if parse_version(client.protocol_version) < self.PLAYLIST_DELTA_SINCE:
+                asyncio.create_task(self._send_playlist(client_id, min(self.client_indices.get(client_id, 0), len(self.queue) - 1)))
+                continue
+            
+            client.proto.execute(
+                Commands.PLAYLIST,
+                revision=self.playlist_revision,
+                on_error=lambda error, client_id=client_id: self._resync_playlist(client_id, error),
+                **delta
+            )
+    
+    def _resync_playlist(self, client_id: str, error: Exception):
+        """A client missed or refused a delta, hand it the whole queue again."""
+        if client_id not in self.playlist_clients or client_id not in self.server.clients or not self.queue:
+            return
+        
+        Log.debug(f"{self.server.clients[client_id].get_display_name()}: Playlist delta failed ({error}), resending the queue")
+        asyncio.create_task(self._send_playlist(client_id, min(self.client_indices.get(client_id, 0), len(self.queue) - 1)))
+    
+    async def _detach_playlists(self):
+        """Let playlist clients finish their current track, then stop."""
+        for client_id in list(self.playlist_clients):
+            client = self.server.clients.get(client_id)
+            self.playlist_clients.discard(client_id)
+            
+            if not client:
+                continue
+            
+            try:
+                await client.proto.send(Commands.PLAYLIST, detach='true')
+            
+            except (TimeoutError, RuntimeError) as e:
+                Log.error(f"{client.get_display_name()}: {e}")
+    
+    def on_track(self, client_id: str, kwargs: dict):
+        """Called when a playlist client reports its progress."""
+        client = self.server.clients.get(client_id)
+        
+        if not client:
+            return
+        
+        client_name = client.get_display_name()
+        filename = kwargs.get('filename', 'unknown')
+        status = kwargs.get('status', 'playing')
+        
+        try:
+            index = int(kwargs.get('index', 0))
+            total = int(kwargs.get('total', len(self.queue)))
+        
+        except ValueError:
+            return
+        
+        if status == "done":
+            Log.queue(f"{client_name}: Queue finished")
+            self.playlist_clients.discard(client_id)
+            self.client_indices[client_id] = 0
+            self._save_state()
+            return
+        
+        self.client_indices[client_id] = index
+        self._save_state()
+        
+        if status == "missing":
+            Log.warning(f"{client_name}: Skipped [{index + 1}/{total}] {filename} (not found)")
+        
+        elif status == "error":
+            Log.error(f"{client_name}: Could not play [{index + 1}/{total}] {filename}")
+            self.playlist_clients.discard(client_id)
+        
+        else:
+            Log.queue(f"{client_name}: Now [{index + 1}/{total}] {filename}")
+            asyncio.create_task(self.server.registry.dispatch(
+                "handlers_onstart",
+                context={"BW_BROADCAST_FILE": filename, "BW_BROADCAST_FREQ": str(self.broadcast_settings['frequency'])}
+            ))
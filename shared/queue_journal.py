@@ -0,0 +1,235 @@
+# queue journal: keeps the queue across restarts
+import atexit
+import json
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+from shared.dirutils import BW_PATH
+from shared.env import Env
+from shared.logger import Log
+
+class QueueJournal:
+    """
+    Persists the queue state under BW_PATH/queue/ as a snapshot plus
+    an append-only journal of the changes made since.
+
+    Journal records are JSON lines, each with a sequence number:
+      - {"op": "add", "files": [...]}
+      - {"op": "remove", "positions": [...]}  (sorted, as TrackList.remove returns them)
+      - {"op": "clear"}
+      - {"op": "state", "state": {...}}  (paused, cursors, settings, targets)
+
+    load() reads the snapshot and replays the records newer than it,
+    ignoring a torn last line. Every QUEUE_SNAPSHOT_EVERY records, the
+    whole state is written to a new snapshot (atomically) and the
+    journal is truncated.
+
+    Writes (and their fsync) happen on a writer thread, never on the
+    caller's event loop: records arriving together are written and
+    fsynced at once, so a burst (a track change reported by every
+    client) costs a single fsync. What's pending is written out at exit.
+    """
+
+    def __init__(self, name: str):
+        self.directory = Path(BW_PATH) / "queue"
+        self.snapshot_path = self.directory / f"{name}.snapshot.json"
+        self.journal_path = self.directory / f"{name}.journal"
+
+        self.seq = 0
+        self.since_snapshot = 0
+        self._file = None
+
+        self._pending = deque() # (line,) or (seq, state), in order
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closing = False
+
+    @property
+    def snapshot_every(self):
+        return max(Env.get_int("QUEUE_SNAPSHOT_EVERY", 500), 1)
+
+    def load(self) -> Optional[dict]:
+        """
+        Rebuilds the last persisted state, or returns None if there's none
+        """
+
+        state = None
+
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+
+            self.seq = snapshot['seq']
+            state = snapshot['state']
+
+        except FileNotFoundError:
+            pass
+
+        except (OSError, ValueError, KeyError) as e:
+            Log.warning(f"Could not read queue snapshot, ignoring it: {e}")
+
+        try:
+            with open(self.journal_path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+
+                    except ValueError:
+                        break # torn write, the rest can't be trusted
+
+                    if record['seq'] <= self.seq:
+                        continue
+
+                    state = self._apply(state or self.empty_state(), record)
+                    self.seq = record['seq']
+                    self.since_snapshot += 1
+
+        except FileNotFoundError:
+            pass
+
+        except (OSError, KeyError) as e:
+            Log.warning(f"Could not replay queue journal: {e}")
+
+        return state
+
+    @staticmethod
+    def empty_state() -> dict:
+        return {'queue': [], 'paused': True, 'current_index': 0, 'client_indices': {}, 'broadcast_settings': None, 'active_targets': "all"}
+
+    @staticmethod
+    def _apply(state: dict, record: dict) -> dict:
+        op = record['op']
+
+        if op == "add":
+            state['queue'].extend(record['files'])
+
+        elif op == "remove":
+            removed = set(record['positions'])
+            state['queue'] = [f for i, f in enumerate(state['queue']) if i not in removed]
+
+        elif op == "clear":
+            state['queue'] = []
+
+        elif op == "state":
+            state.update(record['state'])
+
+        return state
+
+    def record(self, op: str, **data) -> bool:
+        """
+        Queues a record for the journal. Returns True once a snapshot is due.
+        """
+
+        self.seq += 1
+        line = json.dumps({'seq': self.seq, 'op': op, **data}, separators=(",", ":"))
+
+        self._submit((line,))
+
+        self.since_snapshot += 1
+        return self.since_snapshot >= self.snapshot_every
+
+    def snapshot(self, state: dict):
+        """
+        Queues the whole state (which mustn't change afterwards) for a
+        snapshot, that truncates the journal
+        """
+
+        self._submit((self.seq, state))
+        self.since_snapshot = 0
+
+    def close(self):
+        """
+        Writes out what's pending and stops the writer
+        """
+
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _submit(self, item: tuple):
+        with self._cond:
+            self._pending.append(item)
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._writer, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+            self._cond.notify()
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+
+                if not self._pending:
+                    return
+
+                batch = list(self._pending)
+                self._pending.clear()
+
+            unsynced = False
+
+            for item in batch:
+                if len(item) == 1:
+                    unsynced = self._write(item[0]) or unsynced
+                else:
+                    # the records so far are in the snapshot, if it could be written
+                    unsynced = unsynced and not self._write_snapshot(*item)
+
+            if unsynced:
+                self._sync()
+
+    def _write(self, line: str) -> bool:
+        try:
+            if self._file is None:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.journal_path, "a")
+
+            self._file.write(line + "\n")
+            return True
+
+        except OSError as e:
+            Log.error(f"Could not write queue journal: {e}")
+            return False
+
+    def _sync(self):
+        try:
+            self._file.flush()
+
+            if Env.get_bool("QUEUE_JOURNAL_FSYNC", True):
+                os.fsync(self._file.fileno())
+
+        except OSError as e:
+            Log.error(f"Could not write queue journal: {e}")
+
+    def _write_snapshot(self, seq: int, state: dict) -> bool:
+        partial = self.snapshot_path.with_name(self.snapshot_path.name + ".part")
+
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            with open(partial, "w") as f:
+                json.dump({'seq': seq, 'state': state}, f, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+
+            os.replace(partial, self.snapshot_path)
+
+            # records up to seq are in the snapshot, a crash before this is harmless
+            if self._file is not None:
+                self._file.close()
+
+            self._file = open(self.journal_path, "w")
+            return True
+
+        except OSError as e:
+            Log.error(f"Could not write queue snapshot: {e}")
+            return False
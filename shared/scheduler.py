@@ -0,0 +1,518 @@
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from shared.dirutils import BW_PATH
+from shared.durations import wav_duration
+from shared.env import Env
+from shared.logger import Log
+
+
+class Scheduler:
+    """Plays files at given wall-clock times, on top of the queue.
+
+    Each scheduled item plays either:
+        - hard: exactly at its time, cutting whatever is on air
+        - next: at the first track boundary of the queue from its time
+
+    Track boundaries come from the WAV durations (read from the file
+    headers, cached) and the time the current track started. Items
+    are handed to the start path SCHEDULE_LEAD seconds ahead with
+    their exact start time, so the clients (or the local start) arm
+    the broadcast and go on air at that instant by themselves.
+
+    While a scheduled file plays over a playing queue, the queue is
+    held (see Queue.hold) and goes on with the next track after it.
+
+    Times can be:
+        - HH:MM[:SS]            every day
+        - *:MM[:SS]             every hour
+        - YYYY-MM-DDTHH:MM[:SS] once
+    """
+
+    MODES = ("hard", "next")
+
+    def __init__(self, server_instance=None, client_instance=None, is_local=False):
+        """Initialize the scheduler.
+
+        Args:
+            server_instance: BotWaveServer instance (for server mode)
+            client_instance: BotWaveLocal instance (for local mode)
+            is_local: True for local client mode, False for server mode
+        """
+        self.server = server_instance
+        self.client = client_instance
+        self.is_local = is_local
+
+        self.items = []  # [{'id', 'when', 'file', 'mode', 'targets'}]
+        self.path = Path(BW_PATH) / "queue" / f"{'local' if is_local else 'server'}.schedule.json"
+        self._timers = {}  # {item id: TimerHandle}
+
+        self._load()
+
+    @property
+    def queue(self):
+        return (self.client if self.is_local else self.server).queue
+
+    @property
+    def lead(self) -> float:
+        return Env.get_float("SCHEDULE_LEAD", 10)
+
+    # PERSISTENCE
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                self.items = json.load(f)
+
+        except FileNotFoundError:
+            pass
+
+        except (OSError, ValueError) as e:
+            Log.warning(f"Could not read the schedule, ignoring it: {e}")
+
+    def _save(self):
+        partial = self.path.with_name(self.path.name + ".part")
+
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            with open(partial, "w") as f:
+                json.dump(self.items, f, indent=2)
+
+            os.replace(partial, self.path)
+
+        except OSError as e:
+            Log.error(f"Could not save the schedule: {e}")
+
+    # TIMES
+
+    @staticmethod
+    def parse_when(when: str) -> bool:
+        return Scheduler.next_occurrence(when, datetime.now() - timedelta(days=3650)) is not None
+
+    @staticmethod
+    def next_occurrence(when: str, after: datetime) -> Optional[datetime]:
+        """Next time strictly after 'after' matching 'when' (local time).
+
+        An ISO date with a UTC offset is converted to local time.
+        """
+        match = re.fullmatch(r"(\*|\d{1,2}):(\d{2})(?::(\d{2}))?", when)
+
+        if match:
+            hour, minute, second = match.group(1), int(match.group(2)), int(match.group(3) or 0)
+
+            if minute > 59 or second > 59 or (hour != "*" and int(hour) > 23):
+                return None
+
+            candidate = after.replace(minute=minute, second=second, microsecond=0)
+
+            if hour == "*":
+                if candidate <= after:
+                    candidate += timedelta(hours=1)
+            else:
+                candidate = candidate.replace(hour=int(hour))
+                if candidate <= after:
+                    candidate += timedelta(days=1)
+
+            return candidate
+
+        try:
+            once = datetime.fromisoformat(when)
+
+        except ValueError:
+            return None
+
+        if once.tzinfo is not None:
+            # naive local time, like everything else here
+            once = once.astimezone().replace(tzinfo=None)
+
+        return once if once > after else None
+
+    # TIMELINE
+
+    def _walk(self, index: int, started: float, duration_of: Callable[[str], Optional[float]], until: float):
+        """Yield (start, end, index) of the queue tracks from index, started at 'started'."""
+        tracks = self.queue.queue
+        start = started
+
+        while start < until and len(tracks):
+            if index >= len(tracks):
+                if not self.queue.broadcast_settings['loop']:
+                    return
+                index = 0
+
+            duration = duration_of(tracks[index])
+
+            # an empty track tells nothing, and would never move us forward
+            if duration is None or duration <= 0:
+                return
+
+            yield (start, start + duration, index)
+
+            start += duration
+            index += 1
+
+    def _duration_of(self) -> Callable[[str], Optional[float]]:
+        if self.is_local:
+            return lambda name: wav_duration(os.path.join(self.queue.upload_dir, name))
+
+        return self.queue.durations.get
+
+    def _position(self, client_id: str = None):
+        """(index, started) of the queue track on air, or None if the queue isn't playing."""
+        queue = self.queue
+
+        if queue.paused:
+            return None
+
+        if self.is_local:
+            if not self.client.broadcasting or not self.client.broadcast_start_time:
+                return None
+
+            return (queue.current_index, self.client.broadcast_start_time)
+
+        client = self.server.clients.get(client_id)
+
+        if not client or not client.state or client_id not in queue.client_indices or 'started' not in client.state:
+            return None
+
+        return (queue.client_indices[client_id], float(client.state['started']))
+
+    def boundary(self, at: float, client_id: str = None) -> Optional[float]:
+        """First queue track boundary at or after 'at', None if it can't be told."""
+        position = self._position(client_id)
+
+        if not position:
+            return None
+
+        index, started = position
+
+        for _, end, _ in self._walk(index, started, self._duration_of(), at + 24 * 3600):
+            if end >= at:
+                return end
+
+        return None
+
+    def timeline(self, horizon: float, client_id: str = None) -> List[tuple]:
+        """Predicted (start, filename, kind) entries from now to now + horizon.
+
+        kind is "queue" or "scheduled", plus " (cut)" for queue tracks
+        a hard item cuts.
+        """
+        now = time.time()
+        until = now + horizon
+        duration_of = self._duration_of()
+
+        upcoming = []
+        for item in self.items:
+            after = datetime.now()
+            while True:
+                occurrence = self.next_occurrence(item['when'], after)
+                if not occurrence or occurrence.timestamp() > until:
+                    break
+                upcoming.append((occurrence.timestamp(), item))
+                after = occurrence
+
+        upcoming.sort(key=lambda entry: entry[0])
+        position = self._position(client_id)
+
+        if not position:
+            return [(at, item['file'], "scheduled") for at, item in upcoming]
+
+        entries = []
+        index, start = position
+
+        while start < until and len(entries) < 200:
+            track = next(self._walk(index, start, duration_of, until), None)
+
+            if not track:
+                break
+
+            start, end, index = track
+            filename = self.queue.queue[index]
+
+            if upcoming and (upcoming[0][1]['mode'] == "hard" and upcoming[0][0] < end or upcoming[0][0] <= start):
+                at, item = upcoming.pop(0)
+                cut = item['mode'] == "hard" and at > start
+
+                if cut:
+                    entries.append((start, filename, "queue (cut)"))
+                else:
+                    at = max(at, start)
+
+                entries.append((at, item['file'], "scheduled"))
+                start = at + (duration_of(item['file']) or 0)
+                index += 1 if cut else 0
+                continue
+
+            entries.append((start, filename, "queue"))
+            start = end
+            index += 1
+
+        return entries + [(at, item['file'], "scheduled") for at, item in upcoming]
+
+    # RUNNING
+
+    def start(self):
+        """Arm the timers of every item. Needs a running event loop."""
+        for item in list(self.items):
+            self._arm(item)
+
+    def _arm(self, item: dict, after: datetime = None):
+        occurrence = self.next_occurrence(item['when'], after or datetime.now())
+
+        if occurrence is None:
+            if after is None:
+                Log.schedule(f"#{item['id']} {item['file']} is past, removing it")
+
+            self.items = [i for i in self.items if i['id'] != item['id']]
+            self._timers.pop(item['id'], None)
+            self._save()
+            return
+
+        at = occurrence.timestamp()
+        delay = max(0, at - self.lead - time.time())
+
+        self._timers[item['id']] = asyncio.get_event_loop().call_later(
+            delay,
+            lambda: asyncio.ensure_future(self._prepare(item, at))
+        )
+
+    def _settings(self) -> dict:
+        if not self.queue.paused:
+            return dict(self.queue.broadcast_settings)
+
+        return {
+            'frequency': Env.get_float("DEFAULT_FREQ", 90.0),
+            'ps': Env.get("DEFAULT_PS", "BotWave"),
+            'rt': Env.get("DEFAULT_RT", "Broadcasting"),
+            'pi': Env.get("DEFAULT_PI", "FFFF")
+        }
+
+    async def _prepare(self, item: dict, at: float):
+        if item not in self.items:
+            return
+
+        # plan the next occurrence first, whatever happens to this one
+        self._arm(item, after=datetime.fromtimestamp(at))
+        settings = self._settings()
+
+        try:
+            if self.is_local:
+                await self._prepare_local(item, at, settings)
+            else:
+                await self._prepare_server(item, at, settings)
+
+        except Exception as e:
+            Log.error(f"Error playing scheduled #{item['id']} {item['file']}: {e}")
+
+    async def _prepare_local(self, item: dict, at: float, settings: dict):
+        if item['mode'] == "next":
+            at = self.boundary(at) or at
+
+        Log.schedule(f"#{item['id']} {item['file']} on air at {datetime.fromtimestamp(at).strftime('%H:%M:%S.%f')[:-3]}")
+        self.queue.hold(item['file'], at=at)
+
+        await self.client.registry.dispatch(
+            "start",
+            file=os.path.join(self.queue.upload_dir, item['file']),
+            frequency=settings['frequency'],
+            ps=settings['ps'],
+            rt=settings['rt'],
+            pi=settings['pi'],
+            loop=False,
+            start_at=at,
+            schedule_id=item['id']
+        )
+
+    async def _prepare_server(self, item: dict, at: float, settings: dict):
+        targets = self.server.parse_targets(item['targets'])
+
+        if not targets:
+            Log.warning(f"Scheduled #{item['id']} {item['file']}: no client matching {item['targets']}")
+            return
+
+        # clients of a same start instant are armed and fired together
+        groups: Dict[float, List[str]] = {}
+
+        for client_id in targets:
+            start_at = at
+
+            if item['mode'] == "next":
+                if item['file'] not in self.queue.durations or any(
+                    name not in self.queue.durations for name in self.queue.queue
+                ):
+                    await self.queue._get_all_client_files([client_id])
+
+                start_at = self.boundary(at, client_id) or at
+
+            groups.setdefault(round(start_at, 3), []).append(client_id)
+
+        for start_at, client_ids in groups.items():
+            Log.schedule(f"#{item['id']} {item['file']} on air at {datetime.fromtimestamp(start_at).strftime('%H:%M:%S.%f')[:-3]} on {len(client_ids)} client(s)")
+            self.queue.hold(item['file'], client_ids, at=start_at)
+
+            await self.server.registry.dispatch(
+                "start",
+                targets=client_ids,
+                file=item['file'],
+                frequency=settings['frequency'],
+                ps=settings['ps'],
+                rt=settings['rt'],
+                pi=settings['pi'],
+                loop=False,
+                start_at=start_at
+            )
+
+    # COMMAND PARSER
+
+    def parse(self, command: str):
+        """Parse and execute schedule commands.
+
+        Commands:
+            + : Add an item
+            - : Remove items
+            * : Show the schedule and timeline
+            ? : Show help
+        """
+        if not command:
+            self.show("")
+            Log.schedule("Use 'schedule ?' for help.")
+            return
+
+        first = command[0]
+        actions = {"+": self.add, "-": self.remove, "*": self.show, "?": self.help}
+
+        if first not in actions:
+            Log.error(f"Invalid action: {first}")
+            Log.schedule("Use 'schedule ?' for help")
+            return
+
+        actions[first](command[1:].strip())
+
+    def add(self, command: str):
+        """Add an item: <when> <file> [hard|next] [targets]"""
+        parts = command.split()
+
+        if len(parts) < 2:
+            Log.error("Usage: schedule +<when> <file> [hard|next]" + ("" if self.is_local else " [targets]"))
+            return
+
+        when, file = parts[0], parts[1]
+        mode = parts[2].lower() if len(parts) > 2 else "hard"
+        targets = parts[3] if len(parts) > 3 else "all"
+
+        if not self.parse_when(when):
+            Log.error(f"Invalid time: {when} (expected HH:MM[:SS], *:MM[:SS] or YYYY-MM-DDTHH:MM[:SS])")
+            return
+
+        if mode not in self.MODES:
+            Log.error(f"Invalid mode: {mode} (expected {' or '.join(self.MODES)})")
+            return
+
+        if self.is_local and not os.path.isfile(os.path.join(self.queue.upload_dir, file)):
+            Log.warning(f"File not found (yet): {file}")
+
+        item = {
+            'id': max((i['id'] for i in self.items), default=0) + 1,
+            'when': when,
+            'file': file,
+            'mode': mode,
+            'targets': targets
+        }
+
+        occurrence = self.next_occurrence(when, datetime.now())
+
+        if occurrence is None:
+            Log.error(f"{when} is in the past")
+            return
+
+        self.items.append(item)
+        self._save()
+        self._arm(item)
+
+        Log.schedule(f"Scheduled #{item['id']} {file} ({mode}), next at {occurrence}")
+
+    def remove(self, command: str):
+        """Remove items by id, or all of them with *"""
+        if not command:
+            Log.error("No item specified")
+            return
+
+        if command == "*":
+            ids = {i['id'] for i in self.items}
+        else:
+            try:
+                ids = {int(i.strip().lstrip('#')) for i in command.split(',')}
+            except ValueError:
+                Log.error(f"Invalid item id(s): {command}")
+                return
+
+        for item_id in ids:
+            timer = self._timers.pop(item_id, None)
+            if timer:
+                timer.cancel()
+
+        if self.is_local:
+            # already handed to the start op, waiting for its time
+            asyncio.ensure_future(self.client.registry.dispatch("disarm", schedule_ids=ids))
+
+        before = len(self.items)
+        self.items = [i for i in self.items if i['id'] not in ids]
+        self._save()
+
+        Log.schedule(f"Removed {before - len(self.items)} item(s) from the schedule")
+
+    def show(self, command: str = ""):
+        """Display the items, and the predicted timeline for the next hour(s)."""
+        if not self.items:
+            Log.schedule("Schedule is empty")
+            return
+
+        Log.schedule(f"Schedule ({len(self.items)} items):")
+
+        for item in self.items:
+            occurrence = self.next_occurrence(item['when'], datetime.now())
+            targets = "" if self.is_local else f" on {item['targets']}"
+            Log.print(f"  #{item['id']} {item['when']} {item['file']} ({item['mode']}){targets} - next: {occurrence}", 'white')
+
+        try:
+            hours = float(command) if command else 1
+        except ValueError:
+            Log.error(f"Invalid number of hours: {command}")
+            return
+
+        client_id = None
+
+        if not self.is_local:
+            playing = [c for c in self.queue.client_indices if c in self.server.clients]
+            client_id = playing[0] if playing else None
+
+        heading = "" if self.is_local or not client_id else f" ({self.server.clients[client_id].get_display_name()})"
+        Log.print(f"\nTimeline, next {hours:g}h{heading}:", 'yellow')
+
+        for at, filename, kind in self.timeline(hours * 3600, client_id):
+            color = 'cyan' if kind == "scheduled" else 'white'
+            Log.print(f"  {datetime.fromtimestamp(at).strftime('%H:%M:%S')} {filename} [{kind}]", color)
+
+    def help(self, command: str):
+        """Display schedule command help."""
+        targets = "" if self.is_local else " [targets]"
+
+        Log.schedule("Schedule Commands:")
+        Log.print(f"  schedule +<when> <file> [hard|next]{targets}", 'white')
+        Log.print("                    - Play a file at a given time", 'white')
+        Log.print("                      hard: exactly at that time, cutting the current track (default)", 'white')
+        Log.print("                      next: at the next track boundary of the queue", 'white')
+        Log.print("  schedule -id[,id]  - Remove items", 'white')
+        Log.print("  schedule -*        - Clear the schedule", 'white')
+        Log.print("  schedule *[hours]  - Show the schedule and the timeline (1 hour by default)", 'white')
+        Log.print("", 'white')
+        Log.print("  <when> is HH:MM[:SS] (daily), *:MM[:SS] (hourly) or YYYY-MM-DDTHH:MM[:SS] (once)", 'white')
+        Log.print("    Example: schedule +*:00 news.wav hard" + (" all" if not self.is_local else ""), 'white')
@@ -1,5 +1,7 @@
 import asyncio
+from collections import deque
 import ssl
+import time
 import websockets
 from typing import Callable, Dict, Optional
 from websockets.server import WebSocketServerProtocol
@@ -7,9 +9,231 @@ from websockets.client import WebSocketClientProtocol
 
 from shared.env import Env
 from shared.logger import Log
+from shared.protocol import Commands
 
 PING_INTERVAL = 30
 PING_TIMEOUT = 5
+COMMAND_TIMEOUT = 10 # ProtoManager's default
+
+# control messages that skip ahead of bulk traffic in a client's outbox
+PRIORITY_COMMANDS = (Commands.STOP, Commands.KICK)
+
+# control messages an outbox keeps at most, the oldest go beyond that
+CONTROL_SIZE = 16
+
+# bulk messages a STOP makes moot: dropped when it overtakes them, so they
+# can't start a broadcast after it
+SUPERSEDED_BY_STOP = (Commands.START, Commands.ARM, Commands.FIRE, Commands.PLAYLIST, Commands.STREAM_TOKEN)
+
+# bounds for the retransmission-style timeout derived from the RTT estimate
+RTO_MIN = 0.2
+RTO_MAX = 30
+
+class RttEstimator:
+    """
+    Per-client round-trip time and jitter estimator (RFC 6298 style).
+
+    srtt is the smoothed RTT, rttvar its mean deviation (reported as jitter),
+    and rto = srtt + 4 * rttvar is the base every timeout is derived from.
+    """
+
+    ALPHA = 1 / 8
+    BETA = 1 / 4
+
+    def __init__(self):
+        self.srtt: Optional[float] = None
+        self.rttvar: Optional[float] = None
+        self.last: Optional[float] = None
+        self.samples = 0
+
+    def sample(self, rtt: float):
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+
+        else:
+            self.rttvar = (1 - self.BETA) * self.rttvar + self.BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - self.ALPHA) * self.srtt + self.ALPHA * rtt
+
+        self.last = rtt
+        self.samples += 1
+
+    @property
+    def rto(self) -> float:
+        if self.srtt is None:
+            return PING_TIMEOUT
+
+        return min(max(self.srtt + 4 * self.rttvar, RTO_MIN), RTO_MAX)
+
+    def ping_timeout(self) -> float:
+        # never stricter than the historical fixed timeout, but stretches on slow links
+        return max(PING_TIMEOUT, 2 * self.rto)
+
+    def command_timeout(self) -> float:
+        # time the client gets to answer a command: processing allowance + network,
+        # never stricter than the historical default
+        return max(COMMAND_TIMEOUT, Env.get_float("CMD_TIMEOUT_BASE", 8) + self.rto)
+
+    def describe(self) -> str:
+        if self.srtt is None:
+            return "not measured yet"
+
+        return f"{self.srtt * 1000:.1f} ms (jitter {self.rttvar * 1000:.1f} ms, timeout {self.command_timeout():.1f}s)"
+
+class ClockEstimator:
+    """
+    Per-client clock offset estimator (NTP style), fed by TIME probes.
+
+    Each probe gives offset = client time - midpoint of the server's send
+    and receive times, wrong by at most half its RTT. Of the last WINDOW
+    probes, the one with the shortest RTT is trusted.
+    """
+
+    WINDOW = 8
+
+    def __init__(self):
+        self.probes = deque(maxlen=self.WINDOW)
+
+    def sample(self, sent: float, client_time: float, received: float):
+        self.probes.append((received - sent, client_time - (sent + received) / 2))
+
+    @property
+    def offset(self) -> Optional[float]:
+        if not self.probes:
+            return None
+
+        return min(self.probes)[1]
+
+    @property
+    def error(self) -> Optional[float]:
+        if not self.probes:
+            return None
+
+        return min(self.probes)[0] / 2
+
+    def describe(self) -> str:
+        if not self.probes:
+            return "not measured yet"
+
+        return f"{self.offset * 1000:+.1f} ms (within {self.error * 1000:.1f} ms)"
+
+class Outbox:
+    """
+    Bounded outbound queue for a single client, drained by its own writer task.
+
+    Control messages (PRIORITY_COMMANDS) always go out before bulk ones.
+    A STOP drops the pending broadcast commands it overtakes, so they
+    can't take effect after it. When the outbox is full, the oldest bulk
+    message is shed to make room. With no bulk left, a new bulk message
+    is shed itself and a control one replaces the oldest control one.
+    Control messages are also capped at CONTROL_SIZE. A slow client
+    never makes the caller wait nor grows server memory.
+    """
+
+    def __init__(self, websocket: WebSocketServerProtocol, maxsize: int):
+        self.websocket = websocket
+        self.maxsize = maxsize
+        self.dropped = 0
+        self.full_since = None
+        self.closed = False
+
+        self._control = deque()
+        self._bulk = deque()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.create_task(self._writer())
+
+    @property
+    def depth(self) -> int:
+        return len(self._control) + len(self._bulk)
+
+    def put(self, message: str):
+        if self.closed:
+            return
+
+        command = message.split(' ', 1)[0]
+
+        if command == Commands.STOP and self._bulk:
+            pending = len(self._bulk)
+            self._bulk = deque(m for m in self._bulk if m.split(' ', 1)[0] not in SUPERSEDED_BY_STOP)
+
+            if len(self._bulk) < pending:
+                Log.debug(f"STOP superseded {pending - len(self._bulk)} pending broadcast command(s)")
+
+        if self.depth >= self.maxsize:
+            if self.full_since is None:
+                self.full_since = time.monotonic()
+
+            if self._bulk:
+                self._bulk.popleft()
+                self.dropped += 1
+
+            elif command not in PRIORITY_COMMANDS:
+                self.dropped += 1 # nothing older to shed for it
+                return
+
+        if command in PRIORITY_COMMANDS:
+            if len(self._control) >= min(CONTROL_SIZE, self.maxsize):
+                self._control.popleft()
+                self.dropped += 1
+
+            self._control.append(message)
+
+        else:
+            self._bulk.append(message)
+
+        self._idle.clear()
+        self._wakeup.set()
+
+    def full_for(self) -> float:
+        # seconds the outbox has been continuously full, 0 if it isn't
+        if self.full_since is None:
+            return 0
+
+        return time.monotonic() - self.full_since
+
+    async def drain(self, timeout: float = None) -> bool:
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+
+        except asyncio.TimeoutError:
+            return False
+
+    def close(self):
+        self.closed = True
+        self._task.cancel()
+        self._control.clear()
+        self._bulk.clear()
+        self._idle.set()
+
+    async def _writer(self):
+        try:
+            while True:
+                if not self._control and not self._bulk:
+                    self._idle.set()
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                    continue
+
+                message = self._control.popleft() if self._control else self._bulk.popleft()
+                await self.websocket.send(message)
+
+                if self.depth < self.maxsize:
+                    self.full_since = None
+
+        except (asyncio.CancelledError, websockets.exceptions.ConnectionClosed):
+            pass
+
+        except Exception as e:
+            Log.error(
+                f"Outbox writer error "
+                f"({type(e).__name__}): {repr(e)}"
+                )
+
+        finally:
+            self._idle.set()
 
 class BWWebSocketServer:
     def __init__(self, ssl_context: ssl.SSLContext, on_message_callback: Callable, on_connect_callback: Callable, on_disconnect_callback: Callable):
@@ -20,6 +244,13 @@ class BWWebSocketServer:
         
         # client_id -> ws
         self.clients: Dict[str, WebSocketServerProtocol] = {}
+
+        # client_id -> outbound queue
+        self.outboxes: Dict[str, Outbox] = {}
+
+        # client_id -> rtt estimator, and the task probing it
+        self.rtt: Dict[str, RttEstimator] = {}
+        self._probes: Dict[str, asyncio.Task] = {}
         
         self.pending_clients: Dict[WebSocketServerProtocol, dict] = {}
         
@@ -33,16 +264,32 @@ class BWWebSocketServer:
     @property
     def port(self):
         return Env.get_int("PORT", 9938)
+
+    @property
+    def queue_size(self):
+        return Env.get_int("WS_QUEUE_SIZE", 256)
+
+    @property
+    def queue_policy(self):
+        return Env.get("WS_QUEUE_POLICY", "shed").lower()
+
+    @property
+    def queue_full_timeout(self):
+        return Env.get_float("WS_QUEUE_FULL_TIMEOUT", 10)
+
+    @property
+    def probe_interval(self):
+        return Env.get_float("RTT_PROBE_INTERVAL", 5)
     
     async def start(self):
         self.running = True
+        # keepalive is handled per client by _probe_loop, with adaptive timeouts
         self.server = await websockets.serve(
             self._handle_client,
             self.host,
             self.port,
             ssl=self.ssl_context,
-            ping_interval=PING_INTERVAL,
-            ping_timeout=PING_TIMEOUT
+            ping_interval=None
         )
         Log.server(f"WebSocket server started on wss://{self.host}:{self.port}")
     
@@ -86,6 +333,16 @@ class BWWebSocketServer:
         finally:
             if websocket in self.pending_clients:
                 del self.pending_clients[websocket]
+
+            outbox = self.outboxes.get(client_id)
+            if outbox and outbox.websocket is websocket:
+                outbox.close()
+                del self.outboxes[client_id]
+                self.rtt.pop(client_id, None)
+
+                probe = self._probes.pop(client_id, None)
+                if probe:
+                    probe.cancel()
             
             if client_id and client_id in self.clients:
                 del self.clients[client_id]
@@ -94,27 +351,92 @@ class BWWebSocketServer:
     def register_client(self, websocket: WebSocketServerProtocol, client_id: str):
         if websocket in self.pending_clients:
             self.pending_clients[websocket]['client_id'] = client_id
+
+            old_outbox = self.outboxes.get(client_id)
+            if old_outbox:
+                old_outbox.close()
+
+            old_probe = self._probes.get(client_id)
+            if old_probe:
+                old_probe.cancel()
+
+            self.outboxes[client_id] = Outbox(websocket, self.queue_size)
+            self.rtt[client_id] = RttEstimator()
+            self._probes[client_id] = asyncio.create_task(
+                self._probe_loop(client_id, websocket, self.rtt[client_id])
+            )
+
+    async def _probe_loop(self, client_id: str, websocket: WebSocketServerProtocol, estimator: RttEstimator):
+        # pings the client, feeding the rtt estimator and acting as the keepalive
+        try:
+            while True:
+                sent_at = time.monotonic()
+                pong_waiter = await websocket.ping()
+
+                try:
+                    await asyncio.wait_for(pong_waiter, estimator.ping_timeout())
+
+                except asyncio.TimeoutError:
+                    Log.warning(f"{client_id} did not answer a ping within {estimator.ping_timeout():.1f}s, closing")
+                    await websocket.close()
+                    return
+
+                estimator.sample(time.monotonic() - sent_at)
+                await asyncio.sleep(self.probe_interval)
+
+        except (asyncio.CancelledError, websockets.exceptions.ConnectionClosed):
+            pass
     
     async def send(self, client_id: str, message: str):
-        # send a msg to a client
+        # queue a msg for a client, never waits on the network
 
-        if client_id in self.clients:
-            try:
-                await self.clients[client_id].send(message)
-            except Exception as e:
-                Log.error(
-                    f"Error sending to {client_id} "
-                    f"({type(e).__name__}): {repr(e)}"
-                    )
+        outbox = self.outboxes.get(client_id)
+
+        if not outbox or outbox.closed:
+            return
+
+        outbox.put(message)
+
+        if outbox.full_for() > self.queue_full_timeout:
+            if self.queue_policy == "disconnect":
+                Log.warning(f"Outbound queue of {client_id} stayed full for {self.queue_full_timeout}s, disconnecting")
+                outbox.close()
+
+                # the closing handshake waits on the peer, don't make the caller wait too
+                asyncio.create_task(self._close(outbox.websocket))
+
+            else:
+                Log.warning(f"Outbound queue of {client_id} is full, {outbox.dropped} message(s) shed so far")
+                outbox.full_since = time.monotonic()  # rate limit the warning
     
+    async def _close(self, websocket: WebSocketServerProtocol):
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
     async def broadcast(self, message: str, exclude: Optional[str] = None):
-        tasks = []
-        for client_id, websocket in self.clients.items():
+        for client_id in list(self.outboxes.keys()):
             if client_id != exclude:
-                tasks.append(websocket.send(message))
-        
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+                await self.send(client_id, message)
+
+    async def drain(self, client_id: str, timeout: float = 1) -> bool:
+        # wait for a client's outbox to be flushed (e.g. before closing its socket)
+
+        outbox = self.outboxes.get(client_id)
+
+        if not outbox:
+            return True
+
+        return await outbox.drain(timeout)
+
+    def queue_stats(self, client_id: str) -> dict:
+        outbox = self.outboxes.get(client_id)
+
+        if not outbox:
+            return {'depth': 0, 'max': self.queue_size, 'dropped': 0}
+
+        return {'depth': outbox.depth, 'max': outbox.maxsize, 'dropped': outbox.dropped}
 
 
 class BWWebSocketClient:    
@@ -129,6 +451,9 @@ class BWWebSocketClient:
         self._receive_task = None
         self._ping_task = None
 
+        # measured by our own keepalive pings, so its timeout stretches on slow links
+        self.rtt = RttEstimator()
+
     @property
     def host(self):
         return Env.get("SERVER_HOST")
@@ -144,13 +469,14 @@ class BWWebSocketClient:
             self.ws = await websockets.connect(
                 uri,
                 ssl=self.ssl_context,
-                ping_interval=PING_INTERVAL,
-                ping_timeout=PING_TIMEOUT
+                # keepalive is handled by _ping_loop, with an adaptive timeout
+                ping_interval=None
             )
             self.connected = True
             self.running = True
             
             self._receive_task = asyncio.create_task(self._receive_loop())
+            self._ping_task = asyncio.create_task(self._ping_loop(self.ws))
             
             return True
         except Exception as e:
@@ -166,6 +492,9 @@ class BWWebSocketClient:
         
         if self._receive_task:
             self._receive_task.cancel()
+
+        if self._ping_task:
+            self._ping_task.cancel()
         
         if self.ws:
             await self.ws.close()
@@ -185,6 +514,28 @@ class BWWebSocketClient:
                 
                 self.connected = False
     
+    async def _ping_loop(self, websocket: WebSocketClientProtocol):
+        # pings the server, feeding the rtt estimator and acting as the keepalive
+        try:
+            while True:
+                await asyncio.sleep(PING_INTERVAL)
+
+                sent_at = time.monotonic()
+                pong_waiter = await websocket.ping()
+
+                try:
+                    await asyncio.wait_for(pong_waiter, self.rtt.ping_timeout())
+
+                except asyncio.TimeoutError:
+                    Log.warning(f"Server did not answer a ping within {self.rtt.ping_timeout():.1f}s, closing")
+                    await websocket.close()
+                    return
+
+                self.rtt.sample(time.monotonic() - sent_at)
+
+        except (asyncio.CancelledError, websockets.exceptions.ConnectionClosed):
+            pass
+
     async def _receive_loop(self):
         try:
             while self.running and self.ws:
@@ -1,42 +1,117 @@
 from pathlib import Path
+import json
 import os
+import re
+import subprocess
 import sys
-from typing import Optional
+from typing import Optional, Tuple
 
 from shared.dirutils import BW_PATH
 from shared.env import Env
 from shared.logger import Log
 
+BACKEND_CACHE = Path(BW_PATH) / "backend_cache.json"
+
 def is_valid_executable(path: str) -> bool:
     return os.path.isfile(path) and os.access(path, os.X_OK)
 
-def check_backends_paths() -> Optional[str]:
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    cache_file = os.path.join(current_dir, "..", "backend_path")
+def backend_search() -> Tuple[str, list]:
     envpath = Env.get("BACKEND_PATH")
 
     search_paths = [str(Path(envpath).parent)] if envpath else [str(Path(BW_PATH) / "backends" / "bw_custom" / "src"), "/opt", "/usr/local/bin", "/usr/bin", "/bin", "/home"]
     exe_name = str(Path(envpath).name) if envpath else "bw_custom"
-    
-    if os.path.isfile(cache_file):
-        if envpath or Env.get_bool("BACKEND_BYPASS_CACHE"):
-            os.remove(cache_file) # skip cache if env is set
-
-        else: 
-            try:
-                with open(cache_file, "r") as file:
-                    path = file.read().strip()
-                    if is_valid_executable(path):
-                        return path
-                    else:
-                        Log.error("The path in backend_path is invalid.")
-                        Log.info("Please relaunch this program. No other action is required from your end.")
-                        os.remove(cache_file)
-
-            except Exception as e:
-                Log.error(f"Error reading {cache_file}: {e}")
-                os.remove(cache_file)
-    
+
+    return (exe_name, search_paths)
+
+def _fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {'ino': stat.st_ino, 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+def _read_backend_cache() -> dict:
+    try:
+        return json.loads(BACKEND_CACHE.read_text())
+
+    except (OSError, ValueError):
+        return {}
+
+def cached_backend(exe_name: str) -> Optional[dict]:
+    """
+    Returns the cached entry for exe_name ({path, ino, mtime, size,
+    capabilities}) if the binary it points to is still the same file,
+    checked from its inode, mtime and size without running it.
+    """
+
+    entry = _read_backend_cache().get(exe_name)
+
+    if not entry or not backend_unchanged(entry):
+        return None
+
+    return entry
+
+def backend_unchanged(entry: dict) -> bool:
+    """
+    Whether the binary a backend entry points to is still the same
+    executable file (same inode, mtime and size)
+    """
+
+    try:
+        fingerprint = _fingerprint(entry['path'])
+
+    except (OSError, KeyError, TypeError):
+        return False
+
+    if any(entry.get(key) != value for key, value in fingerprint.items()):
+        return False
+
+    return is_valid_executable(entry['path'])
+
+def probe_backend(path: str) -> dict:
+    """
+    One-time capability probe: runs the backend with --help and
+    collects the flags it mentions.
+    """
+
+    try:
+        result = subprocess.run([path, "--help"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=3)
+        output = result.stdout.decode(errors="ignore")
+
+    except (OSError, subprocess.TimeoutExpired):
+        return {'flags': []}
+
+    return {'flags': sorted(set(re.findall(r"(?<![\w-])-{1,2}[a-zA-Z][\w-]*", output)))}
+
+def cache_backend(exe_name: str, path: str) -> dict:
+    entry = {'path': path, **_fingerprint(path), 'capabilities': probe_backend(path)}
+
+    cache = _read_backend_cache()
+    cache[exe_name] = entry
+
+    try:
+        BACKEND_CACHE.write_text(json.dumps(cache, indent=2))
+
+    except OSError as e:
+        Log.warning(f"Could not write {BACKEND_CACHE}: {e}")
+
+    return entry
+
+def locate_backend(force: bool = False) -> Optional[dict]:
+    """
+    Finds the backend, from the validated cache when possible,
+    else by walking the search paths (and caching the result).
+    """
+
+    exe_name, search_paths = backend_search()
+    envpath = Env.get("BACKEND_PATH")
+
+    if not force:
+        entry = cached_backend(exe_name)
+
+        if entry and (not envpath or entry['path'] == envpath):
+            return entry
+
+    if envpath and is_valid_executable(envpath):
+        return cache_backend(exe_name, envpath)
+
     for directory in search_paths:
         if not os.path.isdir(directory):
             continue
@@ -45,18 +120,25 @@ def check_backends_paths() -> Optional[str]:
                 if exe_name in files:
                     path = os.path.join(root, exe_name)
                     if is_valid_executable(path):
-                        with open(cache_file, "w") as file:
-                            file.write(path)
-                        return path
-                    
+                        return cache_backend(exe_name, path)
+
         except Exception:
             pass
-    
+
+    return None
+
+def check_backends_paths() -> Optional[str]:
+    entry = locate_backend(force=Env.get_bool("BACKEND_BYPASS_CACHE"))
+
+    if entry:
+        return entry['path']
+
+    exe_name, _ = backend_search()
+
     Log.warning(f"Could not automatically find `{exe_name}`. Please enter the full path manually.")
     user_path = input(f"Enter the path to `{exe_name}`: ").strip()
     if is_valid_executable(user_path):
-        with open(cache_file, "w") as file:
-            file.write(user_path)
+        cache_backend(exe_name, user_path)
         return user_path
     
     Log.error(f"The path you provided is not valid or `{exe_name}` is not executable.")